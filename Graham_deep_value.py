@@ -1,6 +1,16 @@
 from quantopian.pipeline import CustomFactor, Pipeline
+from quantopian.research import run_pipeline
+from quantopian.pipeline.data.builtin import USEquityPricing
+from quantopian.pipeline.factors import AverageDollarVolume, SimpleMovingAverage
+from quantopian.pipeline.data import morningstar
+from quantopian.pipeline import filters
 import numpy
 
+import asset_metadata
+
+#: Basic Materials, Financials and Real Estate
+EXCLUDED_SECTORS = [101, 103, 104]
+
 class operating_cash_flow(CustomFactor):
     inputs = [morningstar.cash_flow_statement.operating_cash_flow]  
     window_length=1
@@ -27,7 +37,7 @@ class net_current_assets_per_share(CustomFactor):
             ]
     window_length=1
     def compute(self, today, asset_ids, out, current_assets, total_liabilities, preferred_stock, shares_outstanding):
-        out[:]=((current_assets - (total_liabilities + preferred_stock))
+        out[:]=(current_assets - (total_liabilities + preferred_stock))
 
 class UniverseFilter(CustomFactor):  
     """  
@@ -44,47 +54,18 @@ class UniverseFilter(CustomFactor):
               morningstar.share_class_reference.is_depositary_receipt,  
               morningstar.asset_classification.morningstar_sector_code  
               ]  
+    # Symbol and exchange flags of every asset, looked up once per asset rather than every day;
+    # make_pipeline refreshes them in case the asset database changed since the last run
+    metadata = asset_metadata.AssetMetadata(lambda asset_id: sid(asset_id))
     def compute(self, today, assets, out, is_primary_share, is_depositary_receipt, sector_code):  
         criteria = is_primary_share[-1] # Only primary Common Stock  
         criteria = criteria & (~is_depositary_receipt[-1]) # No ADR  
-        criteria = criteria & (sector_code[-1] != 101) # No Basic Materials  
-        criteria = criteria & (sector_code[-1] != 103) # No Financials  
-        criteria = criteria & (sector_code[-1] != 104) # No Real Estate  
-        def accept_symbol(equity):  
-            symbol = equity.symbol  
-            if symbol.endswith("_PR") or symbol.endswith("_WI") or symbol.endswith("_WD") or symbol.endswith("_VJ") or symbol.endswith("_V") or symbol.endswith("_H"):  
-                return False  
-            else:  
-                return True  
-        def accept_exchange(equity):  
-            exchange = equity.exchange  
-            if exchange == "NEW YORK STOCK EXCHANGE":  
-                return True  
-            elif exchange == "AMERICAN STOCK EXCHANGE":  
-                return True  
-            elif exchange.startswith("NASDAQ"):  
-                return True  
-            else:  
-                return False  
-        vsid = numpy.vectorize(sid)  
-        equities = vsid(assets)  
-        # Exclude When Distributed(WD), When Issued(WI) and VJ (bankruptcy) and Halted stocks (V, H)  
-        vaccept_symbol = np.vectorize(accept_symbol)  
-        accept_symbol = vaccept_symbol(equities)  
-        criteria = criteria & (accept_symbol)  
-        # Only NYSE, AMEX and Nasdaq  
-        vaccept_exchange = np.vectorize(accept_exchange)  
-        accept_exchange = vaccept_exchange(equities)  
-        criteria = criteria & (accept_exchange)  
+        criteria = criteria & ~(sector_code[-1][:, numpy.newaxis] == EXCLUDED_SECTORS).any(axis=1) # No Basic Materials, Financials or Real Estate  
+        # Exclude When Distributed(WD), When Issued(WI) and VJ (bankruptcy) and Halted stocks (V, H),  
+        # and only NYSE, AMEX and Nasdaq  
+        criteria = criteria & self.metadata.accepted(assets)  
         out[:] = criteria.astype(float)  
 
-from quantopian.pipeline import Pipeline
-from quantopian.research import run_pipeline
-from quantopian.pipeline.data.builtin import USEquityPricing
-from quantopian.pipeline.factors import AverageDollarVolume, SimpleMovingAverage
-from quantopian.pipeline.data import morningstar
-from quantopian.pipeline import filters
-
 
 def make_pipeline():
   
@@ -94,9 +75,10 @@ def make_pipeline():
     is_primary_share = morningstar.share_class_reference.is_primary_share.latest 
     is_not_depositary = ~morningstar.share_class_reference.is_depositary_receipt.latest
     ncav = net_current_assets_per_share() > USEquityPricing.close.latest
-    #universe_filter = UniverseFilter()
+    UniverseFilter.metadata.refresh()
+    universe_filter = UniverseFilter() > 0
 
-    screen_criteria= positive_cash_flow & positive_eps & non_financial & is_primary_share & is_not_depositary & ncav
+    screen_criteria= positive_cash_flow & positive_eps & non_financial & is_primary_share & is_not_depositary & ncav & universe_filter
     
     dollar_volume = AverageDollarVolume(window_length=30)
     high_dollar_volume = (dollar_volume > 10000000)
@@ -118,5 +100,5 @@ def make_pipeline():
 my_pipe = make_pipeline()
 
 result = run_pipeline(my_pipe, '2015-05-05', '2015-05-05')
-print 'Number of securities that passed the filter: %d' % len(result)
-print result
\ No newline at end of file
+print('Number of securities that passed the filter: %d' % len(result))
+print(result)
\ No newline at end of file
@@ -100,4 +100,4 @@ def handle_data(context,data):
     """
     Called every minute.
     """
-    for stock in data: print stock
+    for stock in data: print(stock)
@@ -9,113 +9,56 @@ from quantopian.pipeline.filters.morningstar import Q500US
 from quantopian.pipeline.data import morningstar
 from quantopian.pipeline import filters
 
-from quantopian.pipeline.filters.morningstar import IsPrimaryShare
-def get_tradeable_stocks():
-    # Filter for primary share equities. IsPrimaryShare is a built-in filter.
-    primary_share = IsPrimaryShare()
+from universe import get_tradeable_stocks
 
-    # Equities listed as common stock (as opposed to, say, preferred stock).
-    # 'ST00000001' indicates common stock.
-    common_stock = morningstar.share_class_reference.security_type.latest.eq('ST00000001')
-
-    # Non-depositary receipts. Recall that the ~ operator inverts filters,
-    # turning Trues into Falses and vice versa
-    not_depositary = ~morningstar.share_class_reference.is_depositary_receipt.latest
-
-    # Equities not trading over-the-counter.
-    not_otc = ~morningstar.share_class_reference.exchange_id.latest.startswith('OTC')
-
-    # Not when-issued equities.
-    not_wi = ~morningstar.share_class_reference.symbol.latest.endswith('.WI')
-
-    # Equities without LP in their name, .matches does a match using a regular
-    # expression
-    not_lp_name = ~morningstar.company_reference.standard_name.latest.matches('.* L[. ]?P.?$')
+import numpy
+import pandas
 
-    # Equities with a null value in the limited_partnership Morningstar
-    # fundamental field.
-    not_lp_balance_sheet = morningstar.balance_sheet.limited_partnership.latest.isnull()
+import quarters
+from rebalancer import Rebalancer
 
-    # Equities whose most recent Morningstar market cap is not null have
-    # fundamental data and therefore are not ETFs.
-    have_market_cap = morningstar.valuation.market_cap.latest.notnull()
+EPS_YEARS=5
 
-    # Filter for stocks that pass all of our previous filters.
-    tradeable_stocks = (
-        primary_share
-        & common_stock
-        & not_depositary
-        & not_otc
-        & not_wi
-        & not_lp_name
-        & not_lp_balance_sheet
-        & have_market_cap
-    )
-    return tradeable_stocks
+# Screen thresholds
+PARAMETERS = {
+    'max_pe_percentile': 25,
+    'min_current_ratio': 1.5,
+    'max_debt_to_working_capital': 1.1,
+    'min_price_book': 1.2,
+}
 
-import numpy
-TRADING_DAYS_IN_YEAR=252
-Q1=-1
-Q2=0-(TRADING_DAYS_IN_YEAR/4)
-Q3=0-(TRADING_DAYS_IN_YEAR/4)*2
-Q4=0-(TRADING_DAYS_IN_YEAR/4)*3
+class eps_history(CustomFactor):
+    """
+    Annual (trailing twelve month) EPS for each of the last EPS_YEARS years, plus the
+    screens we build on them, out of a single window of basic_eps.
+    eps_<k>_years_ago is the TTM EPS ending k years ago, all_positive is 1.0 when every
+    year is positive, growth is the change from the oldest year to the latest one relative
+    to the oldest, and min_eps is the worst year.
+    """
+    inputs = [morningstar.earnings_report.basic_eps, morningstar.financial_statement_filing.period_ending_date]
+    outputs = ['eps_%d_years_ago' % year for year in range(EPS_YEARS)] + ['all_positive', 'growth', 'min_eps']
+    window_length=quarters.window_length(EPS_YEARS - 1)
+    def compute(self, today, asset_ids, out, value, period_end):
+        #: (years x assets), newest year first
+        self.write_outputs(out, quarters.fiscal_rows(period_end, range(EPS_YEARS), today).ttm(value))
 
-class last_year_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    window_length=TRADING_DAYS_IN_YEAR
-    def compute(self, today, asset_ids, out, value):
-        out[:] = value[Q1] + value[Q2] + value[Q3] + value[Q4] 
-        
+    def write_outputs(self, out, history):
+        for year in range(EPS_YEARS):
+            out['eps_%d_years_ago' % year][:] = history[year]
         
-class one_years_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    year=1
-    
-    window_length=TRADING_DAYS_IN_YEAR*year
-    def compute(self, today, asset_ids, out, value):
-        year=1
-        offset=TRADING_DAYS_IN_YEAR*year*-1
-        out[:] = value[offset-Q1] + value[offset-Q2] + value[offset-Q3] + value[offset-Q4]
-        
-class two_years_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    year=2
-    
-    window_length=TRADING_DAYS_IN_YEAR*year
-    def compute(self, today, asset_ids, out, value):
-        year=2
-        offset=TRADING_DAYS_IN_YEAR*year*-1
-        out[:] = value[offset-Q1] + value[offset-Q2] + value[offset-Q3] + value[offset-Q4]
-        
-class three_years_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    year=3
-    offset=TRADING_DAYS_IN_YEAR*year*-1
-    window_length=TRADING_DAYS_IN_YEAR*year
-    def compute(self, today, asset_ids, out, value):
-        out[:] = value[offset-Q1] + value[offset-Q2] + value[offset-Q3] + value[offset-Q4]
-
-class four_years_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    year=4
-    offset=TRADING_DAYS_IN_YEAR*year*-1
-    window_length=TRADING_DAYS_IN_YEAR*year
-    def compute(self, today, asset_ids, out, value):
-        out[:] = value[offset-Q1] + value[offset-Q2] + value[offset-Q3] + value[offset-Q4]
+        #: NaN years count as not positive and propagate into min_eps
+        out['min_eps'][:] = history.min(axis=0)
+        out['all_positive'][:] = (history > 0).all(axis=0)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            out['growth'][:] = (history[0] - history[-1]) / numpy.abs(history[-1])
 
-class five_years_eps(CustomFactor):
-    inputs = [morningstar.earnings_report.basic_eps]  
-    year=5
-    offset=TRADING_DAYS_IN_YEAR*year*-1
-    window_length=TRADING_DAYS_IN_YEAR*year
-    def compute(self, today, asset_ids, out, value):
-        out[:] = value[offset-Q1] + value[offset-Q2] + value[offset-Q3] + value[offset-Q4]
 def initialize(context):
     """
     Called once at the start of the algorithm.
     """   
     log.info("initialzing")
     context.prime = False
+    context.rebalancer = Rebalancer(order)
     
     # Rebalance every day, 1 hour after market open.
     schedule_function(my_rebalance, date_rules.month_start(), time_rules.market_open(hours=1))
@@ -135,11 +78,11 @@ def make_pipeline():
     # super fast to update
     
     positive_pe =morningstar.valuation_ratios.pe_ratio.latest > 0
-    screen_criteria = morningstar.valuation_ratios.pe_ratio.latest.percentile_between(0, 25, mask=positive_pe)
+    screen_criteria = morningstar.valuation_ratios.pe_ratio.latest.percentile_between(0, PARAMETERS['max_pe_percentile'], mask=positive_pe)
     raw_pe = morningstar.valuation_ratios.pe_ratio.latest
     
     #current asset ratio > 1.5
-    high_current_assets = morningstar.operation_ratios.current_ratio.latest > 1.5
+    high_current_assets = morningstar.operation_ratios.current_ratio.latest > PARAMETERS['min_current_ratio']
     screen_criteria = screen_criteria & high_current_assets
     raw_current_ratio = morningstar.operation_ratios.current_ratio.latest
     
@@ -147,7 +90,7 @@ def make_pipeline():
     long_term_debt = morningstar.balance_sheet.long_term_debt.latest
     working_capital = morningstar.balance_sheet.working_capital.latest
     debt_capital_ratio = long_term_debt/ working_capital
-    debt_capital_screen = debt_capital_ratio <= 1.1
+    debt_capital_screen = debt_capital_ratio <= PARAMETERS['max_debt_to_working_capital']
     screen_criteria = screen_criteria & debt_capital_screen
 
     dividend_stocks = morningstar.earnings_report.dividend_per_share.latest >0
@@ -155,23 +98,14 @@ def make_pipeline():
  
     screen_criteria = screen_criteria &get_tradeable_stocks()
     
-    price_book = morningstar.valuation_ratios.pb_ratio.latest >1.2
+    price_book = morningstar.valuation_ratios.pb_ratio.latest > PARAMETERS['min_price_book']
     screen_criteria = screen_criteria & price_book
     
     #eps for each of hte last five years is positive
-    last_year_eps_raw= last_year_eps(mask=screen_criteria)
-    last_year_pos = last_year_eps_raw> 0
+    eps = eps_history(mask=screen_criteria)
+    screen_criteria = screen_criteria & (eps.all_positive > 0)
     
-    screen_criteria = screen_criteria & last_year_pos
-    
-    one_year_eps_pos = one_years_eps(mask=screen_criteria) >0
-    screen_criteria = screen_criteria & one_year_eps_pos
-    
-    two_year_eps_raw = two_years_eps(mask=screen_criteria) 
-    two_year_eps_pos = two_year_eps_raw >0
-    screen_criteria = screen_criteria & two_year_eps_pos
-    
-    eps_increasing = last_year_eps_raw > two_year_eps_raw
+    eps_increasing = eps.eps_0_years_ago > eps.eps_2_years_ago
     
     screen_criteria = screen_criteria & eps_increasing
     
@@ -209,17 +143,10 @@ def my_rebalance(context,data):
         order_target_percent(symbol('SPY'),1) #hold SPY as a default 
     context.prime = True
     
-    weight= 1.0/len(context.security_list)
-   
-    for stock in context.security_list:
-        log.info("Buying %s" % (stock.symbol))
-        order_target_percent(stock, weight)
-        
-     #: Exit any positions we might have
-    for stock in context.portfolio.positions:
-        if data.can_trade(stock) and stock not in context.security_list:
-            log.info("Exiting our positions on %s" % (stock.symbol))
-            order_target_percent(stock, 0)
+    #: Equal weights; positions outside the list are exited in the same batch
+    weights = pandas.Series(1.0, index=context.security_list) / len(context.security_list)
+    batch = context.rebalancer.rebalance(context, data, weights)
+    log.info("Rebalancing to %d stocks with %d orders" % (len(weights), len(batch)))
     
  
 def my_record_vars(context, data):
@@ -18,13 +18,20 @@
     - Higher asset turnover ratio compared to previous year
 
 
-    This algorithm demonstrates how to grasp historical fundamental data by storing it in a Pandas Panel similar to how the Quantopian 'data' is currently structured
+    This algorithm demonstrates how to grasp historical fundamental data by storing it in an append-only snapshot store indexed by (date, security, field)
 """
 
-import pytz
-from datetime import datetime, timedelta
-
 import pandas as pd
+
+import piotroski_engine
+from rebalancer import Rebalancer
+from snapshot_store import SnapshotStore
+
+#: Scores to go long at or above and short at or below
+PARAMETERS = {
+    'long_score': 9,
+    'short_score': 2,
+}
     
 """
     Initialize and Handle Data
@@ -35,11 +42,9 @@ def initialize(context):
     #: context.days holds the number of days that we've had this algorithm
     context.days = 99
     
-    #: context.fundamental_dict holds the date:dictionary reference that we need
-    context.fundamental_dict = {}
-    
-    #: context.fundamental_data holds the pandas Panel that's derived from the fundamental_dict
-    context.fundamental_data = None
+    #: context.fundamental_data holds every snapshot we've taken, going back one year
+    context.fundamental_data = SnapshotStore(piotroski_engine.FIELDS)
+    context.rebalancer = Rebalancer(order)
 
 def before_trading_start(context): 
     """
@@ -83,16 +88,15 @@ def handle_data(context, data):
     #: Only run every 25 trading days
     if context.days % 25 == 0:
         
-        #: Insert a new dataframe into our dictionary 
-        context.fundamental_dict[get_datetime()] = context.fundamental_df
+        #: Append today's dataframe to our snapshot store
+        context.fundamental_data.append(get_datetime(), context.fundamental_df)
         
         #: If it's greater than the first trading day
         if context.days > 0:
-            context.fundamental_data = pd.Panel(context.fundamental_dict)
             scores = get_piotroski_scores(context.fundamental_data, get_datetime())
             
             #: Only rebalance when we have enough data
-            if scores != None:
+            if scores is not None:
                 rebalance(context, data, scores)
     
     #: Log our current positions
@@ -124,14 +128,12 @@ def rebalance(context, data, scores):
     """
     
     #: Find which stocks we need to long and which ones we need to short
-    num_long = [stock for stock in scores if scores[stock] >= 9]
-    num_short = [stock for stock in scores if scores[stock] <= 2]
+    num_long = list(scores.index[scores >= PARAMETERS['long_score']])
+    num_short = list(scores.index[scores <= PARAMETERS['short_score']])
     
-    #: Stocks to long
-    for stock in num_long:
-        if stock in data:
-            log.info("Going long on stock %s with score %s" % (stock.symbol, scores[stock]))
-            order_target_percent(stock, 1.0/len(num_long))
+    #: Stocks to long, equally weighted
+    weights = pd.Series(1.0, index=num_long) / len(num_long)
+    weights = weights[data.can_trade(weights.index).values] if len(weights) else weights
     
     # #: Stocks to short
     # for stock in num_short:
@@ -139,11 +141,9 @@ def rebalance(context, data, scores):
     #         log.info("Going short on stock %s with score %s" % (stock.symbol, scores[stock]))
     #         order_target_percent(stock, -1.0/len(num_short))
     
-    #: Exit any positions we might have
-    for stock in context.portfolio.positions:
-        if stock in data and stock not in num_long and stock not in num_short:
-            log.info("Exiting our positions on %s" % (stock.symbol))
-            order_target_percent(stock, 0)
+    #: Buy the longs and exit any other positions we might have in one batch
+    batch = context.rebalancer.rebalance(context, data, weights, leave=num_short)
+    log.info("Going long on %d stocks with %d orders" % (len(weights), len(batch)))
     
     record(number_long=len(num_long))
     # record(number_short=len(num_short))
@@ -154,87 +154,18 @@ def rebalance(context, data, scores):
 
 def get_piotroski_scores(fundamental_data, current_date):
     """
-        This method finds the dataframe that contains the data for the time period we want
-        and finds the total Piotroski score for those dates
+        This method finds the snapshots for today and one year ago in our snapshot store
+        and finds the total Piotroski score for the securities in today's snapshot
     """
-    all_scores = {}
-    all_dates = fundamental_data.items
-    
-    utc = pytz.UTC
-    last_year = utc.localize(datetime(year=current_date.year - 1, month = current_date.month, day = current_date.day))
+    current_data = fundamental_data.as_of(current_date)
+    old_data = fundamental_data.years_earlier(current_date)
     
     #: If one year hasn't passed just return None
-    if last_year < min(all_dates):
+    if old_data is None:
         return None
     
-    #: Figure out which date to use
-    for i, date in enumerate(all_dates):
-        if i == len(all_dates) - 1:
-            continue
-        if last_year > date and last_year < all_dates[i + 1]:
-            break
-        elif last_year == date:
-            break
-        
-    #: This is pretty robust so just set last_year to whatever date currently is when you broke
-    #: or ended the for loop
-    last_year = date
-    old_data = fundamental_data[last_year]
-    current_data = fundamental_data[current_date]
-    
-    #: Find the score for each security
-    for stock in current_data:
-        profit = profit_logic(current_data, old_data, stock)
-        leverage = leverage_logic(current_data, old_data, stock)
-        operating = operating_logic(current_data, old_data, stock)
-        total_score = profit + leverage + operating
-        all_scores[stock] = total_score
-        
-    return all_scores
-
-def profit_logic(current_data, old_data, sid):
-    """
-        Define our profitability logic here
-    """
-    
-    #: Positive ROA
-    positive_roa = current_data[sid]['roa'] > 0
-    #: Positive Operating Cash Flow
-    positive_ocf = current_data[sid]['operating_cash_flow'] > 0
-    #: Current ROA > Last Year ROA
-    current_last_roa = current_data[sid]['roa'] > old_data[sid]['roa']
-    #: Cash flow from operations > ROA
-    cash_flow_roa = current_data[sid]['cash_flow_from_continuing_operating_activities'] > current_data[sid]['roa']
-    
-    return int(positive_roa) + int(positive_ocf) + int(current_last_roa)+ int(cash_flow_roa)
-    
-def leverage_logic(current_data, old_data, sid):
-    """
-        Define our leverage logic here 
-    """
-    
-    #: Current ratio of long-term debt < last year's ratio of long-term debt
-    long_term_debt = current_data[sid]['long_term_debt_equity_ratio'] > old_data[sid]['long_term_debt_equity_ratio']
-    #: Current year's current_ratio > last year's current_ratio
-    current_ratio = current_data[sid]['current_ratio'] > old_data[sid]['current_ratio']
-    #: No new shares
-    new_shares = current_data[sid]['shares_outstanding'] <= old_data[sid]['shares_outstanding']
-    
-    return int(long_term_debt) + 2*int(current_ratio) + 2*int(new_shares)
-    
-def operating_logic(current_data, old_data, sid):
-    """
-        Define our operating efficiency logic here
-    """
-    
-    #: Higher gross margin compared to previous year
-    gross_margin = current_data[sid]['gross_margin'] > old_data[sid]['gross_margin']
-    #: Higher asset turnover ratio compared to previous year
-    asset_turnover = current_data[sid]['assets_turnover'] > old_data[sid]['assets_turnover']
-    
-    return int(gross_margin) + 2*int(asset_turnover)
-
-
-  
-    
+    #: Score every security in one pass over (securities x fields) arrays
+    present = current_data.present
+    scores, _ = piotroski_engine.score_fundamentals(current_data.values[present], old_data.values[present])
     
+    return pd.Series(scores, index=fundamental_data.assets[present])
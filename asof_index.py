@@ -0,0 +1,81 @@
+"""
+    As-of lookups over a sorted array of dates
+
+    "Which snapshot was the latest one at or before T" comes up whenever we compare against data
+    from a year ago. AsOfIndex answers that with a binary search instead of scanning the dates,
+    optionally refusing matches that are too stale, and answers a whole batch of query dates in
+    one searchsorted call.
+"""
+
+import numpy as np
+import pandas as pd
+
+#: Position returned for query dates that have no match
+MISSING = -1
+
+
+def to_nanos(dates):
+    """
+        Converts a date or a sequence of dates to int64 UTC nanoseconds. Naive dates are treated
+        as UTC.
+    """
+    if isinstance(dates, np.ndarray) and dates.dtype == np.int64:
+        return dates
+    if np.ndim(dates) == 0:
+        date = pd.Timestamp(dates)
+        if date.tzinfo is not None:
+            date = date.tz_convert('UTC').tz_localize(None)
+        return np.int64(date.value)
+    index = pd.DatetimeIndex(dates)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return index.values.astype('datetime64[ns]').view(np.int64)
+
+
+def shift_date(date, years=0, months=0):
+    """
+        Moves a date by whole calendar years/months, clamping to the end of shorter months so that
+        Feb 29 minus one year is Feb 28 rather than an error
+    """
+    return pd.Timestamp(date) + pd.DateOffset(years=years, months=months)
+
+
+class AsOfIndex(object):
+    """
+        Index over strictly increasing dates.
+
+        tolerance, if given, is the largest gap (anything pd.Timedelta accepts) allowed between a
+        query date and the date it resolves to; older matches count as missing.
+    """
+
+    def __init__(self, dates, tolerance=None):
+        self._keys = to_nanos(dates)
+        if self._keys.ndim != 1:
+            raise ValueError("AsOfIndex needs a 1-D sequence of dates")
+        self.tolerance = tolerance
+
+    def __len__(self):
+        return len(self._keys)
+
+    def locate(self, date, tolerance=None):
+        """
+            Returns the position of the latest date at or before date, or MISSING
+        """
+        return int(self.locate_many(np.array([to_nanos(date)]), tolerance)[0])
+
+    def locate_many(self, dates, tolerance=None):
+        """
+            Vectorized locate; returns an intp array with one position (or MISSING) per query date
+        """
+        queries = to_nanos(dates)
+        positions = np.searchsorted(self._keys, queries, side='right') - 1
+
+        tolerance = self.tolerance if tolerance is None else tolerance
+        if tolerance is not None and len(self._keys):
+            limit = pd.Timedelta(tolerance).value
+            found = positions >= 0
+            stale = np.zeros(positions.shape, dtype=bool)
+            stale[found] = queries[found] - self._keys[positions[found]] > limit
+            positions[stale] = MISSING
+
+        return positions.astype(np.intp, copy=False)
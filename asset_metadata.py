@@ -0,0 +1,111 @@
+"""
+    Per-asset reference data as arrays
+
+    Universe filters want to know things about every asset in a pipeline window that aren't
+    pipeline inputs, like its ticker suffix or listing exchange. Building an Equity object per
+    asset per day and testing it in Python is a loop over the whole universe every session.
+
+    AssetMetadata looks each asset up once, the first time its id shows up, and keeps the
+    answers as NumPy arrays sorted by asset id. Its table only changes when the asset database
+    does: new ids are looked up as they appear, and refresh() drops everything when the assets
+    themselves may have changed. On every other day a filter is a searchsorted plus a few
+    boolean-array operations.
+"""
+
+import numpy as np
+
+#: Ticker suffixes of listings we never want: preferreds, when issued, when distributed,
+#: companies in bankruptcy (VJ) and halted stocks (V, H)
+EXCLUDED_SUFFIXES = ('_PR', '_WI', '_WD', '_VJ', '_V', '_H')
+
+
+def accept_exchange(exchange):
+    """
+        Only NYSE, AMEX and Nasdaq listings
+    """
+    return (exchange in ('NEW YORK STOCK EXCHANGE', 'AMERICAN STOCK EXCHANGE')
+            or exchange.startswith('NASDAQ'))
+
+
+class AssetMetadata(object):
+    """
+        Symbol and exchange flags of every asset id seen so far, as arrays sorted by id.
+
+        lookup maps an asset id to an object with symbol and exchange attributes (sid on
+        Quantopian). Exchanges are stored as integer codes into exchanges, so per-exchange
+        answers are worked out once per exchange rather than once per asset.
+    """
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        #: Bumped whenever the table changes
+        self.version = 0
+        self.refresh()
+
+    def refresh(self):
+        """
+            Forgets every asset, so each is looked up again the next time it shows up. Call it
+            whenever the asset database may have changed.
+        """
+        self.ids = np.empty(0, dtype=np.int64)
+        self.symbols = np.empty(0, dtype=object)
+        self.excluded_symbol = np.empty(0, dtype=bool)
+        self.exchange_codes = np.empty(0, dtype=np.intp)
+        #: Exchange name and whether we accept it, by code
+        self.exchanges = []
+        self.accepted_exchange = np.empty(0, dtype=bool)
+        self.version += 1
+        self._last = (None, None)
+
+    def update(self, asset_ids):
+        """
+            Looks up the assets in asset_ids that aren't in the table yet. Returns whether
+            there were any.
+        """
+        new = np.setdiff1d(np.asarray(asset_ids, dtype=np.int64), self.ids)
+        if not len(new):
+            return False
+
+        equities = [self.lookup(int(asset_id)) for asset_id in new]
+        symbols = np.array([equity.symbol for equity in equities], dtype=object)
+        excluded = np.array([symbol.endswith(EXCLUDED_SUFFIXES) for symbol in symbols.tolist()],
+                            dtype=bool)
+        codes = np.array([self._exchange_code(equity.exchange) for equity in equities],
+                         dtype=np.intp)
+
+        order = np.argsort(np.concatenate([self.ids, new]), kind='mergesort')
+        self.ids = np.concatenate([self.ids, new])[order]
+        self.symbols = np.concatenate([self.symbols, symbols])[order]
+        self.excluded_symbol = np.concatenate([self.excluded_symbol, excluded])[order]
+        self.exchange_codes = np.concatenate([self.exchange_codes, codes])[order]
+        self.version += 1
+        return True
+
+    def _exchange_code(self, exchange):
+        try:
+            return self.exchanges.index(exchange)
+        except ValueError:
+            self.exchanges.append(exchange)
+            self.accepted_exchange = np.append(self.accepted_exchange, accept_exchange(exchange))
+            return len(self.exchanges) - 1
+
+    def positions(self, asset_ids):
+        """
+            Rows of the table for asset_ids, adding any assets we haven't seen
+        """
+        asset_ids = np.asarray(asset_ids, dtype=np.int64)
+        last_ids, last_positions = self._last
+        if last_ids is not None and np.array_equal(last_ids, asset_ids):
+            return last_positions
+        self.update(asset_ids)
+        positions = np.searchsorted(self.ids, asset_ids)
+        self._last = (asset_ids.copy(), positions)
+        return positions
+
+    def accepted(self, asset_ids):
+        """
+            Boolean array, aligned to asset_ids, of the assets with an acceptable symbol that
+            are listed on an acceptable exchange
+        """
+        rows = self.positions(asset_ids)
+        return ~self.excluded_symbol[rows] & self.accepted_exchange[self.exchange_codes[rows]]
@@ -0,0 +1,15 @@
+"""
+    Offline runtime for the Quantopian algorithms in this repository
+
+    Runs the algorithm files unchanged against on-disk bundles (see localq.bundle), so they can
+    be profiled and load tested away from the Quantopian platform:
+
+        python -m localq synthetic /tmp/bundle --assets 500
+        python -m localq run Piotroski-pipeline.py --bundle /tmp/bundle --start 2014-01-02 --end 2014-12-31
+"""
+
+from localq.algorithm import TradingAlgorithm, run_algorithm
+from localq.bundle import Bundle, write_bundle
+from localq.pipeline import SimplePipelineEngine
+
+__all__ = ['Bundle', 'SimplePipelineEngine', 'TradingAlgorithm', 'run_algorithm', 'write_bundle']
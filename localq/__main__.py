@@ -0,0 +1,171 @@
+"""
+    Command line entry point, see localq/__init__.py
+"""
+
+import argparse
+import ast
+import logging
+import os
+import sys
+import time
+
+#: The helper modules the algorithms import live next to them in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from localq.algorithm import TradingAlgorithm  # noqa: E402
+from localq.bundle import Bundle  # noqa: E402
+from localq.factorstore import FactorPanel  # noqa: E402
+from localq.pipeline import SimplePipelineEngine  # noqa: E402
+from localq.reference import shared_cache  # noqa: E402
+from localq.sweep import sweep as run_sweep  # noqa: E402
+from localq.synthetic import make_synthetic_bundle  # noqa: E402
+
+
+def run(args):
+    bundle = Bundle(args.bundle)
+    algorithm = TradingAlgorithm(args.algorithm, bundle, args.start, args.end, args.capital_base,
+                                 data_frequency='minute' if args.minute else 'daily',
+                                 skip_unchanged=args.skip_unchanged)
+    start = time.perf_counter()
+    results = algorithm.run()
+    elapsed = time.perf_counter() - start
+
+    sessions = len(results)
+    print("%d sessions x %d assets in %.2fs (%.2f simulated years/s)"
+          % (sessions, len(bundle.assets), elapsed, sessions / 252.0 / elapsed))
+    calls = algorithm.timers.calls['handle_data']
+    print("%d handle_data calls (%d skipped) at %.0f calls/s"
+          % (calls, algorithm.skipped, calls / elapsed))
+    print("final portfolio value: %.2f" % results['portfolio_value'].iloc[-1])
+    if args.profile:
+        print(algorithm.timers.report().to_string(float_format=lambda value: '%.3f' % value))
+    if args.output:
+        results.to_csv(args.output)
+
+
+def parameter_values(text):
+    """
+        name=v1,v2,... as (name, [values]), values parsed as Python literals
+    """
+    name, _, values = text.partition('=')
+    if not name or not values:
+        raise argparse.ArgumentTypeError("expected name=value[,value...], got %r" % text)
+    try:
+        return name, [ast.literal_eval(value) for value in values.split(',')]
+    except (ValueError, SyntaxError):
+        raise argparse.ArgumentTypeError("can't parse the values of %r" % text)
+
+
+def sweep(args):
+    bundle = Bundle(args.bundle)
+    start = time.perf_counter()
+    panel = FactorPanel(args.panel, bundle) if args.panel else None
+    table = run_sweep(args.algorithm, bundle, args.start, args.end, dict(args.param),
+                      processes=args.processes, capital_base=args.capital_base, factor_store=panel)
+    elapsed = time.perf_counter() - start
+    print(table.to_string(index=False))
+    print("%d runs in %.2fs" % (len(table), elapsed))
+    if args.output:
+        table.to_csv(args.output, index=False)
+
+
+def panel(args):
+    bundle = Bundle(args.bundle)
+    algorithm = TradingAlgorithm(args.algorithm, bundle, args.start, args.end)
+    pipelines = algorithm.attached_pipelines()
+    start = time.perf_counter()
+    written = FactorPanel.write(args.root, bundle, list(pipelines.values()), args.start, args.end)
+    print("wrote %d factors of %s (%.1f MB) in %.2fs"
+          % (len(written._files), ', '.join(sorted(pipelines)), written.nbytes / 1e6,
+             time.perf_counter() - start))
+
+
+def pipelines(args):
+    bundle = Bundle(args.bundle)
+    named = {}
+    for path in args.algorithms:
+        algorithm = TradingAlgorithm(path, bundle, args.start, args.end)
+        for name, pipeline in algorithm.attached_pipelines().items():
+            named['%s:%s' % (os.path.basename(path), name)] = pipeline
+    engine = SimplePipelineEngine(bundle, reference_cache=shared_cache)
+    start = time.perf_counter()
+    outputs = engine.run_pipelines(named, args.start, args.end)
+    elapsed = time.perf_counter() - start
+    for name in sorted(outputs):
+        print("%s: %d rows" % (name, len(outputs[name])))
+    print("%d pipelines, %d distinct terms, in %.2fs"
+          % (len(outputs), len(engine.canonical), elapsed))
+
+
+def synthetic(args):
+    make_synthetic_bundle(args.root, args.assets, args.start, args.end, args.seed, args.minutes)
+    print("wrote %s" % args.root)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m localq')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    run_parser = commands.add_parser('run', help='run an algorithm file against a bundle')
+    run_parser.add_argument('algorithm')
+    run_parser.add_argument('--bundle', required=True)
+    run_parser.add_argument('--start', required=True)
+    run_parser.add_argument('--end', required=True)
+    run_parser.add_argument('--capital-base', type=float, default=1e6)
+    run_parser.add_argument('--profile', action='store_true', help='print per-callback timings')
+    run_parser.add_argument('--output', help='write daily results to this csv file')
+    run_parser.add_argument('--verbose', action='store_true', help="show the algorithm's log output")
+    run_parser.add_argument('--minute', action='store_true',
+                            help="replay the bundle's minute bars instead of daily bars")
+    run_parser.add_argument('--skip-unchanged', action='store_true',
+                            help='skip handle_data for minutes in which nothing changed')
+    run_parser.set_defaults(func=run)
+
+    sweep_parser = commands.add_parser('sweep', help='run an algorithm file over a grid of PARAMETERS')
+    sweep_parser.add_argument('algorithm')
+    sweep_parser.add_argument('--bundle', required=True)
+    sweep_parser.add_argument('--start', required=True)
+    sweep_parser.add_argument('--end', required=True)
+    sweep_parser.add_argument('--capital-base', type=float, default=1e6)
+    sweep_parser.add_argument('--param', type=parameter_values, action='append', required=True,
+                              help='a parameter and the values to try, as name=v1,v2,...')
+    sweep_parser.add_argument('--processes', type=int, help='worker processes, one per CPU by default')
+    sweep_parser.add_argument('--output', help='write the results table to this csv file')
+    sweep_parser.add_argument('--panel', help='read factors from this factor panel')
+    sweep_parser.set_defaults(func=sweep)
+
+    panel_parser = commands.add_parser(
+        'panel', help="write the windowed factors of an algorithm's pipelines to a factor panel")
+    panel_parser.add_argument('algorithm')
+    panel_parser.add_argument('root')
+    panel_parser.add_argument('--bundle', required=True)
+    panel_parser.add_argument('--start', required=True)
+    panel_parser.add_argument('--end', required=True)
+    panel_parser.set_defaults(func=panel)
+
+    pipelines_parser = commands.add_parser(
+        'pipelines', help='compute the pipelines of several algorithm files together')
+    pipelines_parser.add_argument('algorithms', nargs='+')
+    pipelines_parser.add_argument('--bundle', required=True)
+    pipelines_parser.add_argument('--start', required=True)
+    pipelines_parser.add_argument('--end', required=True)
+    pipelines_parser.set_defaults(func=pipelines)
+
+    synthetic_parser = commands.add_parser('synthetic', help='write a synthetic bundle')
+    synthetic_parser.add_argument('root')
+    synthetic_parser.add_argument('--assets', type=int, default=500)
+    synthetic_parser.add_argument('--start', default='2010-01-04')
+    synthetic_parser.add_argument('--end', default='2016-12-30')
+    synthetic_parser.add_argument('--seed', type=int, default=0)
+    synthetic_parser.add_argument('--minutes', action='store_true', help='add minute bars for the ETFs')
+    synthetic_parser.set_defaults(func=synthetic)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if getattr(args, 'verbose', False) else logging.WARNING,
+                        format='%(message)s')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+    Engine hooks for the factors of our algorithm files
+
+    The algorithm files are Quantopian code and stay that way. What only the local engine cares
+    about, i.e. which of their CustomFactors are elementwise and which roll forward from one
+    session to the next (see localq.pipeline), is declared here instead, by factor class name.
+    TradingAlgorithm applies it to the classes an algorithm file defines when it loads the file.
+"""
+
+import quarters
+from localq.pipeline import CustomFactor
+
+
+class FiscalTTM(object):
+    """
+        Rolling evaluation of factors built on quarters.fiscal_rows: the last input is the
+        statements' period ending date, the others are summed over the four quarters of every
+        lag the window reaches, and the factor's write_outputs(out, block) fills out from the
+        (lags x assets x inputs) block, or (lags x assets) with a single input, just as its
+        compute does
+    """
+
+    def lags(self, term):
+        max_lag = (term.window_length - quarters.TRADING_DAYS_IN_QUARTER) // quarters.TRADING_DAYS_IN_YEAR - 1
+        return range(max_lag + 1)
+
+    def start(self, term, today, assets, *windows):
+        state = quarters.RollingQuarters(self.lags(term), term.window_length)
+        state.start(windows[-1], windows[:-1])
+        return state
+
+    def roll(self, term, state, today, assets, entering, leaving):
+        state.push(entering[-1], entering[:-1])
+
+    def compute(self, term, state, today, assets, out):
+        block = state.ttm(today)
+        term.write_outputs(out, block[..., 0] if block.shape[-1] == 1 else block)
+
+
+#: Factor class name -> class attributes to set on it
+ADAPTERS = {
+    'TTM_fundamentals': {'elementwise': True, 'rolling': FiscalTTM()},
+    'accrued_cash': {'elementwise': True},
+    'eps_history': {'elementwise': True, 'rolling': FiscalTTM()},
+}
+
+
+def adapt(namespace):
+    """
+        Sets the attributes of ADAPTERS on the CustomFactor classes in namespace, an algorithm
+        file's globals
+    """
+    for name, attributes in ADAPTERS.items():
+        cls = namespace.get(name)
+        if isinstance(cls, type) and issubclass(cls, CustomFactor):
+            for attribute, value in attributes.items():
+                setattr(cls, attribute, value)
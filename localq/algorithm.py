@@ -0,0 +1,712 @@
+"""
+    Local event-driven runtime for Quantopian algorithm files
+
+    TradingAlgorithm loads an algorithm file unchanged, injects the globals the Quantopian IDE
+    provided (order_target_percent, schedule_function, get_fundamentals, log, ...) and replays a
+    bundle's sessions through initialize, before_trading_start, scheduled functions and
+    handle_data. Simulation is daily by default: handle_data runs once per session, scheduled
+    functions run before it in time-rule order, and orders fill at the session's close with no
+    slippage or commission. Every callback is timed.
+
+    With data_frequency='minute' the sessions are replayed minute by minute from the bundle's
+    minute bars (see localq.minutes): handle_data runs every minute, scheduled functions at
+    their minute, and orders for assets with minute bars fill at the close of the minute they
+    were placed in. Other assets keep their previous close during the session and fill at its
+    close. skip_unchanged=True leaves out handle_data calls for minutes in which no price moved
+    and nothing happened to the portfolio or its orders since the last call.
+
+    Algorithm files may declare a module-level PARAMETERS dict of their tunable thresholds;
+    parameters={...} overrides entries of it after the file is loaded, which is how
+    localq.sweep runs one file over a grid of settings.
+"""
+
+import builtins
+import inspect
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from localq import adapters, shims
+from localq.fundamentals import FundamentalsReader, fundamentals, query
+from localq.ledger import Ledger, Positions
+from localq.minutes import MINUTES_IN_SESSION, MinuteBars, forward_filled, with_changes
+from localq.orders import OrderBook
+from localq.pipeline import SimplePipelineEngine
+from localq.reference import shared_cache
+
+#: The algorithm currently running, for the quantopian.algorithm shims
+_current = None
+
+
+def get_algorithm():
+    if _current is None:
+        raise RuntimeError("no algorithm is running")
+    return _current
+
+
+class CallbackTimers(object):
+    """
+        Call counts and wall time per callback name. Times are inclusive, so pipeline and
+        get_fundamentals time also shows up in the callback that triggered it.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.worst = defaultdict(float)
+
+    def call(self, name, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls[name] += 1
+            self.seconds[name] += elapsed
+            if elapsed > self.worst[name]:
+                self.worst[name] = elapsed
+
+    def report(self):
+        """
+            Frame of calls, total seconds, mean and max milliseconds per callback
+        """
+        names = sorted(self.calls, key=lambda name: -self.seconds[name])
+        return pd.DataFrame({
+            'calls': [self.calls[name] for name in names],
+            'total_s': [self.seconds[name] for name in names],
+            'mean_ms': [1000 * self.seconds[name] / self.calls[name] for name in names],
+            'max_ms': [1000 * self.worst[name] for name in names],
+        }, index=pd.Index(names, name='callback'), columns=['calls', 'total_s', 'mean_ms', 'max_ms'])
+
+
+class Portfolio(object):
+    """
+        Cash and performance as of the last mark to market; holdings are kept in ledger
+    """
+
+    def __init__(self, capital_base, ledger):
+        self.ledger = ledger
+        self.starting_cash = capital_base
+        self.cash = capital_base
+        self.positions = Positions(ledger)
+        self.positions_value = 0.0
+        self.portfolio_value = capital_base
+        self.pnl = 0.0
+        self.returns = 0.0
+
+
+class Account(object):
+
+    def __init__(self):
+        self.leverage = 0.0
+        self.net_leverage = 0.0
+        self.gross_exposure = 0.0
+        self.net_exposure = 0.0
+
+
+class Context(object):
+    """
+        The algorithm's context; any attribute may be set on it
+    """
+
+    def __init__(self, portfolio, account):
+        self.portfolio = portfolio
+        self.account = account
+
+
+class BarData(object):
+    """
+        The data argument of handle_data and scheduled functions
+    """
+
+    def __init__(self, algorithm):
+        self._algorithm = algorithm
+
+    def _field(self, assets, field):
+        algorithm = self._algorithm
+        row = algorithm.price_row
+        many = isinstance(assets, (list, tuple, pd.Index, np.ndarray))
+        positions = algorithm.asset_positions(assets if many else [assets])
+        if field == 'price':
+            prices = algorithm.last_prices(row, positions)
+        else:
+            prices = algorithm.bundle.column('pricing/' + field)[row, positions]
+        if algorithm.bar is not None:
+            prices = algorithm.minute_values(field, positions, prices)
+        if many:
+            return pd.Series(prices, index=list(assets))
+        return prices[0]
+
+    def current(self, assets, fields):
+        if isinstance(fields, (list, tuple)):
+            if isinstance(assets, (list, tuple, pd.Index, np.ndarray)):
+                return pd.DataFrame({field: self._field(assets, field) for field in fields},
+                                    columns=list(fields))
+            return pd.Series({field: self._field(assets, field) for field in fields})
+        return self._field(assets, fields)
+
+    def can_trade(self, assets):
+        algorithm = self._algorithm
+        closes = algorithm.bundle.column('pricing/close')[algorithm.price_row]
+        if isinstance(assets, (list, tuple, pd.Index, np.ndarray)):
+            return pd.Series(~np.isnan(closes[algorithm.asset_positions(assets)]), index=list(assets))
+        return not np.isnan(closes[algorithm.asset_positions([assets])[0]])
+
+    def __contains__(self, asset):
+        return bool(self.can_trade(asset))
+
+    def __iter__(self):
+        algorithm = self._algorithm
+        closes = algorithm.bundle.column('pricing/close')[algorithm.price_row]
+        return iter(algorithm.bundle.assets.assets[~np.isnan(closes)])
+
+    def history(self, assets, fields, bar_count, frequency='1d'):
+        if frequency != '1d':
+            raise ValueError("only daily history is available")
+        algorithm = self._algorithm
+        stop = algorithm.price_row + 1
+        start = max(stop - bar_count, 0)
+        index = algorithm.bundle.sessions[start:stop]
+        single = not isinstance(assets, (list, tuple, pd.Index, np.ndarray))
+        columns = [assets] if single else list(assets)
+        positions = algorithm.asset_positions(columns)
+
+        def frame(field):
+            if field == 'price':
+                values = np.array([algorithm.last_prices(row, positions) for row in range(start, stop)])
+            else:
+                values = algorithm.bundle.column('pricing/' + field)[start:stop, positions]
+            return pd.DataFrame(values, index=index, columns=columns)
+
+        if isinstance(fields, (list, tuple)):
+            return {field: frame(field) for field in fields}
+        result = frame(fields)
+        return result[assets] if single else result
+
+
+class DateRule(object):
+    """
+        Picks the sessions a scheduled function runs on
+    """
+
+    def __init__(self, kind, days_offset=0):
+        self.kind = kind
+        self.days_offset = days_offset
+
+    def sessions(self, sessions):
+        """
+            Boolean array over sessions
+        """
+        if self.kind == 'every_day':
+            return np.ones(len(sessions), dtype=bool)
+        local = sessions.tz_localize(None)
+        if self.kind.startswith('week'):
+            periods = local.to_period('W').asi8
+        else:
+            periods = local.to_period('M').asi8
+        #: Position of every session inside its week or month, from the front and the back
+        starts = np.r_[True, periods[1:] != periods[:-1]]
+        ends = np.r_[periods[1:] != periods[:-1], True]
+        group = np.cumsum(starts) - 1
+        first = np.flatnonzero(starts)
+        last = np.flatnonzero(ends)
+        position = np.arange(len(sessions))
+        if self.kind.endswith('start'):
+            offset = position - first[group]
+        else:
+            offset = last[group] - position
+        return offset == self.days_offset
+
+
+class date_rules(object):
+
+    @staticmethod
+    def every_day():
+        return DateRule('every_day')
+
+    @staticmethod
+    def week_start(days_offset=0):
+        return DateRule('week_start', days_offset)
+
+    @staticmethod
+    def week_end(days_offset=0):
+        return DateRule('week_end', days_offset)
+
+    @staticmethod
+    def month_start(days_offset=0):
+        return DateRule('month_start', days_offset)
+
+    @staticmethod
+    def month_end(days_offset=0):
+        return DateRule('month_end', days_offset)
+
+
+class TimeRule(object):
+    """
+        Minute of the session, counted from the open, a scheduled function runs at
+    """
+
+    def __init__(self, minute):
+        self.minute = minute
+
+
+class time_rules(object):
+
+    @staticmethod
+    def market_open(hours=0, minutes=0):
+        return TimeRule(max(hours * 60 + minutes, 1))
+
+    @staticmethod
+    def market_close(hours=0, minutes=0):
+        return TimeRule(MINUTES_IN_SESSION - hours * 60 - minutes)
+
+
+class AlgorithmLog(object):
+    """
+        The log global, prefixing messages with the simulation time
+    """
+
+    def __init__(self, algorithm, logger):
+        self._algorithm = algorithm
+        self._logger = logger
+
+    def _log(self, level, message):
+        if self._logger.isEnabledFor(level):
+            self._logger.log(level, '%s %s', self._algorithm.get_datetime(), message)
+
+    def debug(self, message):
+        self._log(logging.DEBUG, message)
+
+    def info(self, message):
+        self._log(logging.INFO, message)
+
+    def warn(self, message):
+        self._log(logging.WARNING, message)
+
+    warning = warn
+
+    def error(self, message):
+        self._log(logging.ERROR, message)
+
+
+def _accepts_data(func):
+    """
+        Whether a callback takes (context, data) rather than just (context)
+    """
+    try:
+        parameters = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return True
+    return len(parameters) >= 2
+
+
+class TradingAlgorithm(object):
+    """
+        Runs the algorithm file at path over the sessions from start to end of bundle
+    """
+
+    def __init__(self, path, bundle, start, end, capital_base=1e6, timers=None,
+                 data_frequency='daily', skip_unchanged=False, parameters=None, factor_store=None):
+        self.path = os.path.abspath(path)
+        self.bundle = bundle
+        self.first, self.stop = bundle.sessions_between(start, end)
+        if self.first < 1:
+            raise ValueError("the bundle needs at least one session before %s" % start)
+        if self.first >= self.stop:
+            raise ValueError("no sessions between %s and %s" % (start, end))
+        self.capital_base = capital_base
+        self.timers = timers if timers is not None else CallbackTimers()
+
+        if data_frequency not in ('daily', 'minute'):
+            raise ValueError("data_frequency must be 'daily' or 'minute', not %r" % data_frequency)
+        self.data_frequency = data_frequency
+        self.skip_unchanged = skip_unchanged
+        self.minute_bars = None
+        if data_frequency == 'minute':
+            if not MinuteBars.exists(bundle):
+                raise ValueError("bundle %s has no minute bars" % bundle.root)
+            self.minute_bars = MinuteBars(bundle)
+            #: Column of every bundle asset in the minute bars, or -1
+            self._minute_columns = np.full(len(bundle.assets), -1, dtype=np.intp)
+            self._minute_columns[self.minute_bars.slots] = np.arange(len(self.minute_bars.slots))
+        #: Minute bars of the current minute, field -> vector over minute_bars.slots
+        self.bar = None
+        #: Whether the portfolio or its orders changed since the last handle_data call
+        self._touched = True
+        self.skipped = 0
+
+        self.pipeline_engine = SimplePipelineEngine(bundle, reference_cache=shared_cache,
+                                                    factor_store=factor_store)
+        self.fundamentals_reader = FundamentalsReader(bundle)
+
+        self.session = self.first
+        self.price_row = self.first - 1
+        self.minute = 0
+        self._opens = (bundle.sessions.tz_localize(None) + pd.Timedelta(hours=9, minutes=30)) \
+            .tz_localize('America/New_York').tz_convert('UTC')
+
+        self.portfolio = Portfolio(capital_base, Ledger(bundle.assets))
+        self.account = Account()
+        self.context = Context(self.portfolio, self.account)
+        self.data = BarData(self)
+
+        self._pipelines = {}
+        self._pipeline_outputs = {}
+        #: Term values of the session's pipelines, shared between them
+        self._pipeline_cache = {}
+        self._scheduled = []
+        self.orders = OrderBook(bundle.assets)
+        self._recorded = {}
+
+        self.log = AlgorithmLog(self, logging.getLogger('localq.' + os.path.basename(path)))
+        self.namespace = self._load()
+        if parameters:
+            self._set_parameters(parameters)
+
+    def _load(self):
+        shims.install()
+        with open(self.path) as source_file:
+            source = source_file.read()
+        script_dir = os.path.dirname(self.path)
+        if script_dir not in sys.path:
+            sys.path.insert(0, script_dir)
+
+        namespace = {'__name__': '__algorithm__', '__file__': self.path, '__builtins__': builtins}
+        namespace.update(self.api())
+        global _current
+        previous, _current = _current, self
+        try:
+            exec(compile(source, self.path, 'exec'), namespace)
+        finally:
+            _current = previous
+        adapters.adapt(namespace)
+        return namespace
+
+    def _set_parameters(self, parameters):
+        declared = self.namespace.get('PARAMETERS')
+        if not isinstance(declared, dict):
+            raise ValueError("%s declares no PARAMETERS dict" % self.path)
+        unknown = sorted(set(parameters) - set(declared))
+        if unknown:
+            raise ValueError("%s has no parameters %s" % (self.path, ', '.join(unknown)))
+        declared.update(parameters)
+
+    def api(self):
+        """
+            Globals injected into the algorithm's namespace
+        """
+        return {
+            'log': self.log,
+            'symbol': self.symbol,
+            'symbols': self.symbols,
+            'sid': self.sid,
+            'schedule_function': self.schedule_function,
+            'date_rules': date_rules,
+            'time_rules': time_rules,
+            'order': self.order,
+            'order_value': self.order_value,
+            'order_percent': self.order_percent,
+            'order_target': self.order_target,
+            'order_target_value': self.order_target_value,
+            'order_target_percent': self.order_target_percent,
+            'get_open_orders': self.get_open_orders,
+            'cancel_order': self.cancel_order,
+            'record': self.record,
+            'get_datetime': self.get_datetime,
+            'get_fundamentals': self.get_fundamentals,
+            'query': query,
+            'fundamentals': fundamentals,
+            'update_universe': self.update_universe,
+            'attach_pipeline': self.attach_pipeline,
+            'pipeline_output': self.pipeline_output,
+            'set_commission': lambda *args, **kwargs: None,
+            'set_slippage': lambda *args, **kwargs: None,
+            'set_benchmark': lambda *args, **kwargs: None,
+        }
+
+    # Simulation
+
+    def run(self):
+        """
+            Runs the simulation and returns a frame of daily performance and recorded variables
+        """
+        global _current
+        previous, _current = _current, self
+        try:
+            return self._run()
+        finally:
+            _current = previous
+
+    def attached_pipelines(self):
+        """
+            Runs initialize alone and returns the pipelines it attached, by name
+        """
+        global _current
+        initialize = self.namespace.get('initialize')
+        if initialize is not None:
+            previous, _current = _current, self
+            try:
+                initialize(self.context)
+            finally:
+                _current = previous
+        return dict(self._pipelines)
+
+    def _run(self):
+        namespace = self.namespace
+        initialize = namespace.get('initialize')
+        before_trading_start = namespace.get('before_trading_start')
+        handle_data = namespace.get('handle_data')
+
+        self.minute = -45
+        if initialize is not None:
+            self.timers.call('initialize', initialize, self.context)
+
+        schedule = [(rule[1].minute, rule[0].sessions(self.bundle.sessions), rule[2])
+                    for rule in self._scheduled]
+        schedule.sort(key=lambda entry: entry[0])
+
+        stream = None
+        if self.minute_bars is not None:
+            stream = with_changes(forward_filled(self.minute_bars.sessions(self.first, self.stop)))
+
+        rows = []
+        for session in range(self.first, self.stop):
+            self.session = session
+            self._pipeline_outputs.clear()
+            self._pipeline_cache = {}
+
+            #: Before the open only the previous close is known
+            self.price_row = session - 1
+            self.minute = -45
+            if before_trading_start is not None:
+                if _accepts_data(before_trading_start):
+                    self.timers.call('before_trading_start', before_trading_start, self.context, self.data)
+                else:
+                    self.timers.call('before_trading_start', before_trading_start, self.context)
+
+            if stream is not None:
+                _, bars, changed = next(stream)
+                self._run_minutes(session, bars, changed, schedule, handle_data)
+            else:
+                #: Daily bars: everything from the open on sees the session's close
+                self.price_row = session
+                for minute, runs_on, func in schedule:
+                    if runs_on[session]:
+                        self.minute = minute
+                        self.timers.call(func.__name__, func, self.context, self.data)
+
+                self.minute = MINUTES_IN_SESSION
+                if handle_data is not None:
+                    self.timers.call('handle_data', handle_data, self.context, self.data)
+
+            self.price_row = session
+            self._fill_orders(self.bundle.column('pricing/close')[session])
+            self._mark_to_market()
+            rows.append(self._performance_row())
+
+        results = pd.DataFrame(rows, index=self.bundle.sessions[self.first:self.stop])
+        return results
+
+    def _run_minutes(self, session, bars, changed, schedule, handle_data):
+        """
+            Replays one session's minute bars. Only assets with minute bars see prices from
+            the session; everything else still sees the previous close.
+        """
+        scheduled = defaultdict(list)
+        for minute, runs_on, func in schedule:
+            if runs_on[session]:
+                scheduled[minute].append(func)
+        self._touched = True
+        for i in range(MINUTES_IN_SESSION):
+            self.minute = i + 1
+            self.bar = {field: values[i] for field, values in bars.items()}
+            for func in scheduled.get(self.minute, ()):
+                self.timers.call(func.__name__, func, self.context, self.data)
+                self._touched = True
+            if handle_data is not None:
+                if self.skip_unchanged and not changed[i] and not self._touched:
+                    self.skipped += 1
+                else:
+                    self._touched = False
+                    self.timers.call('handle_data', handle_data, self.context, self.data)
+            if self.orders:
+                self._fill_orders(self.bar['close'], self._minute_columns)
+        self.bar = None
+
+    def minute_values(self, field, positions, values):
+        """
+            values of field for the assets at positions, with those of assets that have minute
+            bars replaced by the current minute's, where there are any
+        """
+        key = 'close' if field == 'price' else field
+        if key not in self.bar:
+            return values
+        columns = self._minute_columns[positions]
+        hits = np.flatnonzero(columns >= 0)
+        if len(hits):
+            minute = self.bar[key][columns[hits]]
+            known = ~np.isnan(minute)
+            values = np.array(values, dtype=np.float64)
+            values[hits[known]] = minute[known]
+        return values
+
+    def _performance_row(self):
+        portfolio = self.portfolio
+        row = {
+            'portfolio_value': portfolio.portfolio_value,
+            'cash': portfolio.cash,
+            'positions_value': portfolio.positions_value,
+            'returns': portfolio.returns,
+            'leverage': self.account.leverage,
+        }
+        row.update(self._recorded)
+        return row
+
+    def last_prices(self, row, positions):
+        """
+            Closes as of row of the assets at positions, carrying each asset's last close
+            forward over missing days
+        """
+        return self.bundle.last_valid('pricing/close', row, positions)
+
+    def asset_positions(self, assets):
+        return self.bundle.assets.positions(assets)
+
+    def _fill_orders(self, prices, columns=None):
+        """
+            Fills open orders at prices, a vector over the bundle's assets, or if columns is
+            given over the columns it maps assets to (-1 for assets to leave open)
+        """
+        portfolio = self.portfolio
+        for slot, orders in self.orders.open_slots():
+            column = slot if columns is None else columns[slot]
+            if column < 0 or np.isnan(prices[column]):
+                continue
+            price = prices[column]
+            self._touched = True
+            for order in orders:
+                amount = self.orders.fill(order)
+                portfolio.ledger.fill(slot, amount, price)
+                portfolio.cash -= amount * price
+
+    def _mark_to_market(self):
+        portfolio = self.portfolio
+        ledger = portfolio.ledger
+        ledger.mark(self.last_prices(self.session, ledger.held()))
+        net = ledger.positions_value()
+        gross = ledger.gross_exposure()
+        previous = portfolio.portfolio_value
+        portfolio.positions_value = net
+        portfolio.portfolio_value = portfolio.cash + net
+        portfolio.pnl = portfolio.portfolio_value - portfolio.starting_cash
+        portfolio.returns = portfolio.portfolio_value / previous - 1.0 if previous else 0.0
+        account = self.account
+        account.gross_exposure = gross
+        account.net_exposure = net
+        account.leverage = gross / portfolio.portfolio_value if portfolio.portfolio_value else 0.0
+        account.net_leverage = net / portfolio.portfolio_value if portfolio.portfolio_value else 0.0
+
+    # API
+
+    def get_datetime(self, tz=None):
+        dt = self._opens[self.session] + pd.Timedelta(minutes=self.minute)
+        return dt.tz_convert(tz) if tz is not None else dt
+
+    def symbol(self, symbol_str):
+        return self.bundle.assets.lookup_symbol(symbol_str)
+
+    def symbols(self, *symbol_strs):
+        return [self.symbol(symbol_str) for symbol_str in symbol_strs]
+
+    def sid(self, sid):
+        return self.bundle.assets.retrieve(sid)
+
+    def schedule_function(self, func, date_rule=None, time_rule=None, half_days=True, calendar=None):
+        self._scheduled.append((date_rule or date_rules.every_day(),
+                                time_rule or time_rules.market_open(), func))
+
+    def record(self, **values):
+        self._recorded.update(values)
+
+    def update_universe(self, assets):
+        pass
+
+    def attach_pipeline(self, pipeline, name, chunks=None):
+        self._pipelines[name] = pipeline
+        return pipeline
+
+    def pipeline_output(self, name):
+        output = self._pipeline_outputs.get(name)
+        if output is None:
+            try:
+                pipeline = self._pipelines[name]
+            except KeyError:
+                raise KeyError("no pipeline named %r was attached" % name)
+            output = self._pipeline_outputs[name] = self.timers.call(
+                'pipeline', self.pipeline_engine.compute_session, pipeline, self.session,
+                self._pipeline_cache)
+        return output
+
+    def get_fundamentals(self, query):
+        return self.timers.call('get_fundamentals', self.fundamentals_reader.get_fundamentals,
+                                query, self.session)
+
+    def _price(self, asset):
+        positions = self.asset_positions([asset])
+        prices = self.last_prices(self.price_row, positions)
+        if self.bar is not None:
+            prices = self.minute_values('price', positions, prices)
+        return prices[0]
+
+    def order(self, asset, amount, limit_price=None, stop_price=None, style=None):
+        amount = int(amount)
+        if amount == 0:
+            return None
+        order = self.orders.place(asset, amount, self.get_datetime())
+        self._touched = True
+        return order.id
+
+    def order_value(self, asset, value, **kwargs):
+        price = self._price(asset)
+        if not price or np.isnan(price):
+            return None
+        return self.order(asset, value / price, **kwargs)
+
+    def order_percent(self, asset, percent, **kwargs):
+        return self.order_value(asset, percent * self.portfolio.portfolio_value, **kwargs)
+
+    def order_target(self, asset, target, **kwargs):
+        return self.order(asset, target - self.portfolio.positions[asset].amount, **kwargs)
+
+    def order_target_value(self, asset, target, **kwargs):
+        price = self._price(asset)
+        if not price or np.isnan(price):
+            return None
+        return self.order_target(asset, int(target / price), **kwargs)
+
+    def order_target_percent(self, asset, target, **kwargs):
+        return self.order_target_value(asset, target * self.portfolio.portfolio_value, **kwargs)
+
+    def get_open_orders(self, asset=None):
+        return self.orders.open_orders(asset)
+
+    def cancel_order(self, order):
+        if self.orders.cancel(order):
+            self._touched = True
+
+
+def run_algorithm(path, bundle, start, end, capital_base=1e6, data_frequency='daily',
+                  skip_unchanged=False, parameters=None, factor_store=None):
+    """
+        Runs an algorithm file and returns (results, timers)
+    """
+    algorithm = TradingAlgorithm(path, bundle, start, end, capital_base,
+                                 data_frequency=data_frequency, skip_unchanged=skip_unchanged,
+                                 parameters=parameters, factor_store=factor_store)
+    results = algorithm.run()
+    return results, algorithm.timers
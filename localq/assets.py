@@ -0,0 +1,105 @@
+"""
+    Assets and the asset table of a data bundle
+"""
+
+import numpy as np
+
+
+class Asset(object):
+    """
+        An equity. Hashes and compares equal to its integer sid, like zipline's Equity, so that
+        context.portfolio.positions[sec.sid] finds the same entry as positions[sec].
+    """
+    __slots__ = ('sid', 'symbol', 'exchange', 'asset_name')
+
+    def __init__(self, sid, symbol='', exchange='', asset_name=''):
+        self.sid = int(sid)
+        self.symbol = symbol
+        self.exchange = exchange
+        self.asset_name = asset_name
+
+    def __hash__(self):
+        return self.sid
+
+    def __eq__(self, other):
+        if isinstance(other, Asset):
+            return self.sid == other.sid
+        if isinstance(other, (int, np.integer)):
+            return self.sid == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __lt__(self, other):
+        return self.sid < int(other)
+
+    def __int__(self):
+        return self.sid
+
+    __index__ = __int__
+
+    def __repr__(self):
+        return 'Equity(%d [%s])' % (self.sid, self.symbol)
+
+
+class AssetFinder(object):
+    """
+        The assets of a bundle, in column order of every (days x assets) array.
+
+        sids, symbols and exchanges are NumPy arrays aligned with assets, an object array of
+        Asset instances.
+    """
+
+    def __init__(self, sids, symbols, exchanges, asset_names=None):
+        self.sids = np.asarray(sids, dtype=np.int64)
+        self.symbols = np.asarray(symbols, dtype=str)
+        self.exchanges = np.asarray(exchanges, dtype=str)
+        if asset_names is None:
+            asset_names = np.full(len(self.sids), '', dtype=str)
+        self.asset_names = np.asarray(asset_names, dtype=str)
+
+        self.assets = np.empty(len(self.sids), dtype=object)
+        self.assets[:] = [Asset(*row) for row in zip(self.sids.tolist(), self.symbols.tolist(),
+                                                   self.exchanges.tolist(), self.asset_names.tolist())]
+        self._by_sid = {asset.sid: i for i, asset in enumerate(self.assets)}
+        self._by_symbol = {asset.symbol: i for i, asset in enumerate(self.assets)}
+
+    def __len__(self):
+        return len(self.sids)
+
+    def retrieve(self, sid):
+        """
+            The Asset with the given sid
+        """
+        try:
+            return self.assets[self._by_sid[int(sid)]]
+        except KeyError:
+            raise LookupError("no asset with sid %s" % sid)
+
+    def lookup_symbol(self, symbol):
+        """
+            The Asset currently trading under symbol
+        """
+        try:
+            return self.assets[self._by_symbol[symbol]]
+        except KeyError:
+            raise LookupError("no asset with symbol %r" % symbol)
+
+    def position(self, asset):
+        """
+            Column position of an asset (an Asset instance or a sid)
+        """
+        try:
+            return self._by_sid[int(asset)]
+        except KeyError:
+            raise LookupError("no asset with sid %s" % asset)
+
+    def positions(self, assets):
+        """
+            Column positions of assets (Asset instances or sids) as an intp array
+        """
+        return np.fromiter((self._by_sid[int(asset)] for asset in assets), dtype=np.intp)
@@ -0,0 +1,205 @@
+"""
+    Whole-range pipeline evaluation
+
+    SimplePipelineEngine walks a date range one session at a time, so trying another threshold
+    on a screen means another pass over every session, windows included. Once the windowed
+    factors of a pipeline are in a FactorPanel (see localq.factorstore), nothing else in a
+    typical screen needs history: comparisons, arithmetic and filter algebra only combine
+    the latest values. BlockPipelineEngine evaluates those as (sessions x assets) blocks, one
+    array operation per term for the whole range, reads the windowed terms straight from the
+    panel and only falls back to session by session evaluation for terms that aren't
+    vectorized (window length 1 custom factors). Ranks and percentiles are computed across
+    the assets of every session of the block at once, with their inputs masked to missing
+    instead of cut down to the masked assets.
+
+    Outputs match SimplePipelineEngine.run_pipeline for the same range. run_chunks bounds the
+    memory a long range takes by computing it in chunks of sessions (see localq.chunks).
+"""
+
+import numpy as np
+import pandas as pd
+
+from localq.chunks import DEFAULT_MEMORY_BUDGET, chunk_bounds, load_rows, prefetched, window
+from localq.labels import MISSING_CODE, LabelArray
+from localq.pipeline import (BoundColumn, CanonicalTerms, _NotEnoughHistory, _NothingToCompute, expand,
+                             missing_array, missing_value)
+
+
+def _masked(block, mask):
+    """
+        block with missing values wherever mask is False
+    """
+    if isinstance(block, LabelArray):
+        block = block.copy()
+        block[~mask] = MISSING_CODE
+        return block
+    if block.dtype.names:
+        block = np.array(block)
+        for name in block.dtype.names:
+            block[name][~mask] = missing_value(block.dtype[name])
+        return block
+    return np.where(mask, block, missing_value(block.dtype))
+
+
+class BlockPipelineEngine(object):
+    """
+        Computes pipelines against bundle for a range of sessions at once, reading windowed
+        terms from panel, a FactorPanel, where it has them
+    """
+
+    def __init__(self, bundle, panel=None):
+        self.bundle = bundle
+        self.assets = bundle.assets.assets
+        self.sids = bundle.assets.sids
+        self.panel = panel
+        self.canonical = CanonicalTerms()
+        #: Column rows and panel blocks of the chunk being computed
+        self._loaded = {}
+        self._blocks = {}
+
+    def run_pipeline(self, pipeline, start_date, end_date):
+        """
+            Output frame indexed by (session, asset) for every session from start_date to
+            end_date, keeping the assets that pass the screen
+        """
+        return self.run_pipelines({None: pipeline}, start_date, end_date)[None]
+
+    def run_pipelines(self, pipelines, start_date, end_date):
+        """
+            run_pipeline for every pipeline of pipelines, a dict by name, evaluating the terms
+            they have in common once. Returns the output frames by name.
+        """
+        first, stop = self.bundle.sessions_between(start_date, end_date)
+        if first >= stop:
+            raise ValueError("no sessions between %s and %s" % (start_date, end_date))
+        if first < 1:
+            raise ValueError("the bundle needs at least one session before %s" % start_date)
+        cache = {}
+        return {name: self._output(pipeline, first, stop, cache)
+                for name, pipeline in pipelines.items()}
+
+    def run_chunks(self, pipeline, start_date, end_date, memory_budget=DEFAULT_MEMORY_BUDGET):
+        """
+            Yields the output of run_pipeline one chunk of sessions at a time, in chunks sized
+            to memory_budget bytes, the next chunk's column rows and panel blocks loading in
+            the background
+        """
+        first, stop = self.bundle.sessions_between(start_date, end_date)
+        if first >= stop:
+            raise ValueError("no sessions between %s and %s" % (start_date, end_date))
+        if first < 1:
+            raise ValueError("the bundle needs at least one session before %s" % start_date)
+        terms = pipeline.terms()
+        stored = [term for term in terms if self.panel is not None and self.panel.covers(term)]
+        #: Only the columns of terms that aren't in the panel get read
+        windows = {}
+        for term in set(terms) - set(stored):
+            for input_ in term.inputs:
+                if isinstance(input_, BoundColumn):
+                    windows[input_.key] = max(windows.get(input_.key, 0), term.window_length)
+        itemsizes = dict((key, self.bundle.column(key).dtype.itemsize) for key in windows)
+        session_bytes = len(self.assets) * (sum(itemsizes.values()) +
+                                            sum(term.dtype.itemsize for term in terms))
+        fixed_bytes = len(self.assets) * sum(itemsizes[key] * length for key, length in windows.items())
+        chunks = chunk_bounds(first, stop, memory_budget, session_bytes, fixed_bytes)
+
+        stored = [self.canonical(term) for term in stored]
+
+        def load(first, stop, previous):
+            blocks = dict((term, np.array(self.panel.block(term, first, stop))) for term in stored)
+            rows = load_rows(self.bundle, windows, first, stop, None if previous is None else previous[0])
+            return rows, blocks
+
+        for first, stop, (loaded, blocks) in prefetched(chunks, load):
+            self._loaded, self._blocks = loaded, blocks
+            try:
+                output = self._output(pipeline, first, stop, {})
+            finally:
+                self._loaded, self._blocks = {}, {}
+            yield output
+
+    def _output(self, pipeline, first, stop, cache):
+        if pipeline.screen is None:
+            screen = np.ones((stop - first, len(self.assets)), dtype=bool)
+        else:
+            screen = self.evaluate(pipeline.screen, first, stop, cache)
+        rows, cols = np.nonzero(screen)
+
+        names = sorted(pipeline.columns)
+        data = {}
+        for name in names:
+            value = self.evaluate(pipeline.columns[name], first, stop, cache)[rows, cols]
+            data[name] = value.as_labels() if isinstance(value, LabelArray) else value
+        index = pd.MultiIndex.from_arrays([self.bundle.sessions[first + rows], self.assets[cols]])
+        return pd.DataFrame(data, index=index, columns=names)
+
+    def evaluate(self, term, first, stop, cache):
+        """
+            (sessions x assets) values of term for the sessions [first, stop), using and
+            filling cache
+        """
+        term = self.canonical(term)
+        result = cache.get(term)
+        if result is not None:
+            return result
+
+        mask = None if term.mask is None else self.evaluate(term.mask, first, stop, cache)
+        result = self._blocks.get(term)
+        if result is None and self.panel is not None:
+            result = self.panel.block(term, first, stop)
+        if result is None and not term.vectorized:
+            result = self._by_session(term, first, stop, cache, mask)
+        else:
+            if result is None:
+                arrays = [self._input(term, input_, first, stop, cache) for input_ in term.inputs]
+                if mask is not None and not term.elementwise:
+                    arrays = [_masked(array, mask) for array in arrays]
+                result = term._compute([array[np.newaxis] for array in arrays], None, self.sids)
+            #: Values come unmasked, from the panel as from a vectorized compute
+            if mask is not None:
+                result = _masked(result, mask)
+        cache[term] = result
+        return result
+
+    def _input(self, term, input_, first, stop, cache):
+        if isinstance(input_, BoundColumn):
+            if term.window_length > 1:
+                raise ValueError("%r isn't in the factor panel" % (term,))
+            #: Session i sees row i - 1
+            return window(self.bundle, self._loaded, input_.key, stop - 1, stop - first)
+        return self.evaluate(input_, first, stop, cache)
+
+    def _by_session(self, term, first, stop, cache, mask):
+        """
+            Values of term computed one session at a time, as SimplePipelineEngine would
+        """
+        inputs = [None if isinstance(input_, BoundColumn) else self.evaluate(input_, first, stop, cache)
+                  for input_ in term.inputs]
+        result = None
+        for row, i in enumerate(range(first, stop)):
+            cols = None if mask is None else np.flatnonzero(mask[row])
+            try:
+                if cols is not None and not len(cols):
+                    raise _NothingToCompute()
+                arrays = []
+                for input_, block in zip(term.inputs, inputs):
+                    if block is not None:
+                        values = block[row][np.newaxis]
+                    elif i < term.window_length:
+                        raise _NotEnoughHistory()
+                    else:
+                        values = window(self.bundle, self._loaded, input_.key, i, term.window_length)
+                    arrays.append(values if cols is None else values[:, cols])
+            except _NothingToCompute:
+                values = missing_array(term.dtype, len(self.assets))
+            else:
+                sids = self.sids if cols is None else self.sids[cols]
+                values = term._compute(arrays, self.bundle.sessions[i], sids)
+                if cols is not None:
+                    values = expand(values, cols, len(self.assets))
+            if result is None:
+                result = np.empty((stop - first, len(self.assets)), dtype=values.dtype)
+                if isinstance(values, LabelArray):
+                    result = LabelArray(result, values.categories)
+            result[row] = values
+        return result
@@ -0,0 +1,306 @@
+"""
+    On-disk daily data bundles
+
+    A bundle is a directory laid out as
+
+        sessions.npy                 int64 UTC nanoseconds of every trading session
+        assets/<field>.npy           sid, symbol, exchange and asset_name per asset
+        pricing/<field>.npy          (sessions x assets) open, high, low, close and volume
+        fundamentals/<field>.npy     (sessions x assets) one file per morningstar field, named
+                                     <group>.<field>, e.g. valuation.market_cap
+
+        pointintime/<key>/           assets, as_of, knowledge and values of every record of
+                                     a bitemporal column (see localq.pointintime)
+
+    Row i of every (sessions x assets) array holds the values known at the close of session i.
+    Columns with point-in-time records are materialized from them, so they never hold a value
+    before its knowledge date. String columns are dictionary-encoded (see localq.labels):
+    <field>.npy holds int32 codes and <field>.categories.npy the strings they stand for.
+
+    Columns are opened as read-only memory maps, so windows handed to factors are views into the
+    files rather than copies, only the pages a backtest touches are ever read, and every process
+    on a machine reading the same bundle shares one copy of it in the page cache.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from localq.assets import AssetFinder
+from localq.labels import MISSING_CODE, LabelArray, encode
+from localq.pointintime import PointInTimeStore
+
+ASSET_FIELDS = ('sid', 'symbol', 'exchange', 'asset_name')
+CATEGORIES_SUFFIX = '.categories'
+POINT_IN_TIME = 'pointintime'
+
+
+def column_path(root, key):
+    """
+        File holding the column key, which is '<dataset>/<field>'
+    """
+    return os.path.join(root, *key.split('/')) + '.npy'
+
+
+def categories_path(root, key):
+    """
+        File holding the dictionary of string column key
+    """
+    return os.path.join(root, *key.split('/')) + CATEGORIES_SUFFIX + '.npy'
+
+
+def point_in_time_path(root, key):
+    """
+        Directory holding the point-in-time records of column key
+    """
+    return os.path.join(root, POINT_IN_TIME, *key.split('/'))
+
+
+def write_bundle(root, sessions, assets, columns, point_in_time=None):
+    """
+        Writes a bundle. assets maps ASSET_FIELDS to per-asset sequences and columns maps
+        '<dataset>/<field>' keys to (sessions x assets) arrays. String columns are stored
+        dictionary-encoded.
+
+        point_in_time maps keys to PointInTimeStores; their records are saved and, unless
+        columns already holds them, the columns they back are materialized from them as of the
+        close of every session.
+    """
+    sessions = pd.DatetimeIndex(sessions)
+    if sessions.tz is not None:
+        sessions = sessions.tz_convert('UTC').tz_localize(None)
+
+    os.makedirs(os.path.join(root, 'assets'), exist_ok=True)
+    np.save(os.path.join(root, 'sessions.npy'),
+            sessions.values.astype('datetime64[ns]').view(np.int64))
+    for field in ASSET_FIELDS:
+        if field in assets:
+            np.save(os.path.join(root, 'assets', field + '.npy'), np.asarray(assets[field]))
+
+    columns = dict(columns)
+    for key, store in (point_in_time or {}).items():
+        store.save(point_in_time_path(root, key))
+        if key not in columns:
+            columns[key] = store.panel(sessions)
+
+    shape = (len(sessions), len(assets['sid']))
+    for key, values in columns.items():
+        values = np.asarray(values)
+        if values.shape != shape:
+            raise ValueError("column %s has shape %s, expected %s" % (key, values.shape, shape))
+        path = column_path(root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if values.dtype.kind in 'USO':
+            values, categories = encode(values)
+            np.save(categories_path(root, key), categories)
+        np.save(path, values)
+
+
+def _missing(values, encoded=False):
+    """
+        Where values are missing: NaN, NaT, empty strings or, for the codes of an encoded
+        column, MISSING_CODE
+    """
+    if encoded:
+        return values == MISSING_CODE
+    if values.dtype.kind == 'f':
+        return np.isnan(values)
+    if values.dtype.kind == 'M':
+        return np.isnat(values)
+    if values.dtype.kind in 'US':
+        return values == values.dtype.type()
+    return np.zeros(values.shape, dtype=bool)
+
+
+class Bundle(object):
+    """
+        Read access to a bundle directory. Columns are memory-mapped on first use; every array
+        handed out is a read-only view of the mapped file.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        nanos = np.load(os.path.join(root, 'sessions.npy'))
+        self.sessions = pd.DatetimeIndex(nanos.astype('datetime64[ns]')).tz_localize('UTC')
+        self._session_nanos = nanos
+
+        asset_fields = {}
+        for field in ASSET_FIELDS:
+            path = os.path.join(root, 'assets', field + '.npy')
+            if os.path.exists(path):
+                asset_fields[field] = np.load(path)
+        self.assets = AssetFinder(asset_fields['sid'], asset_fields['symbol'],
+                                  asset_fields['exchange'], asset_fields.get('asset_name'))
+
+        self._columns = {}
+        self._categories = {}
+        self._point_in_time = {}
+        self._changes = {}
+        self._changed_assets = {}
+
+    def has_column(self, key):
+        return key in self._columns or os.path.exists(column_path(self.root, key))
+
+    def column_keys(self):
+        """
+            Keys of every column in the bundle
+        """
+        keys = []
+        for dataset in sorted(os.listdir(self.root)):
+            directory = os.path.join(self.root, dataset)
+            if dataset in ('assets', POINT_IN_TIME) or not os.path.isdir(directory):
+                continue
+            keys.extend(dataset + '/' + name[:-len('.npy')]
+                        for name in sorted(os.listdir(directory))
+                        if name.endswith('.npy') and not name.endswith(CATEGORIES_SUFFIX + '.npy'))
+        return keys
+
+    def column(self, key):
+        """
+            The full (sessions x assets) array for key, memory-mapped read-only
+        """
+        values = self._columns.get(key)
+        if values is None:
+            path = column_path(self.root, key)
+            if not os.path.exists(path):
+                raise KeyError("bundle %s has no column %s" % (self.root, key))
+            values = self._columns[key] = np.load(path, mmap_mode='r')
+        return values
+
+    def categories(self, key):
+        """
+            The dictionary of string column key, or None if it isn't encoded
+        """
+        if key not in self._categories:
+            path = categories_path(self.root, key)
+            self._categories[key] = np.load(path) if os.path.exists(path) else None
+        return self._categories[key]
+
+    def point_in_time(self, key):
+        """
+            The PointInTimeStore behind column key, or None if the column has no records
+        """
+        if key not in self._point_in_time:
+            path = point_in_time_path(self.root, key)
+            self._point_in_time[key] = (PointInTimeStore.load(path, len(self.assets))
+                                        if os.path.isdir(path) else None)
+        return self._point_in_time[key]
+
+    def decode(self, key, values):
+        """
+            values read from column key as labels: strings, with None for missing ones, if
+            the column is encoded and unchanged otherwise
+        """
+        categories = self.categories(key)
+        if categories is None:
+            return values
+        return LabelArray(values, categories).as_labels()
+
+    def change_rows(self, key, nulls=False, block=256):
+        """
+            Sorted rows r of column key where some asset's value differs from row r - 1. With
+            nulls=True only changes between missing and present count. Worked out once per
+            column, a block of rows at a time.
+        """
+        changes = self._changes.get((key, nulls))
+        if changes is None:
+            values = self.column(key)
+            encoded = self.categories(key) is not None
+            found = []
+            for start in range(1, len(values), block):
+                rows = values[start - 1:start + block]
+                missing = _missing(rows, encoded)
+                if nulls:
+                    changed = missing[1:] != missing[:-1]
+                else:
+                    changed = (rows[1:] != rows[:-1]) & ~(missing[1:] & missing[:-1])
+                found.append(start + np.flatnonzero(changed.any(axis=1)))
+            changes = np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+            self._changes[(key, nulls)] = changes
+        return changes
+
+    def changed_assets(self, key, after, row, block=256):
+        """
+            Sorted positions of the assets whose value in column key changed in rows
+            (after, row], or None if the column changes for most assets every day (prices and
+            anything derived from them), in which case callers should assume all of them did.
+
+            The first call per column records, row by row, which assets changed, in compressed
+            sparse row form, so later calls only touch the changes themselves.
+        """
+        if key not in self._changed_assets:
+            values = self.column(key)
+            encoded = self.categories(key) is not None
+            #: Row 0 has nothing to change from
+            counts, found = [np.zeros(1, dtype=np.int64)], []
+            for start in range(1, len(values), block):
+                rows = values[start - 1:start + block]
+                missing = _missing(rows, encoded)
+                changed = (rows[1:] != rows[:-1]) & ~(missing[1:] & missing[:-1])
+                counts.append(changed.sum(axis=1))
+                found.append(np.nonzero(changed)[1].astype(np.int32))
+            offsets = np.concatenate([np.zeros(1, dtype=np.int64), np.concatenate(counts).cumsum()])
+            index = None
+            if offsets[-1] <= values.size // 2:
+                index = (offsets, np.concatenate(found) if found else np.empty(0, dtype=np.int32))
+            self._changed_assets[key] = index
+        index = self._changed_assets[key]
+        if index is None:
+            return None
+        offsets, assets = index
+        return np.unique(assets[offsets[after + 1]:offsets[row + 1]])
+
+    def window(self, key, end, length):
+        """
+            Rows [end - length, end) of column key, as a view of the mapped file. Encoded
+            string columns come back as a LabelArray.
+        """
+        if end < length:
+            raise ValueError("column %s has %d sessions before session %d, need %d"
+                             % (key, end, end, length))
+        window = self.column(key)[end - length:end]
+        categories = self.categories(key)
+        if categories is not None:
+            window = LabelArray(window, categories)
+        return window
+
+    def last_valid(self, key, row, positions, lookback=32):
+        """
+            For the assets at positions, the latest non-NaN value of float column key at or
+            before row (NaN if there is none). Only looks further back than lookback rows for
+            the assets that need it, instead of forward filling the whole column.
+        """
+        values = self.column(key)
+        positions = np.asarray(positions, dtype=np.intp)
+        result = np.full(len(positions), np.nan)
+        pending = np.arange(len(positions))
+        stop = row + 1
+        while len(pending) and stop > 0:
+            start = max(stop - lookback, 0)
+            window = values[start:stop, positions[pending]]
+            known = ~np.isnan(window)
+            found = known.any(axis=0)
+            #: Last known row of every column that has one
+            last = window.shape[0] - 1 - np.argmax(known[::-1], axis=0)
+            result[pending[found]] = window[last[found], np.flatnonzero(found)]
+            pending = pending[~found]
+            stop = start
+            lookback *= 4
+        return result
+
+    def session_index(self, date, side='left'):
+        """
+            Position of the first session on or after date (side='left') or of the first
+            session after date (side='right')
+        """
+        date = pd.Timestamp(date)
+        if date.tzinfo is not None:
+            date = date.tz_convert('UTC').tz_localize(None)
+        return int(np.searchsorted(self._session_nanos, date.normalize().value, side=side))
+
+    def sessions_between(self, start, end):
+        """
+            (first, stop) positions of the sessions from start to end inclusive
+        """
+        return self.session_index(start), self.session_index(end, side='right')
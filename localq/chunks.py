@@ -0,0 +1,88 @@
+"""
+    Chunked, prefetched evaluation of long date ranges
+
+    A pipeline over years of sessions with windows of up to five years reads a lot of column
+    rows, and the block engine (see localq.blocks) holds (sessions x assets) values of every
+    term at once. The engines' run_chunks split such ranges into chunks of sessions sized to a
+    memory budget and yield one output frame per chunk.
+
+    Every chunk's column rows, from the start of its longest window to its last session, are
+    copied out of the bundle's memory maps into memory by a background thread while the chunk
+    before it is computed, so reading the bundle overlaps with computing on it. The window rows
+    a chunk shares with the one before it are taken from that chunk's rows, so every row is
+    read from the bundle once however short the chunks. The budget covers the chunk being
+    computed and the one being loaded, windows included; a budget the windows alone don't fit
+    into is an error rather than a run that quietly exceeds it.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from localq.labels import LabelArray
+
+#: Default memory budget of a chunked run, in bytes
+DEFAULT_MEMORY_BUDGET = 512 * 2 ** 20
+
+
+def chunk_bounds(first, stop, budget, session_bytes, fixed_bytes=0):
+    """
+        [(first, stop)] chunks of the sessions [first, stop), each as long as fits two chunks
+        of session_bytes a session plus fixed_bytes each into budget bytes. Raises ValueError
+        if not even one session does.
+    """
+    length = int((budget / 2.0 - fixed_bytes) // max(session_bytes, 1))
+    if length < 1:
+        raise ValueError("a memory budget of %d bytes doesn't fit two chunks of %d bytes of "
+                         "windows and %d bytes a session; raise it to at least %d"
+                         % (budget, fixed_bytes, session_bytes, 2 * (fixed_bytes + session_bytes)))
+    return [(start, min(start + length, stop)) for start in range(first, stop, length)]
+
+
+def load_rows(bundle, columns, first, stop, previous=None):
+    """
+        {column key: (first row, rows)} with, in memory, the rows of every column of columns,
+        a dict of column key -> longest window (see Pipeline.windows), that the sessions
+        [first, stop) read. Rows already in previous, what load_rows returned for an earlier
+        chunk, are taken from there instead of the bundle.
+    """
+    loaded = {}
+    for key, length in columns.items():
+        start = max(first - max(length, 1), 0)
+        kept = None if previous is None else previous.get(key)
+        if kept is None or not kept[0] <= start <= kept[0] + len(kept[1]):
+            loaded[key] = (start, np.array(bundle.column(key)[start:stop - 1]))
+            continue
+        end = kept[0] + len(kept[1])
+        rows = kept[1][start - kept[0]:stop - 1 - kept[0]]
+        loaded[key] = (start, np.concatenate([rows, bundle.column(key)[end:stop - 1]]))
+    return loaded
+
+
+def window(bundle, loaded, key, end, length):
+    """
+        bundle.window(key, end, length), from the rows in loaded where they cover it
+    """
+    rows = loaded.get(key)
+    if rows is None or not rows[0] <= end - length or end - rows[0] > len(rows[1]):
+        return bundle.window(key, end, length)
+    values = rows[1][end - length - rows[0]:end - rows[0]]
+    categories = bundle.categories(key)
+    return values if categories is None else LabelArray(values, categories)
+
+
+def prefetched(chunks, load):
+    """
+        Yields (first, stop, load(first, stop, previous)) for every chunk of chunks, with
+        previous what load returned for the chunk before it (None for the first), loading the
+        next chunk on a background thread while the caller works on the current one
+    """
+    if not chunks:
+        return
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(load, chunks[0][0], chunks[0][1], None)
+        for n, (first, stop) in enumerate(chunks):
+            loaded = pending.result()
+            if n + 1 < len(chunks):
+                pending = pool.submit(load, chunks[n + 1][0], chunks[n + 1][1], loaded)
+            yield first, stop, loaded
@@ -0,0 +1,67 @@
+"""
+    Pipeline datasets: USEquityPricing and morningstar fundamentals
+
+    morningstar columns are created on first access, so morningstar.valuation.market_cap maps to
+    the bundle column fundamentals/valuation.market_cap. Fields are floats unless listed in
+    MORNINGSTAR_DTYPES.
+"""
+
+from localq.pipeline import BOOL, DATETIME, FLOAT, OBJECT, BoundColumn
+
+#: Non-float morningstar fields, by '<group>.<field>'
+MORNINGSTAR_DTYPES = {
+    'share_class_reference.is_primary_share': BOOL,
+    'share_class_reference.is_depositary_receipt': BOOL,
+    'share_class_reference.security_type': OBJECT,
+    'share_class_reference.exchange_id': OBJECT,
+    'share_class_reference.symbol': OBJECT,
+    'company_reference.standard_name': OBJECT,
+    'company_reference.short_name': OBJECT,
+    'company_reference.primary_symbol': OBJECT,
+    'company_reference.country_id': OBJECT,
+    'financial_statement_filing.period_ending_date': DATETIME,
+    'financial_statement_filing.file_date': DATETIME,
+    'earnings_report.period_ending_date': DATETIME,
+    'valuation_ratios.dividend_yield_as_of': DATETIME,
+}
+
+
+class _PricingDataSet(object):
+    """
+        Daily OHLCV
+    """
+
+    def __init__(self):
+        for field in ('open', 'high', 'low', 'close', 'volume'):
+            setattr(self, field, BoundColumn('pricing', field, FLOAT))
+
+
+class _FundamentalsGroup(object):
+    """
+        One morningstar group, e.g. morningstar.valuation
+    """
+
+    def __init__(self, group):
+        self._group = group
+
+    def __getattr__(self, field):
+        if field.startswith('_'):
+            raise AttributeError(field)
+        name = self._group + '.' + field
+        column = BoundColumn('fundamentals', name, MORNINGSTAR_DTYPES.get(name, FLOAT))
+        setattr(self, field, column)
+        return column
+
+
+class _Morningstar(object):
+
+    def __getattr__(self, group):
+        if group.startswith('_'):
+            raise AttributeError(group)
+        namespace = _FundamentalsGroup(group)
+        setattr(self, group, namespace)
+        return namespace
+
+
+USEquityPricing = _PricingDataSet()
+morningstar = _Morningstar()
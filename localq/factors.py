@@ -0,0 +1,41 @@
+"""
+    Built-in factors
+
+    The means here don't roll (see localq.pipeline): a running sum adds and drops values in a
+    different order than the full window's sum, so it can't match it bit for bit.
+"""
+
+import numpy as np
+
+from localq.datasets import USEquityPricing
+from localq.pipeline import CustomFactor
+
+
+def nanmean(values):
+    """
+        Column means ignoring NaN; all-NaN columns come out NaN without a warning
+    """
+    known = ~np.isnan(values)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(known, values, 0.0).sum(axis=0) / known.sum(axis=0)
+
+
+class AverageDollarVolume(CustomFactor):
+    """
+        Mean of close * volume over the window, ignoring missing days
+    """
+    inputs = [USEquityPricing.close, USEquityPricing.volume]
+    elementwise = True
+
+    def compute(self, today, assets, out, close, volume):
+        out[:] = nanmean(close * volume)
+
+
+class SimpleMovingAverage(CustomFactor):
+    """
+        Mean of the single input over the window, ignoring missing days
+    """
+    elementwise = True
+
+    def compute(self, today, assets, out, values):
+        out[:] = nanmean(values)
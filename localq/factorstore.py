@@ -0,0 +1,201 @@
+"""
+    Windowed factor values computed once and shared between runs
+
+    A parameter sweep runs one algorithm many times with different screen thresholds. The
+    windowed factors those screens are built from (trailing twelve month fundamentals, earnings
+    histories, moving averages) don't depend on the thresholds, yet every run would compute them
+    again. An engine given a FactorStore records the value of every windowed term it computes,
+    per session, and once the store is frozen looks terms up in it before computing them.
+
+    Terms are matched by structure (class, window, inputs, parameters and, unless the term is
+    elementwise, its mask) rather than identity, so the factors a second run of an algorithm
+    builds find the values the first run stored. Elementwise terms are recorded over every
+    asset, unmasked, so that runs whose masks differ because a threshold did still share them.
+
+    A frozen store is only ever read. Processes forked after it's filled (see localq.sweep)
+    share its arrays copy-on-write, i.e. one physical copy in memory for the whole pool.
+
+    A FactorPanel is the same on disk, for a range of sessions: FactorPanel.write computes
+    every windowed term of some pipelines once, over every asset, into a directory of
+
+        sessions.npy        int64 UTC nanoseconds of the panel's sessions, consecutive
+                            sessions of the bundle
+        keys.txt            the key of every term, one per line
+        <n>.npy             (sessions x assets) values of the term on line n, with one field
+                            per output for multiple-output factors
+
+    and FactorPanel opens them as memory maps. A panel can stand in for a frozen store in any
+    engine, or back a localq.blocks.BlockPipelineEngine, which evaluates the screens on top
+    of it for the whole range at once.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from localq.pipeline import SimplePipelineEngine, missing_array, term_key
+
+class FactorStore(object):
+    """
+        Values of windowed terms by term and session. Records while recording is True;
+        freeze() makes it read-only.
+    """
+
+    def __init__(self):
+        self.recording = True
+        #: key -> {session: values}
+        self._values = {}
+        #: term -> key, so structure is only walked once per term object
+        self._keys = {}
+
+    def covers(self, term):
+        """
+            Whether term's values are worth storing: anything reading a window of history
+        """
+        return term.window_length > 1
+
+    def key(self, term):
+        try:
+            return self._keys[term]
+        except KeyError:
+            key = self._keys[term] = term_key(term, masked=not term.elementwise)
+            return key
+
+    def get(self, term, i):
+        """
+            Stored values of term on session i, or None. Elementwise terms are unmasked.
+        """
+        return self._values.get(self.key(term), {}).get(i)
+
+    def put(self, term, i, values):
+        if self.recording:
+            self._values.setdefault(self.key(term), {})[i] = values
+
+    def freeze(self):
+        self.recording = False
+
+    def __len__(self):
+        return sum(len(sessions) for sessions in self._values.values())
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for sessions in self._values.values()
+                   for values in sessions.values())
+
+
+class _PanelWriter(FactorStore):
+    """
+        Store that writes what an engine records to the .npy files of a panel as it goes
+    """
+
+    def __init__(self, root, first, stop, n_assets):
+        FactorStore.__init__(self)
+        self.root = root
+        self.first = first
+        self.shape = (stop - first, n_assets)
+        self.arrays = {}
+        self.order = []
+
+    def get(self, term, i):
+        return None
+
+    def put(self, term, i, values):
+        key = self.key(term)
+        array = self.arrays.get(key)
+        if array is None:
+            path = os.path.join(self.root, '%d.npy' % len(self.order))
+            array = np.lib.format.open_memmap(path, mode='w+', dtype=term.dtype, shape=self.shape)
+            array[:] = missing_array(term.dtype, self.shape[1])
+            self.arrays[key] = array
+            self.order.append(key)
+        array[i - self.first] = values
+
+
+class FactorPanel(FactorStore):
+    """
+        The windowed term values saved at root for part of bundle (see FactorPanel.write).
+        Read-only.
+    """
+
+    def __init__(self, root, bundle):
+        FactorStore.__init__(self)
+        self.recording = False
+        self.root = root
+        nanos = np.load(os.path.join(root, 'sessions.npy'))
+        sessions = pd.DatetimeIndex(nanos.astype('datetime64[ns]'), tz='UTC')
+        self.first = int(bundle.sessions.get_indexer(sessions[:1])[0])
+        self.stop = self.first + len(sessions)
+        if self.first < 0 or not bundle.sessions[self.first:self.stop].equals(sessions):
+            raise ValueError("panel %s doesn't match the sessions of bundle %s" % (root, bundle.root))
+        with open(os.path.join(root, 'keys.txt')) as keys_file:
+            self._files = {line.rstrip('\n'): n for n, line in enumerate(keys_file)}
+        self._arrays = {}
+
+    @classmethod
+    def write(cls, root, bundle, pipelines, start, end):
+        """
+            Computes the windowed terms of pipelines for the sessions of bundle from start to
+            end into a panel at root and opens it
+        """
+        first, stop = bundle.sessions_between(start, end)
+        if first >= stop:
+            raise ValueError("no sessions between %s and %s" % (start, end))
+        os.makedirs(root, exist_ok=True)
+        writer = _PanelWriter(root, first, stop, len(bundle.assets))
+        engine = SimplePipelineEngine(bundle, factor_store=writer)
+        terms = [term for pipeline in pipelines for term in pipeline.terms() if term.window_length > 1]
+        for i in range(first, stop):
+            cache = {}
+            for term in terms:
+                engine.evaluate(term, i, cache)
+        for array in writer.arrays.values():
+            array.flush()
+        np.save(os.path.join(root, 'sessions.npy'),
+                bundle.sessions[first:stop].tz_localize(None).values.astype('datetime64[ns]').view(np.int64))
+        with open(os.path.join(root, 'keys.txt'), 'w') as keys_file:
+            keys_file.writelines(repr(key) + '\n' for key in writer.order)
+        return cls(root, bundle)
+
+    def _array(self, term):
+        """
+            The (sessions x assets) values of term, or None if the panel doesn't have them
+        """
+        if term.window_length <= 1:
+            return None
+        n = self._files.get(repr(self.key(term)))
+        if n is None:
+            return None
+        array = self._arrays.get(n)
+        if array is None:
+            array = self._arrays[n] = np.load(os.path.join(self.root, '%d.npy' % n), mmap_mode='r')
+        return array
+
+    def covers(self, term):
+        return self._array(term) is not None
+
+    def get(self, term, i):
+        array = self._array(term)
+        if array is None or not self.first <= i < self.stop:
+            return None
+        return array[i - self.first]
+
+    def block(self, term, first, stop):
+        """
+            (sessions x assets) values of term for the sessions [first, stop) of the bundle,
+            or None
+        """
+        array = self._array(term)
+        if array is None or first < self.first or stop > self.stop:
+            return None
+        return array[first - self.first:stop - self.first]
+
+    def put(self, term, i, values):
+        pass
+
+    def __len__(self):
+        return len(self._files) * (self.stop - self.first)
+
+    @property
+    def nbytes(self):
+        return sum(os.path.getsize(os.path.join(self.root, '%d.npy' % n)) for n in self._files.values())
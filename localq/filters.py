@@ -0,0 +1,30 @@
+"""
+    Built-in filters
+"""
+
+from localq.datasets import morningstar
+from localq.factors import AverageDollarVolume
+
+
+def IsPrimaryShare():
+    """
+        Assets that are their company's primary share class
+    """
+    return morningstar.share_class_reference.is_primary_share.latest
+
+
+def Q500US():
+    """
+        Approximation of Quantopian's Q500US: the 500 primary shares with fundamental data and
+        the highest 200 day average dollar volume
+    """
+    eligible = IsPrimaryShare() & morningstar.valuation.market_cap.latest.notnull()
+    return AverageDollarVolume(window_length=200).top(500, mask=eligible)
+
+
+def Q1500US():
+    """
+        Like Q500US, for the top 1500
+    """
+    eligible = IsPrimaryShare() & morningstar.valuation.market_cap.latest.notnull()
+    return AverageDollarVolume(window_length=200).top(1500, mask=eligible)
@@ -0,0 +1,427 @@
+"""
+    get_fundamentals queries
+
+    Supports the SQLAlchemy-flavoured subset our algorithms use:
+
+        get_fundamentals(query(fundamentals.valuation.market_cap, ...)
+                         .filter(fundamentals.valuation.market_cap > 1.5e9)
+                         .order_by(fundamentals.valuation_ratios.ev_to_ebitda.asc())
+                         .limit(200))
+
+    Results come back the way Quantopian returned them: one row per queried field and one column
+    per security. get_fundamentals on a session sees the values as of the previous close.
+"""
+
+import operator
+
+import numpy as np
+import pandas as pd
+
+from localq.datasets import MORNINGSTAR_DTYPES
+from localq.pipeline import FLOAT
+
+
+class FundamentalColumn(object):
+    """
+        fundamentals.<group>.<field>; comparisons build Predicates, asc()/desc() Orderings
+    """
+
+    def __init__(self, group, field):
+        self.group = group
+        self.name = field
+        self.key = 'fundamentals/%s.%s' % (group, field)
+        self.dtype = MORNINGSTAR_DTYPES.get('%s.%s' % (group, field), FLOAT)
+
+    __hash__ = object.__hash__
+
+    def __gt__(self, value):
+        return Predicate(operator.gt, self, value)
+
+    def __ge__(self, value):
+        return Predicate(operator.ge, self, value)
+
+    def __lt__(self, value):
+        return Predicate(operator.lt, self, value)
+
+    def __le__(self, value):
+        return Predicate(operator.le, self, value)
+
+    def __eq__(self, value):
+        return Predicate(operator.eq, self, value)
+
+    def __ne__(self, value):
+        return Predicate(operator.ne, self, value)
+
+    def asc(self):
+        return Ordering(self, ascending=True)
+
+    def desc(self):
+        return Ordering(self, ascending=False)
+
+    def __repr__(self):
+        return 'fundamentals.%s.%s' % (self.group, self.name)
+
+
+class Predicate(object):
+    """
+        column <op> value
+    """
+
+    def __init__(self, op, column, value):
+        self.op = op
+        self.column = column
+        self.value = value
+
+    def evaluate(self, values):
+        with np.errstate(invalid='ignore'):
+            return np.asarray(self.op(values, self.value), dtype=bool)
+
+
+class Ordering(object):
+
+    def __init__(self, column, ascending):
+        self.column = column
+        self.ascending = ascending
+
+
+class Query(object):
+    """
+        A get_fundamentals query. filter, order_by and limit return new queries.
+    """
+
+    def __init__(self, columns, filters=(), orderings=(), limit=None):
+        self.columns = tuple(columns)
+        self.filters = tuple(filters)
+        self.orderings = tuple(orderings)
+        self.limit_ = limit
+
+    def filter(self, *predicates):
+        return Query(self.columns, self.filters + predicates, self.orderings, self.limit_)
+
+    def order_by(self, *orderings):
+        return Query(self.columns, self.filters, self.orderings + orderings, self.limit_)
+
+    def limit(self, n):
+        return Query(self.columns, self.filters, self.orderings, n)
+
+    def key(self):
+        """
+            Hashable description of the query, equal for queries that select the same rows:
+            filters are and-ed together, so their order doesn't matter
+        """
+        filters = sorted((predicate.column.key, predicate.op.__name__, repr(predicate.value))
+                         for predicate in self.filters)
+        return (tuple(column.key for column in self.columns), tuple(filters),
+                tuple((ordering.column.key, ordering.ascending) for ordering in self.orderings),
+                self.limit_)
+
+
+class _Group(object):
+
+    def __init__(self, group):
+        self._group = group
+
+    def __getattr__(self, field):
+        if field.startswith('_'):
+            raise AttributeError(field)
+        column = FundamentalColumn(self._group, field)
+        setattr(self, field, column)
+        return column
+
+
+class _Fundamentals(object):
+
+    def __getattr__(self, group):
+        if group.startswith('_'):
+            raise AttributeError(group)
+        namespace = _Group(group)
+        setattr(self, group, namespace)
+        return namespace
+
+
+fundamentals = _Fundamentals()
+
+
+def query(*columns):
+    return Query(columns)
+
+
+def _inputs(query):
+    """
+        Keys of every column the query reads, in a fixed order
+    """
+    columns = [column.key for column in query.columns]
+    columns.extend(predicate.column.key for predicate in query.filters)
+    columns.extend(ordering.column.key for ordering in query.orderings)
+    return sorted(set(columns))
+
+
+class FundamentalsFrame(pd.DataFrame):
+    """
+        A get_fundamentals result. Algorithms index it one security at a time,
+        frame[stock]['field'], and pandas builds a new Series on every such lookup, so each
+        column's Series is kept after its first lookup. Frames derived from it are plain
+        DataFrames.
+    """
+
+    def __init__(self, *args, **kwargs):
+        pd.DataFrame.__init__(self, *args, **kwargs)
+        object.__setattr__(self, '_column_series', {})
+
+    @property
+    def _constructor(self):
+        return pd.DataFrame
+
+    def __getitem__(self, key):
+        try:
+            return self._column_series[key]
+        except (KeyError, TypeError):
+            pass
+        value = pd.DataFrame.__getitem__(self, key)
+        if isinstance(value, pd.Series) and key in self.columns:
+            self._column_series[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._column_series.clear()
+        pd.DataFrame.__setitem__(self, key, value)
+
+
+class _CachedResult(object):
+    """
+        A query's result on one row, with the per-asset filter mask and ordering keys it was
+        computed from
+    """
+
+    def __init__(self, row, version, mask, keys, selected, frame):
+        self.row = row
+        self.version = version
+        self.mask = mask
+        self.keys = keys
+        self.selected = selected
+        self.frame = frame
+
+
+class FundamentalsReader(object):
+    """
+        Answers get_fundamentals queries from a Bundle.
+
+        Only the columns a query selects, filters or orders by are read. Filters are applied as
+        boolean masks over every asset, or over a block of sessions x assets at once for date
+        ranges; string filters are evaluated once per distinct string. order_by(...).limit(n)
+        partitions out the n best rows before sorting them instead of sorting every survivor.
+
+        Algorithms tend to run the same query every morning while fundamentals only change
+        when filings land, so daily results are cached by query and data version: the number
+        of changes each column the query reads has had so far. When no column changed the
+        previous frame comes back as is; otherwise only the assets whose filter or ordering
+        values changed are re-evaluated. Returned frames may be shared between days and
+        should be treated as read-only.
+    """
+    #: Most queries to keep results for
+    cache_size = 32
+
+    def __init__(self, bundle, block=64, cache=True):
+        self.bundle = bundle
+        #: Sessions per block of rows read at once by get_fundamentals_range
+        self.block = block
+        self.cache = cache
+        #: Query key -> _CachedResult
+        self._results = {}
+
+    def get_fundamentals(self, query, session):
+        """
+            Result frame for the query on the session at position session of the bundle
+        """
+        row = session - 1
+        if row < 0:
+            raise ValueError("no fundamentals before the first session of the bundle")
+        if not self.cache:
+            return self._evaluate(query, row, None).frame
+
+        key = query.key()
+        version = self._version(query, row)
+        result = self._results.get(key)
+        if result is None or result.row > row:
+            result = self._evaluate(query, row, version)
+        elif result.version != version:
+            result = self._patch(query, result, row, version)
+        result.row, result.version = row, version
+
+        self._results.pop(key, None)
+        self._results[key] = result
+        while len(self._results) > self.cache_size:
+            self._results.pop(next(iter(self._results)))
+        return result.frame
+
+    def _version(self, query, row):
+        """
+            Number of changes up to row of every column the query reads
+        """
+        return tuple(int(np.searchsorted(self.bundle.change_rows(column), row, side='right'))
+                     for column in _inputs(query))
+
+    def _evaluate(self, query, row, version):
+        mask = self._mask(query, row, row + 1)[0]
+        keys = [self._rows(ordering.column, row, row + 1)[0].astype(np.float64)
+                for ordering in query.orderings]
+        selected = self._order(query, keys, np.flatnonzero(mask))
+        return _CachedResult(row, version, mask, keys, selected, self._frame(query, row, selected))
+
+    def _patch(self, query, result, row, version):
+        """
+            result moved on to row, re-evaluating only the assets whose filter or ordering
+            values changed since result.row. Updates result in place.
+        """
+        changed = set(column for column, before, after in zip(_inputs(query), result.version, version)
+                      if before != after)
+
+        def changed_assets(columns):
+            assets = [self.bundle.changed_assets(column, result.row, row)
+                      for column in set(columns) & changed]
+            if any(positions is None for positions in assets):
+                return np.arange(len(self.bundle.assets))
+            return np.unique(np.concatenate(assets)) if assets else np.empty(0, dtype=np.intp)
+
+        assets = changed_assets([predicate.column.key for predicate in query.filters]
+                                + [ordering.column.key for ordering in query.orderings])
+        if len(assets):
+            mask = np.ones(len(assets), dtype=bool)
+            for predicate in query.filters:
+                values = self.bundle.column(predicate.column.key)[row, assets]
+                categories = self.bundle.categories(predicate.column.key)
+                if categories is None:
+                    mask &= predicate.evaluate(values)
+                else:
+                    mask &= predicate.evaluate(categories)[values]
+            result.mask[assets] = mask
+            for key, ordering in zip(result.keys, query.orderings):
+                key[assets] = self.bundle.column(ordering.column.key)[row, assets]
+
+            if not self._keeps_selection(query, result, assets):
+                selected = self._order(query, result.keys, np.flatnonzero(result.mask))
+                if not np.array_equal(selected, result.selected):
+                    result.selected = selected
+                    result.frame = None
+
+        if result.frame is not None:
+            projected = changed_assets(column.key for column in query.columns)
+            if np.isin(projected, result.selected).any():
+                result.frame = None
+        if result.frame is None:
+            result.frame = self._frame(query, row, result.selected)
+        return result
+
+    def _keeps_selection(self, query, result, assets):
+        """
+            Whether the result's selection is certainly unaffected by new values for assets:
+            none of them was selected, and any that now pass rank after the last selected one
+        """
+        selected = result.selected
+        if np.isin(assets, selected).any():
+            return False
+        passing = assets[result.mask[assets]]
+        if not len(passing):
+            return True
+        if query.limit_ is None or len(selected) < query.limit_:
+            return False
+        last = selected[-1]
+        if not query.orderings:
+            return bool((passing > last).all())
+        ordering = query.orderings[0]
+        sign = 1.0 if ordering.ascending else -1.0
+        key = result.keys[0]
+        #: Ties on the first ordering would need the others, so don't try
+        return bool((sign * key[passing] > sign * key[last]).all())
+
+    def _frame(self, query, row, selected):
+        data = [self._values(column, row, selected) for column in query.columns]
+        #: One 2-D block, which pandas wraps far faster than a list of rows
+        dtypes = set(values.dtype for values in data)
+        block = np.empty((len(data), len(selected)), dtype=dtypes.pop() if len(dtypes) == 1 else object)
+        for i, values in enumerate(data):
+            if block.dtype == object and values.dtype.kind == 'M':
+                #: Object arrays would otherwise hold nanosecond integers
+                values = pd.DatetimeIndex(values).astype(object)
+            block[i] = values
+        return FundamentalsFrame(block, index=[column.name for column in query.columns],
+                                 columns=pd.Index(self.bundle.assets.assets[selected]))
+
+    def get_fundamentals_range(self, query, start_date, end_date):
+        """
+            The query's results on every session from start_date to end_date in one frame
+            indexed by (session, asset), rows of each session in query order and one column per
+            queried field. frame.xs(session).T is what get_fundamentals returns for session.
+        """
+        first, stop = self.bundle.sessions_between(start_date, end_date)
+        first = max(first, 1)
+        if first >= stop:
+            raise ValueError("no sessions with fundamentals between %s and %s"
+                             % (start_date, end_date))
+
+        frames = []
+        for block_first in range(first, stop, self.block):
+            start, end = block_first - 1, min(block_first + self.block, stop) - 1
+            mask = self._mask(query, start, end)
+            keys = [self._rows(ordering.column, start, end) for ordering in query.orderings]
+            days, selections = [], []
+            for day in range(end - start):
+                selected = self._order(query, [key[day] for key in keys],
+                                       np.flatnonzero(mask[day]))
+                days.append(np.full(len(selected), day))
+                selections.append(selected)
+            days = np.concatenate(days)
+            selected = np.concatenate(selections)
+
+            index = pd.MultiIndex.from_arrays([self.bundle.sessions[block_first + days],
+                                               self.bundle.assets.assets[selected]])
+            frames.append(pd.DataFrame(
+                {column.name: self._values(column, start + days, selected)
+                 for column in query.columns},
+                index=index, columns=[column.name for column in query.columns]))
+        return pd.concat(frames)
+
+    def _rows(self, column, start, stop):
+        return self.bundle.column(column.key)[start:stop]
+
+    def _values(self, column, rows, positions):
+        return self.bundle.decode(column.key, self.bundle.column(column.key)[rows, positions])
+
+    def _mask(self, query, start, stop):
+        """
+            (sessions x assets) mask of the rows [start, stop) passing every filter
+        """
+        mask = np.ones((stop - start, len(self.bundle.assets)), dtype=bool)
+        for predicate in query.filters:
+            values = self._rows(predicate.column, start, stop)
+            categories = self.bundle.categories(predicate.column.key)
+            if categories is None:
+                mask &= predicate.evaluate(values)
+            else:
+                mask &= predicate.evaluate(categories)[values]
+        return mask
+
+    def _order(self, query, keys, selected):
+        """
+            selected asset positions in the query's order, cut to its limit. keys are the rows
+            of the ordering columns.
+        """
+        limit = query.limit_
+        if not query.orderings:
+            return selected[:limit]
+
+        keys = [key[selected].astype(np.float64) if ordering.ascending
+                else -key[selected].astype(np.float64)
+                for key, ordering in zip(keys, query.orderings)]
+        if limit is not None and 0 < limit < len(selected):
+            #: Only rows at least as good as the limit-th on the first ordering can make it;
+            #: NaNs sort last, so a NaN there means everything can
+            cutoff = np.partition(keys[0], limit - 1)[limit - 1]
+            if not np.isnan(cutoff):
+                candidates = np.flatnonzero(keys[0] <= cutoff)
+                selected = selected[candidates]
+                keys = [key[candidates] for key in keys]
+
+        #: lexsort is stable, so ties keep asset order like a chain of stable sorts would
+        order = np.lexsort(keys[::-1])
+        return selected[order][:limit]
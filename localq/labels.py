@@ -0,0 +1,64 @@
+"""
+    Dictionary-encoded string columns
+
+    Reference data strings (exchange ids, security types, tickers, company names) repeat across
+    every session and take only a few thousand distinct values across the whole universe. Bundles
+    store them as integer codes into a per-column dictionary of categories, which is a fraction of
+    the size and lets string predicates run once per distinct string instead of once per asset
+    per day: the predicate fills a code -> bool table and the codes index into it.
+
+    Code 0 is always the empty string, which stands for a missing label.
+"""
+
+import numpy as np
+
+MISSING_CODE = 0
+
+
+def encode(values):
+    """
+        (codes, categories) for an array of strings; None counts as missing
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'O':
+        values = np.array(['' if value is None else value for value in values.ravel().tolist()],
+                          dtype=str).reshape(values.shape)
+    categories, codes = np.unique(values, return_inverse=True)
+    if not len(categories) or categories[0] != '':
+        categories = np.concatenate([np.array([''], dtype=categories.dtype), categories])
+        codes += 1
+    return codes.reshape(values.shape).astype(np.int32), categories
+
+
+class LabelArray(np.ndarray):
+    """
+        Integer codes into categories, an array of distinct strings starting with ''. Slices
+        and fancy-indexed selections keep their categories.
+    """
+
+    def __new__(cls, codes, categories):
+        array = np.asarray(codes).view(cls)
+        array.categories = categories
+        return array
+
+    def __array_finalize__(self, obj):
+        self.categories = getattr(obj, 'categories', None)
+
+    @classmethod
+    def missing(cls, length, categories):
+        return cls(np.full(length, MISSING_CODE, dtype=np.int32), categories)
+
+    @property
+    def codes(self):
+        return self.view(np.ndarray)
+
+    def is_missing(self):
+        return self.codes == MISSING_CODE
+
+    def as_labels(self):
+        """
+            The strings as an object array, with None for missing labels
+        """
+        labels = self.categories.astype(object)[self.codes]
+        labels[self.is_missing()] = None
+        return labels
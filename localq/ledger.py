@@ -0,0 +1,145 @@
+"""
+    Array-backed portfolio ledger
+
+    Holdings live in parallel NumPy arrays with one slot per asset of the bundle (the asset's
+    column in every (sessions x assets) array): amounts, cost basis and last price. Prices
+    arrive as a vector for the held slots, and positions value and gross exposure are each a
+    dot product over the arrays, so marking to market costs the same whether we hold two
+    stocks or two hundred.
+
+    context.portfolio.positions is a read-only view over the ledger that builds Position
+    objects on access and lists positions in the order they were opened, like the dict
+    Quantopian hands out.
+"""
+
+import numpy as np
+
+
+class Position(object):
+
+    def __init__(self, asset, amount=0, cost_basis=0.0, last_sale_price=0.0):
+        self.asset = asset
+        self.sid = asset
+        self.amount = amount
+        self.cost_basis = cost_basis
+        self.last_sale_price = last_sale_price
+
+    def __repr__(self):
+        return 'Position(%r, amount=%d)' % (self.asset, self.amount)
+
+
+class Ledger(object):
+    """
+        Amounts, cost basis and last sale price of every asset in finder, an AssetFinder
+    """
+
+    def __init__(self, finder):
+        self.finder = finder
+        self.amounts = np.zeros(len(finder), dtype=np.int64)
+        self.cost_basis = np.zeros(len(finder))
+        self.last_prices = np.zeros(len(finder))
+        #: Sequence number of the fill that opened each slot's position
+        self.opened = np.zeros(len(finder), dtype=np.int64)
+        self._fills = 0
+        #: Held slots in opening order, until the next fill
+        self._held = None
+
+    def held(self):
+        """
+            Slots with a position, in the order the positions were opened
+        """
+        if self._held is None:
+            held = np.flatnonzero(self.amounts)
+            self._held = held[np.argsort(self.opened[held], kind='mergesort')]
+        return self._held
+
+    def fill(self, slot, amount, price):
+        """
+            Books amount shares of slot bought (or sold, if negative) at price
+        """
+        held = self.amounts[slot]
+        total = held + amount
+        self._fills += 1
+        if total == 0:
+            self.amounts[slot] = 0
+            self.cost_basis[slot] = 0.0
+            self.last_prices[slot] = 0.0
+        else:
+            if held == 0:
+                self.opened[slot] = self._fills
+            if held == 0 or (held > 0) == (amount > 0):
+                #: Opening or adding to a position averages the cost basis
+                self.cost_basis[slot] = (self.cost_basis[slot] * held + price * amount) / total
+            elif (total > 0) != (held > 0):
+                #: Flipping sides starts a new position at this price
+                self.cost_basis[slot] = price
+            self.amounts[slot] = total
+            self.last_prices[slot] = price
+        if held == 0 or total == 0:
+            self._held = None
+
+    def mark(self, prices):
+        """
+            New last sale prices, a vector aligned with held()
+        """
+        self.last_prices[self.held()] = prices
+
+    def positions_value(self):
+        return float(np.dot(self.amounts, self.last_prices))
+
+    def gross_exposure(self):
+        return float(np.dot(np.abs(self.amounts), self.last_prices))
+
+    def position(self, asset):
+        """
+            The Position in asset, an Asset or a sid, with amount 0 if we don't hold it
+        """
+        try:
+            slot = self.finder.position(asset)
+        except LookupError:
+            return Position(asset)
+        return Position(self.finder.assets[slot], int(self.amounts[slot]),
+                        float(self.cost_basis[slot]), float(self.last_prices[slot]))
+
+
+class Positions(object):
+    """
+        Open positions by asset, a read-only mapping over a Ledger. Looking up an asset we
+        don't hold gives an empty Position.
+    """
+
+    def __init__(self, ledger):
+        self._ledger = ledger
+
+    def __len__(self):
+        return len(self._ledger.held())
+
+    def __iter__(self):
+        return iter(self._ledger.finder.assets[self._ledger.held()].tolist())
+
+    def __contains__(self, asset):
+        try:
+            return self._ledger.amounts[self._ledger.finder.position(asset)] != 0
+        except (LookupError, TypeError):
+            return False
+
+    def __getitem__(self, asset):
+        return self._ledger.position(asset)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def get(self, asset, default=None):
+        return self[asset] if asset in self else default
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return [self[asset] for asset in self]
+
+    def items(self):
+        return [(asset, self[asset]) for asset in self]
+
+    def __repr__(self):
+        return 'Positions(%r)' % dict(self.items())
@@ -0,0 +1,125 @@
+"""
+    Minute bars for intraday replays
+
+    A bundle may carry minute bars for a handful of assets in a minutes/ directory:
+
+        minutes/sids.npy             sids of the assets with minute bars, in bundle order
+        minutes/<yyyy-mm>.npz        compressed sessions, close and volume of one month, where
+                                     sessions holds int64 UTC nanoseconds and close and volume
+                                     are (sessions * 390 x assets) arrays, a session's minutes
+                                     one after the other
+
+    Months are read one at a time as a replay reaches them, so memory is bounded by a month of
+    bars however long the replay. Readers are generators: MinuteBars.sessions yields one
+    session's bars at a time, forward_filled carries prices over minutes without a trade, and
+    with_changes adds which minutes moved any price, so a replay can skip callbacks for minutes
+    in which nothing happened.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+MINUTES_IN_SESSION = 390
+FIELDS = ('close', 'volume')
+
+
+def write_minute_bars(root, sids, sessions, close, volume):
+    """
+        Writes minute bars of the assets with sids for sessions to bundle root. close and volume
+        are (sessions * 390 x assets) arrays. Sessions must be in order.
+    """
+    directory = os.path.join(root, 'minutes')
+    os.makedirs(directory, exist_ok=True)
+    np.save(os.path.join(directory, 'sids.npy'), np.asarray(sids, dtype=np.int64))
+
+    sessions = pd.DatetimeIndex(sessions)
+    if sessions.tz is not None:
+        sessions = sessions.tz_convert('UTC').tz_localize(None)
+    close = np.asarray(close)
+    volume = np.asarray(volume)
+    if close.shape != (len(sessions) * MINUTES_IN_SESSION, len(sids)) or volume.shape != close.shape:
+        raise ValueError("minute bars need %d rows of %d assets"
+                         % (len(sessions) * MINUTES_IN_SESSION, len(sids)))
+
+    months = sessions.to_period('M')
+    for month in months.unique():
+        first, stop = np.flatnonzero(months == month)[[0, -1]] + [0, 1]
+        rows = slice(first * MINUTES_IN_SESSION, stop * MINUTES_IN_SESSION)
+        np.savez_compressed(os.path.join(directory, '%s.npz' % month),
+                            sessions=sessions[first:stop].values.astype('datetime64[ns]').view(np.int64),
+                            close=close[rows], volume=volume[rows])
+
+
+def forward_filled(stream):
+    """
+        Carries each asset's last close forward over the minutes of stream without a trade,
+        within the session
+    """
+    for session, bars in stream:
+        close = bars['close']
+        minutes = np.arange(len(close))[:, None]
+        last = np.maximum.accumulate(np.where(np.isnan(close), 0, minutes), axis=0)
+        filled = dict(bars)
+        filled['close'] = close[last, np.arange(close.shape[1])]
+        yield session, filled
+
+
+def with_changes(stream):
+    """
+        Adds to each (session, bars) of stream a boolean array over the session's minutes
+        that is True where some asset's close differs from the minute before (the first
+        minute always counts as changed)
+    """
+    for session, bars in stream:
+        close = bars['close']
+        changed = np.ones(len(close), dtype=bool)
+        #: NaN to NaN is no change
+        moved = (close[1:] != close[:-1]) & ~(np.isnan(close[1:]) & np.isnan(close[:-1]))
+        changed[1:] = moved.any(axis=1)
+        yield session, bars, changed
+
+
+class MinuteBars(object):
+    """
+        The minute bars of a bundle. slots are the bundle columns (see AssetFinder.positions)
+        of the assets covered, in the column order of the bars.
+    """
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+        self.directory = os.path.join(bundle.root, 'minutes')
+        self.sids = np.load(os.path.join(self.directory, 'sids.npy'))
+        self.slots = bundle.assets.positions(self.sids)
+        self.months = sorted(name[:-len('.npz')] for name in os.listdir(self.directory)
+                             if name.endswith('.npz'))
+
+    @classmethod
+    def exists(cls, bundle):
+        return os.path.exists(os.path.join(bundle.root, 'minutes', 'sids.npy'))
+
+    def sessions(self, first, stop):
+        """
+            Yields (session, bars) for the bundle sessions [first, stop), where bars maps FIELDS
+            to (390 x assets) arrays. Sessions without minute bars get all-NaN bars.
+        """
+        nanos = self.bundle.sessions.tz_localize(None).values.astype('datetime64[ns]').view(np.int64)
+        wanted = pd.DatetimeIndex(nanos[first:stop]).to_period('M').astype(str)
+        missing = {field: np.full((MINUTES_IN_SESSION, len(self.sids)), np.nan) for field in FIELDS}
+        session = first
+        for month in pd.unique(wanted):
+            stored = {}
+            if month in self.months:
+                with np.load(os.path.join(self.directory, month + '.npz')) as chunk:
+                    stored = {'sessions': chunk['sessions']}
+                    stored.update((field, chunk[field]) for field in FIELDS)
+            while session < stop and wanted[session - first] == month:
+                bars = missing
+                if stored:
+                    i = np.searchsorted(stored['sessions'], nanos[session])
+                    if i < len(stored['sessions']) and stored['sessions'][i] == nanos[session]:
+                        rows = slice(i * MINUTES_IN_SESSION, (i + 1) * MINUTES_IN_SESSION)
+                        bars = {field: stored[field][rows] for field in FIELDS}
+                yield session, bars
+                session += 1
@@ -0,0 +1,120 @@
+"""
+    Book of the orders an algorithm has placed
+
+    Algorithms ask "do I have open orders for X" and "how many shares are still pending" every
+    minute. OrderBook keeps the open orders of every asset in insertion order, keyed by the
+    asset's slot in the bundle, along with per-slot counters of open orders and net pending
+    shares that are updated as orders are placed, filled and cancelled, so those questions are
+    array lookups rather than scans over every open order.
+"""
+
+import numpy as np
+
+
+class Order(object):
+
+    def __init__(self, id, asset, amount, created):
+        self.id = id
+        self.asset = asset
+        self.sid = asset
+        self.amount = amount
+        self.filled = 0
+        self.created = created
+        self.status = 'open'
+
+    @property
+    def open(self):
+        return self.status == 'open'
+
+    def __repr__(self):
+        return 'Order(%s, %r, amount=%d, status=%s)' % (self.id, self.asset, self.amount, self.status)
+
+
+class OrderBook(object):
+    """
+        Every order placed for the assets of finder, an AssetFinder. len() is the number of
+        open orders.
+    """
+
+    def __init__(self, finder):
+        self.finder = finder
+        #: Order id -> Order, open or not
+        self.orders = {}
+        #: Slot -> {order id: Order} of the slots with open orders, in the order first placed
+        self._open = {}
+        #: Open orders and net shares still to fill, per slot
+        self.counts = np.zeros(len(finder), dtype=np.int64)
+        self.pending = np.zeros(len(finder), dtype=np.int64)
+        self._count = 0
+        self._next_id = 0
+
+    def __len__(self):
+        return self._count
+
+    def place(self, asset, amount, created):
+        """
+            A new open Order for amount shares of asset
+        """
+        slot = self.finder.position(asset)
+        self._next_id += 1
+        order = Order(self._next_id, asset, amount, created)
+        self.orders[order.id] = order
+        self._open.setdefault(slot, {})[order.id] = order
+        self.counts[slot] += 1
+        self.pending[slot] += amount
+        self._count += 1
+        return order
+
+    def _close(self, order, status):
+        slot = self.finder.position(order.asset)
+        orders = self._open[slot]
+        del orders[order.id]
+        if not orders:
+            del self._open[slot]
+        self.counts[slot] -= 1
+        self.pending[slot] -= order.amount - order.filled
+        self._count -= 1
+        order.status = status
+
+    def fill(self, order):
+        """
+            Marks order filled and returns the number of shares that filled
+        """
+        amount = order.amount - order.filled
+        self._close(order, 'filled')
+        order.filled = order.amount
+        return amount
+
+    def cancel(self, order):
+        """
+            Cancels order, an Order or an order id, if it's still open. Returns whether it was.
+        """
+        order = self.orders.get(getattr(order, 'id', order))
+        if order is None or not order.open:
+            return False
+        self._close(order, 'cancelled')
+        return True
+
+    def open_slots(self):
+        """
+            [(slot, [open orders])] of every slot with open orders
+        """
+        return [(slot, list(orders.values())) for slot, orders in self._open.items()]
+
+    def has_open(self, asset):
+        return self.counts[self.finder.position(asset)] > 0
+
+    def pending_shares(self, asset):
+        """
+            Net shares of asset in open orders, positive for buys
+        """
+        return int(self.pending[self.finder.position(asset)])
+
+    def open_orders(self, asset=None):
+        """
+            Open orders of asset as a list or, without an asset, a dict of lists by asset
+        """
+        if asset is not None:
+            orders = self._open.get(self.finder.position(asset))
+            return list(orders.values()) if orders else []
+        return {self.finder.assets[slot]: list(orders.values()) for slot, orders in self._open.items()}
@@ -0,0 +1,1158 @@
+"""
+    A local pipeline engine
+
+    Implements the parts of the quantopian.pipeline API our algorithms use: dataset columns and
+    .latest, CustomFactor (with masks and multiple outputs), factor arithmetic and comparisons,
+    filter algebra, classifier string predicates, percentile_between and top/bottom, plus a
+    Pipeline and an engine that computes it one session at a time against a data bundle.
+
+    As on Quantopian, the pipeline for a session only sees data up to the previous close: a
+    window of length n computed on session i covers bundle rows [i - n, i).
+
+    Factors can also be evaluated rolling, so that consecutive sessions cost O(assets) rather
+    than O(window x assets). A factor's rolling attribute is then an object implementing
+
+        start(term, today, assets, *windows) -> state
+            build a state from the full input windows, as compute would see them
+        roll(term, state, today, assets, entering, leaving)
+            update state in place for a window that moved forward one session; entering and
+            leaving hold, per input, the row that joined and the row that dropped out of the
+            window. Return False to have the state rebuilt from the full windows instead.
+        compute(term, state, today, assets, out)
+            fill out from state, matching what compute would give
+
+    Rolling pays off for daily pipelines only: a factor is rolled on a session if it was also
+    computed on the one before, and computed in full otherwise. Rolled factors are evaluated
+    over every asset, since their state has to outlive the day's mask, and then masked, so
+    engines only roll when asked to. Factors of algorithm files get their rolling objects from
+    localq.adapters.
+
+    Screens are evaluated by a ScreenPlanner, which runs the filters and-ed together in a screen
+    cheapest and most selective first and computes each one only on the assets still standing.
+    Terms marked elementwise, whose value for an asset only depends on that asset's inputs, take
+    part in this; the rest are always computed over their full mask.
+"""
+
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+from localq.chunks import DEFAULT_MEMORY_BUDGET, chunk_bounds, load_rows, prefetched, window
+from localq.labels import LabelArray
+
+FLOAT = np.dtype(np.float64)
+BOOL = np.dtype(bool)
+OBJECT = np.dtype(object)
+DATETIME = np.dtype('datetime64[ns]')
+
+
+def missing_value(dtype):
+    """
+        The value a term of dtype takes for assets it wasn't computed on
+    """
+    if dtype == BOOL:
+        return False
+    if dtype == OBJECT:
+        return None
+    if dtype.kind == 'M':
+        return np.datetime64('NaT')
+    return np.nan
+
+
+def missing_array(dtype, length):
+    """
+        An array of length missing values of dtype; structured dtypes get every field filled
+    """
+    if dtype.names:
+        values = np.empty(length, dtype=dtype).view(np.recarray)
+        for name in dtype.names:
+            values[name] = missing_value(dtype[name])
+        return values
+    return np.full(length, missing_value(dtype), dtype=dtype)
+
+
+def expand(values, cols, length):
+    """
+        Full-length array with values at positions cols and missing values elsewhere
+    """
+    if isinstance(values, LabelArray):
+        full = LabelArray.missing(length, values.categories)
+    else:
+        full = missing_array(values.dtype, length)
+    full[cols] = values
+    return full
+
+
+def is_missing(values):
+    """
+        Elementwise missing-value test that works for every term dtype
+    """
+    if isinstance(values, LabelArray):
+        return values.is_missing()
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        return np.isnan(values)
+    if values.dtype.kind == 'M':
+        return np.isnat(values)
+    if values.dtype.kind in 'OUS':
+        return np.fromiter((value is None or value == '' for value in values.ravel().tolist()),
+                           dtype=bool, count=values.size).reshape(values.shape)
+    return np.zeros(values.shape, dtype=bool)
+
+
+class BoundColumn(object):
+    """
+        A column of a dataset, e.g. USEquityPricing.close. Columns are only ever used as term
+        inputs, where the engine hands the term a window of them.
+    """
+
+    def __init__(self, dataset, name, dtype=FLOAT):
+        self.dataset = dataset
+        self.name = name
+        self.dtype = np.dtype(dtype)
+        self.key = dataset + '/' + name
+        self._latest = None
+
+    @property
+    def latest(self):
+        """
+            The most recent value of this column; a Factor, Filter or Classifier by dtype
+        """
+        if self._latest is None:
+            if self.dtype == BOOL:
+                self._latest = LatestFilter(self)
+            elif self.dtype == OBJECT:
+                self._latest = LatestClassifier(self)
+            else:
+                self._latest = LatestFactor(self)
+        return self._latest
+
+    def __repr__(self):
+        return '%s.%s' % (self.dataset, self.name)
+
+
+class Term(object):
+    """
+        Base class of everything a pipeline computes.
+
+        inputs are BoundColumns, which the engine passes as (window_length x assets) windows, or
+        other terms, which it passes as (1 x assets) arrays of their current values. If mask is
+        a Filter the term is only computed on the assets that pass it.
+
+        elementwise terms compute each asset's value from that asset's inputs alone, so the
+        engine may compute them on just the assets it needs. latest_only terms are also
+        functions of nothing but the latest row of their inputs, not of the date, so their
+        values can be reused for as long as those rows don't change. vectorized terms compute
+        a block of sessions in one call too: given (1 x sessions x assets) inputs they return
+        (sessions x assets) values (see localq.blocks). Inputs of vectorized terms that aren't
+        elementwise are missing wherever the mask is False, so such terms have to compute
+        across the assets with known values only. rolling is how the term rolls forward from
+        one session to the next, if it does (see above).
+    """
+    inputs = ()
+    window_length = 1
+    mask = None
+    dtype = FLOAT
+    elementwise = False
+    latest_only = False
+    vectorized = False
+    rolling = None
+
+    def dependencies(self):
+        """
+            Terms that have to be computed before this one
+        """
+        dependencies = [term for term in self.inputs if isinstance(term, Term)]
+        if self.mask is not None:
+            dependencies.append(self.mask)
+        return dependencies
+
+    def _compute(self, arrays, today, assets):
+        """
+            Computes the term on one session. arrays line up with inputs, assets are the sids
+            of the columns of every array. Returns a 1-D array with one value per asset.
+        """
+        raise NotImplementedError
+
+
+#: How operators print in term reprs
+_SYMBOLS = {operator.add: '+', operator.sub: '-', operator.mul: '*', operator.truediv: '/',
+            operator.gt: '>', operator.ge: '>=', operator.lt: '<', operator.le: '<=',
+            operator.eq: '==', operator.ne: '!=', operator.and_: '&', operator.or_: '|'}
+
+
+def _operation_repr(op, operands):
+    return '(%r %s %r)' % (operands[0], _SYMBOLS.get(op, op.__name__), operands[1])
+
+
+def _operand_values(operands, arrays):
+    """
+        Current values of a mix of terms (taken from arrays, in order) and scalars
+    """
+    arrays = iter(arrays)
+    return [next(arrays)[-1] if isinstance(operand, Term) else operand for operand in operands]
+
+
+class Factor(Term):
+    """
+        A term producing floats
+    """
+    dtype = FLOAT
+
+    #: Comparison operators build filters, so keep identity hashing for the engine's caches
+    __hash__ = Term.__hash__
+
+    def _binary(self, op, other, reflected=False):
+        if reflected:
+            return BinaryFactor(op, other, self)
+        return BinaryFactor(op, self, other)
+
+    def __add__(self, other):
+        return self._binary(operator.add, other)
+
+    def __radd__(self, other):
+        return self._binary(operator.add, other, reflected=True)
+
+    def __sub__(self, other):
+        return self._binary(operator.sub, other)
+
+    def __rsub__(self, other):
+        return self._binary(operator.sub, other, reflected=True)
+
+    def __mul__(self, other):
+        return self._binary(operator.mul, other)
+
+    def __rmul__(self, other):
+        return self._binary(operator.mul, other, reflected=True)
+
+    def __truediv__(self, other):
+        return self._binary(operator.truediv, other)
+
+    def __rtruediv__(self, other):
+        return self._binary(operator.truediv, other, reflected=True)
+
+    __div__ = __truediv__
+    __rdiv__ = __rtruediv__
+
+    def __neg__(self):
+        return BinaryFactor(operator.sub, 0.0, self)
+
+    def __gt__(self, other):
+        return Comparison(operator.gt, self, other)
+
+    def __ge__(self, other):
+        return Comparison(operator.ge, self, other)
+
+    def __lt__(self, other):
+        return Comparison(operator.lt, self, other)
+
+    def __le__(self, other):
+        return Comparison(operator.le, self, other)
+
+    def __eq__(self, other):
+        return Comparison(operator.eq, self, other)
+
+    def __ne__(self, other):
+        return Comparison(operator.ne, self, other)
+
+    def eq(self, other):
+        return self.__eq__(other)
+
+    def isnull(self):
+        return NullFilter(self, null=True)
+
+    def notnull(self):
+        return NullFilter(self, null=False)
+
+    def percentile_between(self, min_percentile, max_percentile, mask=None):
+        """
+            Filter for the assets whose value lies between the given percentiles of this
+            factor's values over the assets passing mask
+        """
+        return PercentileFilter(self, min_percentile, max_percentile, mask=mask)
+
+    def top(self, n, mask=None):
+        return RankFilter(self, n, ascending=False, mask=mask)
+
+    def bottom(self, n, mask=None):
+        return RankFilter(self, n, ascending=True, mask=mask)
+
+    def rank(self, ascending=True, mask=None):
+        return Rank(self, ascending=ascending, mask=mask)
+
+
+class Filter(Term):
+    """
+        A term producing booleans
+    """
+    dtype = BOOL
+
+    def __and__(self, other):
+        return BinaryFilter(operator.and_, self, other)
+
+    def __or__(self, other):
+        return BinaryFilter(operator.or_, self, other)
+
+    def __invert__(self):
+        return NotFilter(self)
+
+
+class Classifier(Term):
+    """
+        A term producing labels, e.g. the strings of a reference data column
+    """
+    dtype = OBJECT
+
+    def eq(self, value):
+        return ClassifierPredicate(self, 'eq', value)
+
+    def startswith(self, prefix):
+        return ClassifierPredicate(self, 'startswith', prefix)
+
+    def endswith(self, suffix):
+        return ClassifierPredicate(self, 'endswith', suffix)
+
+    def has_substring(self, substring):
+        return ClassifierPredicate(self, 'has_substring', substring)
+
+    def matches(self, pattern):
+        return ClassifierPredicate(self, 'matches', pattern)
+
+    def element_of(self, choices):
+        return ClassifierPredicate(self, 'element_of', frozenset(choices))
+
+    def isnull(self):
+        return NullFilter(self, null=True)
+
+    def notnull(self):
+        return NullFilter(self, null=False)
+
+
+class _Latest(object):
+    """
+        Mixin for the .latest terms of a column
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, column):
+        self.inputs = (column,)
+        self.dtype = column.dtype
+
+    def _compute(self, arrays, today, assets):
+        return arrays[0][-1]
+
+    def __repr__(self):
+        return '%r.latest' % (self.inputs[0],)
+
+
+class LatestFactor(_Latest, Factor):
+    pass
+
+
+class LatestFilter(_Latest, Filter):
+    pass
+
+
+class LatestClassifier(_Latest, Classifier):
+    pass
+
+
+class BinaryFactor(Factor):
+    """
+        left <op> right, where either side may be a scalar
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.operands = (left, right)
+        self.inputs = tuple(operand for operand in self.operands if isinstance(operand, Term))
+
+    def _compute(self, arrays, today, assets):
+        left, right = _operand_values(self.operands, arrays)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.asarray(self.op(left, right), dtype=FLOAT)
+
+    def __repr__(self):
+        return _operation_repr(self.op, self.operands)
+
+
+class Comparison(Filter):
+    """
+        left <op> right for a factor and a scalar or another factor
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.operands = (left, right)
+        self.inputs = tuple(operand for operand in self.operands if isinstance(operand, Term))
+
+    def _compute(self, arrays, today, assets):
+        left, right = _operand_values(self.operands, arrays)
+        with np.errstate(invalid='ignore'):
+            return np.asarray(self.op(left, right), dtype=BOOL)
+
+    def __repr__(self):
+        return _operation_repr(self.op, self.operands)
+
+
+class BinaryFilter(Filter):
+    """
+        left & right or left | right
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.inputs = (left, right)
+
+    def _compute(self, arrays, today, assets):
+        return self.op(arrays[0][-1], arrays[1][-1])
+
+    def __repr__(self):
+        return _operation_repr(self.op, self.inputs)
+
+
+class NotFilter(Filter):
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, term):
+        self.inputs = (term,)
+
+    def _compute(self, arrays, today, assets):
+        return ~arrays[0][-1]
+
+    def __repr__(self):
+        return '~%r' % (self.inputs[0],)
+
+
+class NullFilter(Filter):
+    """
+        isnull()/notnull() of any term
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, term, null):
+        self.inputs = (term,)
+        self.null = null
+
+    def _compute(self, arrays, today, assets):
+        missing = is_missing(arrays[0][-1])
+        return missing if self.null else ~missing
+
+    def __repr__(self):
+        return '%r.%s()' % (self.inputs[0], 'isnull' if self.null else 'notnull')
+
+
+def _lerp(a, b, t):
+    """
+        Linear interpolation from a to b, rounded the way np.percentile rounds it
+    """
+    difference = b - a
+    return np.where(t >= 0.5, b - difference * (1 - t), a + difference * t)
+
+
+def percentiles(values, q):
+    """
+        (len(q) x rows) q-th percentiles of the non-NaN values of every row of values, a 2-D
+        array, linearly interpolated like np.percentile; NaN for rows without values. Every
+        row is partitioned around the few positions needed instead of sorted.
+    """
+    q = np.true_divide(np.asarray(q, dtype=FLOAT), 100)[:, np.newaxis]
+    if not values.shape[1]:
+        return np.full((len(q), len(values)), np.nan)
+    known = ~np.isnan(values)
+    counts = known.sum(axis=1)
+    filled = np.where(known, values, np.inf)
+    virtual = (counts - 1) * q
+    above = virtual >= counts - 1
+    previous = np.where(above, counts - 1, np.floor(virtual)).astype(np.intp)
+    following = np.where(above, counts - 1, previous + 1)
+    positions = np.unique(np.concatenate([previous.ravel(), following.ravel()]))
+    positions = positions[positions >= 0]
+    if len(positions):
+        filled = np.partition(filled, positions, axis=1)
+    rows = np.arange(len(values))
+    lower = filled[rows, np.maximum(previous, 0)]
+    upper = filled[rows, np.maximum(following, 0)]
+    with np.errstate(invalid='ignore'):
+        result = _lerp(lower, upper, virtual - previous)
+    result[:, counts == 0] = np.nan
+    return result
+
+
+def _ordered(values, descending=False, later_first=False):
+    """
+        Column order of every row of values, a 2-D array: by value, NaNs last, ties earliest
+        column first unless later_first
+    """
+    keys = -values if descending else values
+    if later_first:
+        return values.shape[1] - 1 - np.argsort(keys[:, ::-1], axis=1, kind='stable')
+    return np.argsort(keys, axis=1, kind='stable')
+
+
+class PercentileFilter(Filter):
+    """
+        Assets whose factor value lies between two percentiles of the values over the mask
+    """
+    vectorized = True
+
+    def __init__(self, factor, min_percentile, max_percentile, mask=None):
+        if not 0.0 <= min_percentile <= max_percentile <= 100.0:
+            raise ValueError("need 0 <= min_percentile <= max_percentile <= 100, got %s and %s"
+                             % (min_percentile, max_percentile))
+        self.inputs = (factor,)
+        self.min_percentile = min_percentile
+        self.max_percentile = max_percentile
+        self.mask = mask
+
+    def _compute(self, arrays, today, assets):
+        values = arrays[0][-1]
+        rows = np.atleast_2d(values)
+        lower, upper = percentiles(rows, [self.min_percentile, self.max_percentile])[:, :, np.newaxis]
+        with np.errstate(invalid='ignore'):
+            result = (rows >= lower) & (rows <= upper)
+        return result.reshape(values.shape)
+
+    def __repr__(self):
+        return '%r.percentile_between(%r, %r)' % (self.inputs[0], self.min_percentile,
+                                                  self.max_percentile)
+
+
+class RankFilter(Filter):
+    """
+        The n assets with the highest (or lowest) factor values over the mask
+    """
+    vectorized = True
+
+    def __init__(self, factor, n, ascending, mask=None):
+        self.inputs = (factor,)
+        self.n = n
+        self.ascending = ascending
+        self.mask = mask
+
+    def _compute(self, arrays, today, assets):
+        values = arrays[0][-1]
+        rows = np.atleast_2d(values)
+        #: Ties go to the later asset from the top, to the earlier one from the bottom
+        order = _ordered(rows, descending=not self.ascending, later_first=not self.ascending)
+        order = order[:, :self.n]
+        counts = (~np.isnan(rows)).sum(axis=1)
+        result = np.zeros(rows.shape, dtype=BOOL)
+        result[np.arange(len(rows))[:, np.newaxis], order] = \
+            np.arange(order.shape[1]) < counts[:, np.newaxis]
+        return result.reshape(values.shape)
+
+
+class Rank(Factor):
+    """
+        Ordinal rank of a factor over the mask, starting at 1; missing values stay NaN
+    """
+    vectorized = True
+
+    def __init__(self, factor, ascending=True, mask=None):
+        self.inputs = (factor,)
+        self.ascending = ascending
+        self.mask = mask
+
+    def _compute(self, arrays, today, assets):
+        values = arrays[0][-1]
+        rows = np.atleast_2d(values)
+        order = _ordered(rows, descending=not self.ascending)
+        result = np.empty(rows.shape)
+        result[np.arange(len(rows))[:, np.newaxis], order] = np.arange(1, rows.shape[1] + 1)
+        result[np.isnan(rows)] = np.nan
+        return result.reshape(values.shape)
+
+
+class ClassifierPredicate(Filter):
+    """
+        A string test applied to every label of a classifier; missing labels never pass
+    """
+    elementwise = True
+    latest_only = True
+    vectorized = True
+
+    def __init__(self, classifier, kind, argument):
+        self.inputs = (classifier,)
+        self.kind = kind
+        self.argument = argument
+        if kind == 'matches':
+            self._regex = re.compile(argument)
+        #: (categories, code -> bool table) for the last dictionary we saw
+        self._table = (None, None)
+
+    def test(self, label):
+        """
+            Applies the predicate to a single non-missing label
+        """
+        if self.kind == 'eq':
+            return label == self.argument
+        if self.kind == 'startswith':
+            return label.startswith(self.argument)
+        if self.kind == 'endswith':
+            return label.endswith(self.argument)
+        if self.kind == 'has_substring':
+            return self.argument in label
+        if self.kind == 'matches':
+            return self._regex.match(label) is not None
+        if self.kind == 'element_of':
+            return label in self.argument
+        raise ValueError("unknown classifier predicate %r" % self.kind)
+
+    def table(self, categories):
+        """
+            The predicate applied to every category of a dictionary, kept until the dictionary
+            changes
+        """
+        cached, table = self._table
+        if cached is not categories:
+            table = np.fromiter((label != '' and self.test(label) for label in categories.tolist()),
+                                dtype=BOOL, count=len(categories))
+            self._table = (categories, table)
+        return table
+
+    def _compute(self, arrays, today, assets):
+        labels = arrays[0][-1]
+        if isinstance(labels, LabelArray):
+            return self.table(labels.categories)[labels.codes]
+        return np.fromiter((label is not None and label != '' and self.test(label)
+                            for label in labels.ravel().tolist()),
+                           dtype=BOOL, count=labels.size).reshape(labels.shape)
+
+    def __repr__(self):
+        argument = sorted(self.argument) if self.kind == 'element_of' else self.argument
+        return '%r.%s(%r)' % (self.inputs[0], self.kind, argument)
+
+
+class CustomFactor(Factor):
+    """
+        Base class for user factors. Subclasses set inputs, window_length and optionally
+        outputs and implement compute(self, today, assets, out, *inputs). Keyword arguments
+        override the class attributes; any others are stored on the instance as parameters.
+        Set elementwise = True on factors that treat every asset independently.
+    """
+    outputs = None
+
+    def __init__(self, inputs=None, window_length=None, mask=None, **params):
+        self.inputs = tuple(type(self).inputs if inputs is None else inputs)
+        if window_length is not None:
+            self.window_length = window_length
+        if mask is not None:
+            self.mask = mask
+        for name, value in params.items():
+            setattr(self, name, value)
+        if not self.inputs:
+            raise ValueError("%s has no inputs" % type(self).__name__)
+        if self.outputs:
+            self.dtype = np.dtype([(name, FLOAT) for name in self.outputs])
+
+    def __getattr__(self, name):
+        outputs = type(self).outputs
+        if outputs and name in outputs:
+            terms = self.__dict__.setdefault('_output_terms', {})
+            if name not in terms:
+                terms[name] = OutputField(self, name)
+            return terms[name]
+        raise AttributeError("%s has no attribute %r" % (type(self).__name__, name))
+
+    def _compute(self, arrays, today, assets):
+        out = missing_array(self.dtype, len(assets))
+        self.compute(today, assets, out, *arrays)
+        return out
+
+    def compute(self, today, assets, out, *inputs):
+        raise NotImplementedError
+
+    def __repr__(self):
+        return '%s(window_length=%d)' % (type(self).__name__, self.window_length)
+
+
+class OutputField(Factor):
+    """
+        One named output of a multiple-output CustomFactor
+    """
+    elementwise = True
+    vectorized = True
+
+    def __init__(self, parent, name):
+        self.inputs = (parent,)
+        self.name = name
+
+    def _compute(self, arrays, today, assets):
+        return np.asarray(arrays[0][-1][self.name], dtype=FLOAT)
+
+    def __repr__(self):
+        return '%r.%s' % (self.inputs[0], self.name)
+
+
+class Pipeline(object):
+    """
+        Named output columns plus an optional screen
+    """
+
+    def __init__(self, columns=None, screen=None):
+        self.columns = dict(columns or {})
+        self.screen = screen
+
+    def add(self, term, name, overwrite=False):
+        if name in self.columns and not overwrite:
+            raise KeyError("column %r already exists" % name)
+        self.columns[name] = term
+
+    def remove(self, name):
+        return self.columns.pop(name)
+
+    def set_screen(self, screen, overwrite=False):
+        if self.screen is not None and not overwrite:
+            raise ValueError("pipeline already has a screen")
+        self.screen = screen
+
+    def terms(self):
+        """
+            Every term the columns and screen depend on, each once
+        """
+        terms, seen = [], set()
+        pending = list(self.columns.values()) + ([] if self.screen is None else [self.screen])
+        while pending:
+            term = pending.pop()
+            if id(term) in seen:
+                continue
+            seen.add(id(term))
+            terms.append(term)
+            pending.extend(term.dependencies())
+        return terms
+
+    def windows(self):
+        """
+            {column key: longest window over it} of the dataset columns the pipeline reads
+        """
+        windows = {}
+        for term in self.terms():
+            for input_ in term.inputs:
+                if isinstance(input_, BoundColumn):
+                    windows[input_.key] = max(windows.get(input_.key, 0), term.window_length)
+        return windows
+
+
+#: Term attributes that are structure, not parameters
+_STRUCTURE = ('inputs', 'mask', 'dtype')
+
+
+def _parameter_key(value, memo):
+    if isinstance(value, (BoundColumn, Term)):
+        return term_key(value, memo=memo)
+    if isinstance(value, (tuple, list)):
+        return tuple(_parameter_key(item, memo) for item in value)
+    return repr(value)
+
+
+def _class_key(cls):
+    """
+        Name of a term class plus where its compute is defined, since every algorithm file
+        loads as the same module
+    """
+    code = getattr(getattr(cls, 'compute', None), '__code__', None)
+    origin = None if code is None else (code.co_filename, code.co_firstlineno)
+    return (cls.__module__, cls.__qualname__, origin)
+
+
+def term_key(term, masked=True, memo=None):
+    """
+        Hashable description of what term computes; equal for separately built equal terms.
+        memo, a dict, keeps the keys of masked terms already described.
+    """
+    if isinstance(term, BoundColumn):
+        return term.key
+    if masked and memo is not None:
+        key = memo.get(term)
+        if key is not None:
+            return key
+    params = tuple(sorted((name, _parameter_key(value, memo)) for name, value in vars(term).items()
+                          if name not in _STRUCTURE and not name.startswith('_')))
+    mask = term_key(term.mask, memo=memo) if masked and term.mask is not None else None
+    key = (_class_key(type(term)), term.window_length,
+           tuple(term_key(input_, memo=memo) for input_ in term.inputs), mask, params)
+    if masked and memo is not None:
+        memo[term] = key
+    return key
+
+
+class CanonicalTerms(object):
+    """
+        Maps every term to the first structurally equal term (see term_key) it's asked about.
+        Engines key their caches by canonical terms, so that pipelines built separately compute
+        the terms they have in common once. len() is the number of distinct terms.
+    """
+
+    def __init__(self):
+        #: term -> term_key
+        self.keys = {}
+        self._terms = {}
+        self._by_key = {}
+
+    def __call__(self, term):
+        try:
+            return self._terms[term]
+        except KeyError:
+            canonical = self._by_key.setdefault(term_key(term, memo=self.keys), term)
+            self._terms[term] = canonical
+            return canonical
+
+    def __len__(self):
+        return len(self._by_key)
+
+
+class _NothingToCompute(Exception):
+    pass
+
+
+class _NotEnoughHistory(_NothingToCompute):
+    pass
+
+
+class ScreenPlanner(object):
+    """
+        Evaluates the filters and-ed together in a screen one at a time, each on the assets the
+        ones before it let through, in the order that should leave the least work.
+
+        A filter's cost is the window length times the number of dataset columns of every term
+        it needs that hasn't been computed yet this session, and its selectivity the fraction of
+        the assets it was evaluated on that passed, averaged over recent sessions. Filters run
+        in increasing order of cost / (1 - selectivity), which minimises the expected cost for
+        independent filters; ties keep the order they were written in.
+    """
+    #: Weight of the latest session in the selectivity averages
+    smoothing = 0.2
+    #: Selectivity assumed for filters that haven't run yet
+    prior = 0.5
+
+    def __init__(self, canonical=None):
+        self.selectivity = {}
+        #: term -> [(term it needs, its cost)], for every term in its dependency graph
+        self._graphs = {}
+        #: Maps terms to the ones caches are keyed by, see CanonicalTerms
+        self.canonical = canonical
+
+    def conjuncts(self, screen):
+        """
+            The filters and-ed together in screen, in the order they were written
+        """
+        terms, pending = [], [screen]
+        while pending:
+            term = pending.pop()
+            if isinstance(term, BinaryFilter) and term.op is operator.and_:
+                pending.extend(reversed(term.inputs))
+            else:
+                terms.append(term)
+        return terms
+
+    def _graph(self, term):
+        graph = self._graphs.get(term)
+        if graph is None:
+            graph, seen, pending = [], set(), [term]
+            while pending:
+                node = pending.pop()
+                if id(node) in seen:
+                    continue
+                seen.add(id(node))
+                columns = sum(isinstance(input_, BoundColumn) for input_ in node.inputs)
+                cached = node if self.canonical is None else self.canonical(node)
+                graph.append((cached, node.window_length * max(columns, 1)))
+                pending.extend(node.dependencies())
+            graph = self._graphs[term] = graph
+        return graph
+
+    def cost(self, term, cache=()):
+        """
+            Estimated work left to compute term, given the terms already in cache
+        """
+        return sum(cost for node, cost in self._graph(term) if node not in cache)
+
+    def _priority(self, term, cache):
+        selectivity = self.selectivity.get(term, self.prior)
+        return self.cost(term, cache) / max(1.0 - selectivity, 0.01)
+
+    def run(self, engine, screen, i, cache):
+        """
+            Boolean array of the assets passing screen on session i
+        """
+        survivors = np.ones(len(engine.assets), dtype=bool)
+        remaining = self.conjuncts(screen)
+        while remaining and survivors.any():
+            priorities = [self._priority(term, cache) for term in remaining]
+            term = remaining.pop(int(np.argmin(priorities)))
+            before = survivors.sum()
+            survivors &= engine.evaluate(term, i, cache, survivors.copy())
+            passed = survivors.sum() / float(before)
+            previous = self.selectivity.get(term)
+            self.selectivity[term] = passed if previous is None else \
+                previous + self.smoothing * (passed - previous)
+        return survivors
+
+    def explain(self, screen):
+        """
+            Frame of every filter of screen with its cost and selectivity, in the order the
+            planner would start a session with
+        """
+        terms = self.conjuncts(screen)
+        frame = pd.DataFrame({
+            'filter': [repr(term) for term in terms],
+            'cost': [self.cost(term) for term in terms],
+            'selectivity': [self.selectivity.get(term, np.nan) for term in terms],
+            'priority': [self._priority(term, ()) for term in terms],
+        })
+        return frame.sort_values('priority', kind='mergesort').reset_index(drop=True)
+
+
+class SimplePipelineEngine(object):
+    """
+        Computes pipelines against a Bundle, one session at a time. If rolling is True, factors
+        that support it are rolled forward from the previous session, and filters over
+        reference data are reused from reference_cache (a localq.reference.ReferenceCache)
+        while their columns don't change. Windowed terms are looked up in, or recorded to,
+        factor_store (a localq.factorstore.FactorStore) if there is one.
+    """
+
+    def __init__(self, bundle, rolling=False, reference_cache=None, factor_store=None):
+        self.bundle = bundle
+        self.assets = bundle.assets.assets
+        self.sids = bundle.assets.sids
+        self.rolling = rolling
+        self.canonical = CanonicalTerms()
+        #: Canonical term -> (session, state) of the last session every rolling factor was
+        #: computed on, with state None if it was computed in full
+        self._states = {}
+        self.planner = ScreenPlanner(self.canonical)
+        self.reference_cache = reference_cache
+        self.factor_store = factor_store
+        #: Column rows of the chunk being computed, see localq.chunks
+        self._loaded = {}
+
+    def run_pipeline(self, pipeline, start_date, end_date, memory_budget=DEFAULT_MEMORY_BUDGET):
+        """
+            Output frame indexed by (session, asset) for every session from start_date to
+            end_date, keeping the assets that pass the screen
+        """
+        return pd.concat(list(self.run_chunks(pipeline, start_date, end_date, memory_budget)))
+
+    def run_chunks(self, pipeline, start_date, end_date, memory_budget=DEFAULT_MEMORY_BUDGET):
+        """
+            Yields the output of run_pipeline one chunk of sessions at a time, in chunks sized
+            to memory_budget bytes, the next chunk's column rows loading in the background
+            (see localq.chunks)
+        """
+        first, stop = self.bundle.sessions_between(start_date, end_date)
+        if first >= stop:
+            raise ValueError("no sessions between %s and %s" % (start_date, end_date))
+        windows = pipeline.windows()
+        itemsizes = dict((key, self.bundle.column(key).dtype.itemsize) for key in windows)
+        session_bytes = len(self.assets) * (sum(itemsizes.values()) + FLOAT.itemsize * len(pipeline.columns))
+        fixed_bytes = len(self.assets) * sum(itemsizes[key] * length for key, length in windows.items())
+        chunks = chunk_bounds(first, stop, memory_budget, session_bytes, fixed_bytes)
+
+        def load(first, stop, previous):
+            return load_rows(self.bundle, windows, first, stop, previous)
+
+        for first, stop, loaded in prefetched(chunks, load):
+            self._loaded = loaded
+            try:
+                frames = [self.compute_session(pipeline, i) for i in range(first, stop)]
+            finally:
+                self._loaded = {}
+            yield pd.concat(frames, keys=self.bundle.sessions[first:stop])
+
+    def run_pipelines(self, pipelines, start_date, end_date):
+        """
+            run_pipeline for every pipeline of pipelines, a dict by name, evaluating the terms
+            they have in common once per session. Returns the output frames by name.
+        """
+        first, stop = self.bundle.sessions_between(start_date, end_date)
+        if first >= stop:
+            raise ValueError("no sessions between %s and %s" % (start_date, end_date))
+        frames = {name: [] for name in pipelines}
+        for i in range(first, stop):
+            cache = {}
+            for name, pipeline in pipelines.items():
+                frames[name].append(self.compute_session(pipeline, i, cache))
+        return {name: pd.concat(frames[name], keys=self.bundle.sessions[first:stop])
+                for name in pipelines}
+
+    def compute_session(self, pipeline, i, cache=None):
+        """
+            Output frame indexed by asset for the session at position i of the bundle. Pipelines
+            computed for the same session with the same cache share their common terms.
+        """
+        if cache is None:
+            cache = {}
+        if pipeline.screen is None:
+            needed = None
+            rows = np.arange(len(self.assets))
+        else:
+            needed = self.planner.run(self, pipeline.screen, i, cache)
+            rows = np.flatnonzero(needed)
+        names = sorted(pipeline.columns)
+        values = [self.evaluate(pipeline.columns[name], i, cache, needed) for name in names]
+
+        data = {}
+        for name, value in zip(names, values):
+            value = value[rows]
+            data[name] = value.as_labels() if isinstance(value, LabelArray) else value
+        return pd.DataFrame(data, index=pd.Index(self.assets[rows]), columns=names)
+
+    def evaluate(self, term, i, cache, needed=None):
+        """
+            Full-length values of term on session i, using and filling cache. needed is an
+            optional boolean array of the assets the caller will look at; elementwise terms are
+            only computed on those and hold missing values elsewhere.
+        """
+        term = self.canonical(term)
+        if not term.elementwise:
+            needed = None
+        hit = cache.get(term)
+        if hit is not None:
+            result, computed = hit
+            if computed is None or (needed is not None and not (needed & ~computed).any()):
+                return result
+
+        shared = self.reference_cache is not None and i > 0 \
+            and self.reference_cache.cacheable(term)
+        if shared:
+            result = self.reference_cache.get(self.bundle, term, i - 1)
+            if result is not None:
+                cache[term] = (result, None)
+                return result
+            needed = None
+
+        selected = needed
+        if term.mask is not None:
+            mask = self.evaluate(term.mask, i, cache, needed)
+            selected = mask if needed is None else mask & needed
+        cols = None if selected is None else np.flatnonzero(selected)
+
+        stored = self._stored(term, i, cache, cols, selected)
+        if stored is not None or self._rolls(term, i):
+            result = stored if stored is not None else self._compute_rolling(term, i)
+            if cols is not None:
+                result = expand(result[cols], cols, len(self.assets))
+            cache[term] = (result, needed)
+            return result
+
+        result = self._compute(term, i, cache, cols, selected)
+        if shared:
+            result = self.reference_cache.put(self.bundle, term, i - 1, result)
+        cache[term] = (result, needed)
+        return result
+
+    def _compute(self, term, i, cache, cols, selected):
+        """
+            Full-length values of term on session i, computed on the assets at cols (all of
+            them if cols is None)
+        """
+        try:
+            if cols is not None and not len(cols):
+                raise _NothingToCompute()
+            arrays = [self._load(term, input_, i, cols, selected, cache)
+                      for input_ in term.inputs]
+        except _NothingToCompute:
+            return missing_array(term.dtype, len(self.assets))
+        sids = self.sids if cols is None else self.sids[cols]
+        result = term._compute(arrays, self.bundle.sessions[i], sids)
+        if cols is not None:
+            result = expand(result, cols, len(self.assets))
+        #: So that the next session rolls it on
+        if self._rolling(term) and self._states.get(term, (None,))[0] != i:
+            self._states[term] = (i, None)
+        return result
+
+    def _stored(self, term, i, cache, cols, selected):
+        """
+            Values of term on session i from the factor store, recording them first if the
+            store is recording, or None. Elementwise terms are stored unmasked, the rest
+            computed on cols.
+        """
+        store = self.factor_store
+        if store is None or not store.covers(term):
+            return None
+        values = store.get(term, i)
+        if values is None and store.recording:
+            if self._rolls(term, i):
+                values = self._compute_rolling(term, i)
+            elif term.elementwise:
+                values = self._compute(term, i, cache, None, None)
+            else:
+                values = self._compute(term, i, cache, cols, selected)
+            store.put(term, i, values)
+        return values
+
+    def _rolling(self, term):
+        return (self.rolling and term.rolling is not None
+                and all(isinstance(input_, BoundColumn) for input_ in term.inputs))
+
+    def _rolls(self, term, i):
+        """
+            Whether to roll term on to session i: it was computed on the session before
+        """
+        return self._rolling(term) and self._states.get(term, (None,))[0] == i - 1
+
+    def _window(self, key, end, length):
+        return window(self.bundle, self._loaded, key, end, length)
+
+    def _compute_rolling(self, term, i):
+        """
+            Full-length values of rolling factor term on session i, moving its state on from
+            session i - 1 when there is one and starting it from the full windows otherwise
+        """
+        length = term.window_length
+        if i < length:
+            self._states.pop(term, None)
+            return missing_array(term.dtype, len(self.assets))
+
+        today = self.bundle.sessions[i]
+        keys = [input_.key for input_ in term.inputs]
+        previous = self._states.get(term)
+        state = None
+        if previous is not None and previous[0] == i - 1 and previous[1] is not None:
+            state = previous[1]
+            entering = [self._window(key, i, 1)[0] for key in keys]
+            leaving = [self._window(key, i - length, 1)[0] for key in keys]
+            if term.rolling.roll(term, state, today, self.sids, entering, leaving) is False:
+                state = None
+        if state is None:
+            windows = [self._window(key, i, length) for key in keys]
+            state = term.rolling.start(term, today, self.sids, *windows)
+        self._states[term] = (i, state)
+
+        out = missing_array(term.dtype, len(self.assets))
+        term.rolling.compute(term, state, today, self.sids, out)
+        return out
+
+    def _load(self, term, input_, i, cols, selected, cache):
+        if isinstance(input_, BoundColumn):
+            if i < term.window_length:
+                raise _NotEnoughHistory()
+            window = self._window(input_.key, i, term.window_length)
+        else:
+            if term.window_length > 1:
+                raise ValueError("%r can only take dataset columns as windowed inputs, got %r"
+                                 % (term, input_))
+            window = self.evaluate(input_, i, cache, selected)[np.newaxis]
+        if cols is not None:
+            window = window[:, cols]
+        return window
@@ -0,0 +1,145 @@
+"""
+    Bitemporal (point-in-time) fundamentals
+
+    Vendors stamp fundamentals with the date they describe (as_of), but publish, restate and
+    backfill them later. A daily array filled by as_of date lets a backtest see a quarter on the
+    morning it was reported, or a restatement years before it was made. Every fundamental is
+    really a set of records (asset, as_of, knowledge, value), where knowledge is the date the
+    value became available; what an algorithm could have known at T is, per asset, the record
+    with the latest as_of among those with knowledge <= T, later knowledge winning ties.
+
+    PointInTimeStore keeps the records of one field in sorted runs, one run per asset ordered
+    by knowledge date, along with the best record of each run prefix. The latest known value
+    at T for every asset is then one searchsorted over all the runs at once, with no per-day
+    filtering. Bundles materialize the store into their (sessions x assets) column, so
+    pipelines keep reading plain memory-mapped arrays and only ever see what was known at the
+    close of each session.
+"""
+
+import os
+
+import numpy as np
+
+from asof_index import MISSING, to_nanos
+
+NANOS_PER_DAY = 86400 * 10 ** 9
+RECORD_FIELDS = ('assets', 'as_of', 'knowledge', 'values')
+
+
+def _days(nanos):
+    """
+        Whole days since the epoch of int64 UTC nanoseconds
+    """
+    return np.floor_divide(nanos, NANOS_PER_DAY)
+
+
+def missing_value(dtype):
+    """
+        What a column of dtype holds for assets without a known value
+    """
+    if dtype.kind == 'f':
+        return np.nan
+    if dtype.kind == 'M':
+        return np.datetime64('NaT')
+    if dtype.kind in 'US':
+        return dtype.type()
+    return 0
+
+
+class PointInTimeStore(object):
+    """
+        Records of one field for n_assets assets. assets holds each record's asset position,
+        as_of and knowledge are dates (int64 nanoseconds or anything to_nanos takes) and values
+        the recorded values. Knowledge is resolved to whole days: a value published during day
+        D is known at the close of D.
+    """
+
+    def __init__(self, assets, as_of, knowledge, values, n_assets):
+        assets = np.asarray(assets, dtype=np.int64)
+        as_of = to_nanos(as_of) if len(assets) else np.empty(0, dtype=np.int64)
+        knowledge = to_nanos(knowledge) if len(assets) else np.empty(0, dtype=np.int64)
+        values = np.asarray(values)
+        if not len(assets) == len(as_of) == len(knowledge) == len(values):
+            raise ValueError("point-in-time records need one asset, as_of, knowledge and value each")
+        if len(assets) and (assets.min() < 0 or assets.max() >= n_assets):
+            raise ValueError("record assets must be positions below %d" % n_assets)
+
+        order = np.lexsort((as_of, knowledge, assets))
+        self.assets = assets[order]
+        self.as_of = as_of[order]
+        self.knowledge = knowledge[order]
+        self.values = values[order]
+        self.n_assets = n_assets
+        #: Run of asset a is records [starts[a], starts[a + 1])
+        self.starts = np.searchsorted(self.assets, np.arange(n_assets + 1))
+
+        #: Runs laid end to end on one axis of days, so a single searchsorted finds the last
+        #: record known on a given day in every run
+        days = _days(self.knowledge)
+        self._first_day = days.min() if len(days) else 0
+        self._span = (days.max() - self._first_day + 2) if len(days) else 1
+        self._keys = self.assets * self._span + (days - self._first_day)
+
+        #: best[i]: record with the latest as_of (then knowledge) among records starts[a]..i
+        #: of its run. Ranks are offset by asset so one running maximum covers every run.
+        rank = np.empty(len(order), dtype=np.int64)
+        rank[np.lexsort((self.knowledge, self.as_of))] = np.arange(len(order))
+        best_rank = np.maximum.accumulate(self.assets * len(order) + rank) - self.assets * len(order)
+        by_rank = np.empty(len(order), dtype=np.int64)
+        by_rank[rank] = np.arange(len(order))
+        self.best = by_rank[best_rank] if len(order) else np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def load(cls, directory, n_assets):
+        records = [np.load(os.path.join(directory, field + '.npy')) for field in RECORD_FIELDS]
+        return cls(*records, n_assets=n_assets)
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for field in RECORD_FIELDS:
+            np.save(os.path.join(directory, field + '.npy'), getattr(self, field))
+
+    def __len__(self):
+        return len(self.assets)
+
+    def _locate(self, days):
+        """
+            Best known record of every asset (columns) at the close of each of days (rows), or
+            MISSING
+        """
+        if not len(self):
+            return np.full((len(days), self.n_assets), MISSING, dtype=np.int64)
+        offsets = np.clip(days - self._first_day, -1, self._span - 1)
+        keys = np.arange(self.n_assets, dtype=np.int64) * self._span + offsets[:, None]
+        positions = np.searchsorted(self._keys, keys, side='right') - 1
+        known = (positions >= self.starts[:-1]) & (positions >= 0)
+        return np.where(known, self.best[np.where(known, positions, 0)], MISSING)
+
+    def locate(self, date):
+        """
+            Positions, per asset, of the records an algorithm knew at the close of date
+        """
+        return self._locate(_days(np.atleast_1d(to_nanos(date))))[0]
+
+    def latest(self, date):
+        """
+            Latest known value of every asset at the close of date, missing where nothing was
+            known yet
+        """
+        return self._fill(self.locate(date))
+
+    def panel(self, sessions, block=256):
+        """
+            (sessions x assets) array of the values known at the close of every session
+        """
+        days = _days(to_nanos(sessions))
+        panel = np.empty((len(days), self.n_assets), dtype=self.values.dtype)
+        for start in range(0, len(days), block):
+            panel[start:start + block] = self._fill(self._locate(days[start:start + block]))
+        return panel
+
+    def _fill(self, positions):
+        found = positions != MISSING
+        values = np.full(positions.shape, missing_value(self.values.dtype), dtype=self.values.dtype)
+        values[found] = self.values[positions[found]]
+        return values
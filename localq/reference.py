@@ -0,0 +1,130 @@
+"""
+    Process-wide cache of filters over slowly changing reference data
+
+    Universe filters like "primary share, common stock, not OTC, not a limited partnership" are
+    built from string and flag columns that change a few times a year, yet a pipeline evaluates
+    them, regular expressions included, every session. ReferenceCache keeps the value of such a
+    filter together with the range of bundle rows over which none of the columns it reads
+    change, so until the data does change a session costs one range check.
+
+    A filter can be cached when every term it's built from is latest_only, i.e. a function of
+    the latest row of its inputs alone. Entries are keyed by the bundle and the filter's
+    term_key, so equal filters built separately, in different pipelines or algorithms, share one
+    entry. The cache keeps no reference to the filters themselves, and holds at most
+    max_entries values, dropping the least recently used, so parameter sweeps building new
+    pipelines run after run don't grow it without bound.
+    A notnull()/isnull() of a column only depends on where the column is missing, so a filter
+    like market_cap.latest.notnull() stays valid while market caps move every day.
+"""
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from localq.pipeline import BoundColumn, Filter, NullFilter, _Latest, term_key
+
+
+#: Default number of filters a ReferenceCache holds values for
+MAX_ENTRIES = 256
+
+
+class ReferenceCache(object):
+    """
+        (first row, stop row, values) of every cached filter, one validity range per filter
+    """
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        #: (bundle root, term_key) -> (first row, stop row, values), least recently used first
+        self._entries = OrderedDict()
+
+    def _describe(self, term):
+        """
+            (term_key, [(column key, nulls only)]) of term, or None if it can't be cached.
+            Kept on the term, so the description lives exactly as long as the term does.
+        """
+        try:
+            return term.__dict__['_reference_description']
+        except KeyError:
+            pass
+        description = None
+        if isinstance(term, Filter):
+            leaves = self._leaves(term)
+            if leaves is not None:
+                key = term_key(term)
+                #: Parameters without a repr of their own hold object ids, so two equal
+                #: filters wouldn't share an entry
+                if ' object at 0x' not in repr(key):
+                    description = (key, sorted(set(leaves)))
+        term.__dict__['_reference_description'] = description
+        return description
+
+    def _leaves(self, term):
+        """
+            The (column key, nulls only) pairs term reads, or None if it isn't latest_only
+        """
+        if not term.latest_only or term.mask is not None:
+            return None
+        if isinstance(term, NullFilter) and isinstance(term.inputs[0], _Latest):
+            return [(term.inputs[0].inputs[0].key, True)]
+        leaves = []
+        for input_ in term.inputs:
+            if isinstance(input_, BoundColumn):
+                leaves.append((input_.key, False))
+            else:
+                inner = self._leaves(input_)
+                if inner is None:
+                    return None
+                leaves.extend(inner)
+        return leaves
+
+    def cacheable(self, term):
+        return self._describe(term) is not None
+
+    def get(self, bundle, term, row):
+        """
+            The cached values of term for bundle row row, or None
+        """
+        description = self._describe(term)
+        if description is None:
+            return None
+        key = (os.path.abspath(bundle.root), description[0])
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= row < entry[1]:
+            self._entries.move_to_end(key)
+            return entry[2]
+        return None
+
+    def put(self, bundle, term, row, values):
+        """
+            Caches values, computed from bundle row row, for as long as term's columns don't
+            change
+        """
+        key, leaves = self._describe(term)
+        first, stop = 0, len(bundle.sessions)
+        for column, nulls in leaves:
+            changes = bundle.change_rows(column, nulls)
+            position = np.searchsorted(changes, row, side='right')
+            if position:
+                first = max(first, changes[position - 1])
+            if position < len(changes):
+                stop = min(stop, changes[position])
+        values = np.array(values)
+        values.flags.writeable = False
+        key = (os.path.abspath(bundle.root), key)
+        self._entries[key] = (first, stop, values)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return values
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+
+
+#: The cache every engine uses unless told otherwise
+shared_cache = ReferenceCache()
@@ -0,0 +1,91 @@
+"""
+    Stand-ins for the quantopian.* modules
+
+    Algorithm files import from quantopian.algorithm, quantopian.pipeline and friends. install()
+    registers modules under those names that point at the local implementations.
+"""
+
+import sys
+import types
+
+from localq import datasets, factors, filters, pipeline, reference
+
+#: Name of the module to register -> attributes it exposes
+_MODULES = {
+    'quantopian': {},
+    'quantopian.algorithm': {
+        'attach_pipeline': lambda *args, **kwargs: _algorithm().attach_pipeline(*args, **kwargs),
+        'pipeline_output': lambda *args, **kwargs: _algorithm().pipeline_output(*args, **kwargs),
+    },
+    'quantopian.pipeline': {
+        'CustomFactor': pipeline.CustomFactor,
+        'Pipeline': pipeline.Pipeline,
+        'Factor': pipeline.Factor,
+        'Filter': pipeline.Filter,
+        'Classifier': pipeline.Classifier,
+    },
+    'quantopian.pipeline.data': {
+        'morningstar': datasets.morningstar,
+        'USEquityPricing': datasets.USEquityPricing,
+    },
+    'quantopian.pipeline.data.builtin': {
+        'USEquityPricing': datasets.USEquityPricing,
+    },
+    'quantopian.pipeline.factors': {
+        'CustomFactor': pipeline.CustomFactor,
+        'AverageDollarVolume': factors.AverageDollarVolume,
+        'SimpleMovingAverage': factors.SimpleMovingAverage,
+    },
+    'quantopian.pipeline.filters': {
+        'Q500US': filters.Q500US,
+        'Q1500US': filters.Q1500US,
+    },
+    'quantopian.pipeline.filters.morningstar': {
+        'Q500US': filters.Q500US,
+        'Q1500US': filters.Q1500US,
+        'IsPrimaryShare': filters.IsPrimaryShare,
+    },
+    'quantopian.research': {
+        'run_pipeline': lambda *args, **kwargs: _research_engine().run_pipeline(*args, **kwargs),
+    },
+}
+
+#: Engine behind quantopian.research.run_pipeline, see set_research_bundle
+_research = {'engine': None}
+
+
+def _algorithm():
+    from localq.algorithm import get_algorithm
+    return get_algorithm()
+
+
+def _research_engine():
+    if _research['engine'] is None:
+        raise RuntimeError("call localq.shims.set_research_bundle before run_pipeline")
+    return _research['engine']
+
+
+def set_research_bundle(bundle):
+    """
+        Points quantopian.research.run_pipeline at a Bundle
+    """
+    _research['engine'] = pipeline.SimplePipelineEngine(bundle,
+                                                        reference_cache=reference.shared_cache)
+
+
+def install():
+    """
+        Registers the quantopian.* modules in sys.modules; safe to call more than once
+    """
+    for name in sorted(_MODULES):
+        module = sys.modules.get(name)
+        if module is None or not getattr(module, '__localq__', False):
+            module = types.ModuleType(name)
+            module.__localq__ = True
+            module.__path__ = []
+            sys.modules[name] = module
+        for attribute, value in _MODULES[name].items():
+            setattr(module, attribute, value)
+        if '.' in name:
+            parent, child = name.rsplit('.', 1)
+            setattr(sys.modules[parent], child, module)
@@ -0,0 +1,91 @@
+"""
+    Parameter sweeps over one algorithm file
+
+    sweep runs an algorithm once per point of a grid of PARAMETERS settings (see
+    localq.algorithm) and collects each run's summary into one frame. The first run records
+    every windowed factor it computes into a FactorStore (see localq.factorstore); the store is
+    then frozen and the remaining runs fan out over a pool of forked processes, which inherit
+    the bundle, the store and the shared reference cache copy-on-write. Each worker only
+    evaluates the thresholds and screens that differ between points and replays the backtest.
+    Given a FactorPanel written beforehand, every run reads the factors from it instead and
+    none has to record them.
+"""
+
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+import pandas as pd
+
+from localq.algorithm import TradingAlgorithm
+from localq.factorstore import FactorStore
+
+#: Sweep state the forked workers inherit
+_job = None
+
+
+def grid_points(grid):
+    """
+        Every combination of grid, a dict of parameter name -> list of values, as dicts
+    """
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+
+def summarize(results):
+    """
+        Final value, total return, annualized volatility and Sharpe ratio, and max drawdown
+        of a run's daily results
+    """
+    values = results['portfolio_value']
+    returns = values.pct_change().dropna()
+    volatility = returns.std() * np.sqrt(252)
+    return {
+        'final_value': values.iloc[-1],
+        'total_return': values.iloc[-1] / values.iloc[0] - 1,
+        'volatility': volatility,
+        'sharpe': returns.mean() * 252 / volatility if volatility > 0 else np.nan,
+        'max_drawdown': (values / values.cummax() - 1).min(),
+    }
+
+
+def _run(parameters):
+    path, bundle, start, end, capital_base, store = _job
+    started = time.perf_counter()
+    algorithm = TradingAlgorithm(path, bundle, start, end, capital_base,
+                                 parameters=parameters, factor_store=store)
+    row = dict(parameters)
+    row.update(summarize(algorithm.run()))
+    row['seconds'] = time.perf_counter() - started
+    return row
+
+
+def sweep(path, bundle, start, end, grid, processes=None, capital_base=1e6, factor_store=None):
+    """
+        Runs the algorithm file at path over bundle from start to end once for every point of
+        grid and returns a frame with a row of parameters and summary statistics per point,
+        in grid order. processes defaults to the number of CPUs; 1 runs everything in this
+        process. factor_store is a frozen store or a FactorPanel to read factors from instead
+        of recording them in the first run.
+    """
+    global _job
+    points = grid_points(grid)
+    if not points:
+        raise ValueError("empty parameter grid")
+    store = FactorStore() if factor_store is None else factor_store
+    _job = (path, bundle, start, end, capital_base, store)
+    try:
+        rows = []
+        if store.recording:
+            rows.append(_run(points[0]))
+            store.freeze()
+        pending = points[len(rows):]
+        if processes == 1 or len(pending) <= 1:
+            rows.extend(_run(point) for point in pending)
+        else:
+            with multiprocessing.get_context('fork').Pool(processes) as pool:
+                rows.extend(pool.imap(_run, pending, chunksize=1))
+    finally:
+        _job = None
+    return pd.DataFrame(rows)
@@ -0,0 +1,210 @@
+"""
+    Synthetic bundles for profiling and load testing
+
+    Generates random but plausible daily prices and quarterly fundamentals for every field our
+    algorithms touch, so the runtime can be exercised without a licensed data feed. Besides
+    n_assets random equities the bundle always contains SPY, UWTI and DWTI, and sid 24 is AAPL.
+    Optionally the ETFs also get minute bars that end every session at its daily close.
+"""
+
+import numpy as np
+
+from localq.bundle import write_bundle
+from localq.minutes import MINUTES_IN_SESSION, write_minute_bars
+from localq.pointintime import PointInTimeStore
+from trading_calendar import sessions_in_range
+
+ETFS = ('SPY', 'UWTI', 'DWTI')
+
+#: Quarterly float fundamentals as (group.field, mean, standard deviation of the level,
+#: standard deviation of the quarterly change)
+QUARTERLY_FIELDS = (
+    ('operation_ratios.roa', 0.02, 0.03, 0.01),
+    ('operation_ratios.long_term_debt_equity_ratio', 0.6, 0.4, 0.1),
+    ('operation_ratios.current_ratio', 1.8, 0.7, 0.2),
+    ('operation_ratios.gross_margin', 0.35, 0.15, 0.03),
+    ('operation_ratios.assets_turnover', 0.25, 0.1, 0.03),
+    ('cash_flow_statement.operating_cash_flow', 2e8, 4e8, 1e8),
+    ('cash_flow_statement.cash_flow_from_continuing_operating_activities', 2e8, 4e8, 1e8),
+    ('cash_flow_statement.net_income', 1.5e8, 3e8, 8e7),
+    ('balance_sheet.long_term_debt', 1e9, 8e8, 1e8),
+    ('balance_sheet.working_capital', 8e8, 6e8, 1e8),
+    ('balance_sheet.current_assets', 2e9, 1.5e9, 2e8),
+    ('balance_sheet.total_liabilities', 2.5e9, 2e9, 2e8),
+    ('balance_sheet.preferred_stock', 0.0, 5e7, 0.0),
+    ('earnings_report.basic_eps', 0.5, 0.6, 0.15),
+    ('earnings_report.normalized_basic_eps', 0.5, 0.6, 0.15),
+    ('earnings_report.dividend_per_share', 0.2, 0.25, 0.02),
+    ('valuation_ratios.ev_to_ebitda', 11.0, 6.0, 1.5),
+    ('valuation_ratios.pb_ratio', 2.5, 1.5, 0.3),
+    ('valuation_ratios.payout_ratio', 0.35, 0.2, 0.05),
+    ('valuation_ratios.dividend_yield', 0.02, 0.015, 0.003),
+    ('valuation_ratios.forward_dividend_yield', 0.02, 0.015, 0.003),
+)
+
+SECTOR_CODES = np.array([101, 102, 103, 104, 205, 206, 207, 308, 309, 310, 311])
+EXCHANGES = np.array(['NEW YORK STOCK EXCHANGE', 'NASDAQ GLOBAL SELECT', 'AMERICAN STOCK EXCHANGE', 'OTC'])
+EXCHANGE_IDS = np.array(['NYS', 'NAS', 'ASE', 'OTCPK'])
+
+
+def _quarterly(rng, mean, level_sd, change_sd, n_quarters, n_assets):
+    """
+        (quarters x assets) random walk per asset
+    """
+    levels = mean + level_sd * rng.standard_normal(n_assets)
+    return levels + np.cumsum(change_sd * rng.standard_normal((n_quarters, n_assets)), axis=0)
+
+
+def _minute_bars(rng, open_, close, volume):
+    """
+        (sessions * 390 x assets) close and volume minute bars: a random walk from each
+        session's open to its close, and the session's volume spread over the minutes that
+        traded. Closes of minutes without trades are NaN.
+    """
+    n_days, n_assets = close.shape
+    steps = (0.01 / np.sqrt(MINUTES_IN_SESSION)) * open_[:, None, :] \
+        * rng.standard_normal((n_days, MINUTES_IN_SESSION, n_assets))
+    walk = np.cumsum(steps, axis=1)
+    #: Pull the walk in linearly so that the last minute closes at the daily close
+    fraction = np.arange(1, MINUTES_IN_SESSION + 1)[None, :, None] / float(MINUTES_IN_SESSION)
+    path = open_[:, None, :] + walk - fraction * (walk[:, -1:, :] - (close - open_)[:, None, :])
+    path[:, -1, :] = close
+    #: A fifth of the minutes see no trades, except the last one
+    traded = rng.random_sample(path.shape) >= 0.2
+    traded[:, -1, :] = True
+    path[~traded] = np.nan
+    shares = traded * rng.gamma(2.0, size=(n_days, MINUTES_IN_SESSION, n_assets))
+    shares /= shares.sum(axis=1, keepdims=True)
+    minute_volume = np.round(volume[:, None, :] * shares)
+    return (path.reshape(-1, n_assets), minute_volume.reshape(-1, n_assets))
+
+
+def make_synthetic_bundle(root, n_assets=500, start='2010-01-04', end='2016-12-30', seed=0,
+                          minutes=False):
+    """
+        Writes a synthetic bundle covering the sessions from start to end to root, with minute
+        bars for the ETFs if minutes is set
+    """
+    rng = np.random.RandomState(seed)
+    sessions = sessions_in_range(start, end)
+    n_days = len(sessions)
+    n_total = n_assets + len(ETFS)
+
+    sids = np.arange(1, n_total + 1)
+    symbols = np.array(['S%04d' % sid for sid in sids], dtype='U8')
+    if n_assets >= 24:
+        symbols[23] = 'AAPL'
+    symbols[n_assets:] = ETFS
+    exchange_codes = rng.choice(len(EXCHANGES), n_total, p=[0.45, 0.45, 0.05, 0.05])
+    exchange_codes[n_assets:] = 0
+
+    #: Prices: geometric random walks, with a few assets listing partway through
+    listing = np.where(rng.random_sample(n_total) < 0.1, rng.randint(0, n_days, n_total), 0)
+    listing[n_assets:] = 0
+    returns = 0.0003 + 0.02 * rng.standard_normal((n_days, n_total))
+    close = (10 + 190 * rng.random_sample(n_total)) * np.exp(np.cumsum(returns, axis=0))
+    listed = np.arange(n_days)[:, None] >= listing[None, :]
+    close[~listed] = np.nan
+    spread = np.abs(0.01 * rng.standard_normal((n_days, n_total)))
+    volume = np.round(np.exp(12 + 1.5 * rng.standard_normal(n_total)) * np.exp(0.3 * rng.standard_normal((n_days, n_total))))
+    volume[~listed] = np.nan
+    columns = {
+        'pricing/close': close,
+        'pricing/open': close * (1 + 0.005 * rng.standard_normal((n_days, n_total))),
+        'pricing/high': close * (1 + spread),
+        'pricing/low': close * (1 - spread),
+        'pricing/volume': volume,
+    }
+
+    #: Fundamentals: each asset files roughly every 63 sessions on its own schedule, and the
+    #: data vendor publishes each filing up to three sessions after its as_of date
+    phase = rng.randint(0, 63, n_total)
+    n_quarters = n_days // 63 + 2
+    gaps = 63 + rng.randint(-8, 9, (n_quarters, n_total))
+    filings = phase[None, :] + np.cumsum(gaps, axis=0) - gaps[0]
+    published = filings + rng.choice(4, filings.shape, p=[0.2, 0.5, 0.2, 0.1])
+    filed = np.zeros((n_days + 1, n_total), dtype=np.int64)
+    np.add.at(filed, (np.minimum(published, n_days), np.broadcast_to(np.arange(n_total), filings.shape)), 1)
+    #: Filings known at the close of each session
+    quarter = np.cumsum(filed[:n_days], axis=0)
+
+    #: Point-in-time records: one per asset for the quarter before the first session, then one
+    #: per published filing. ETFs have none.
+    session_dates = sessions.tz_localize(None).values.astype('datetime64[ns]')
+    filing, asset = np.nonzero(published[:, :n_assets] < n_days)
+    record_assets = np.concatenate([np.arange(n_assets), asset])
+    as_of = np.concatenate([np.repeat(session_dates[:1], n_assets), session_dates[filings[filing, asset]]])
+    knowledge = np.concatenate([np.repeat(session_dates[:1], n_assets), session_dates[published[filing, asset]]])
+
+    point_in_time = {}
+    for name, mean, level_sd, change_sd in QUARTERLY_FIELDS:
+        walk = _quarterly(rng, mean, level_sd, change_sd, n_quarters + 1, n_total)
+        values = np.concatenate([walk[0, :n_assets], walk[filing + 1, asset]])
+        point_in_time['fundamentals/' + name] = PointInTimeStore(record_assets, as_of, knowledge,
+                                                                 values, n_total)
+
+    filing_dates = session_dates[np.minimum(filings, n_days - 1)]
+    period_end = (filing_dates - np.timedelta64(45, 'D')).astype('datetime64[M]').astype('datetime64[ns]') \
+        - np.timedelta64(1, 'D')
+    point_in_time['fundamentals/financial_statement_filing.period_ending_date'] = PointInTimeStore(
+        asset, as_of[n_assets:], knowledge[n_assets:], period_end[filing, asset], n_total)
+    for key, store in point_in_time.items():
+        columns[key] = store.panel(sessions)
+
+    #: Share counts: a random walk per filing, mostly issuance but with buybacks too
+    shares = np.exp(18 + rng.standard_normal(n_total)) * np.exp(np.cumsum(
+        0.015 * rng.standard_normal((n_quarters + 1, n_total)) + 0.002, axis=0))
+    columns['fundamentals/valuation.shares_outstanding'] = shares[quarter, np.arange(n_total)]
+    columns['fundamentals/valuation.market_cap'] = close * columns['fundamentals/valuation.shares_outstanding']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eps = 4 * columns['fundamentals/earnings_report.basic_eps']
+        columns['fundamentals/valuation_ratios.pe_ratio'] = np.where(eps > 0, close / eps, np.nan)
+    columns['fundamentals/valuation_ratios.dividend_yield_as_of'] = np.broadcast_to(
+        sessions.tz_localize(None).values.astype('datetime64[ns]')[:, None], (n_days, n_total))
+
+    #: Reference data doesn't change over time
+    def constant(values):
+        return np.broadcast_to(np.asarray(values)[None, :], (n_days, n_total))
+
+    limited_partnership = rng.random_sample(n_total) < 0.03
+    names = np.array(['Company %d %s' % (sid, 'L.P.' if lp else 'Inc') for sid, lp in zip(sids, limited_partnership)])
+    columns['fundamentals/company_reference.standard_name'] = constant(names)
+    columns['fundamentals/company_reference.short_name'] = constant(names)
+    columns['fundamentals/company_reference.primary_symbol'] = constant(symbols)
+    columns['fundamentals/balance_sheet.limited_partnership'] = constant(np.where(limited_partnership, 1.0, np.nan))
+    when_issued = np.where(rng.random_sample(n_total) < 0.01, np.char.add(symbols, '.WI'), symbols)
+    columns['fundamentals/share_class_reference.symbol'] = constant(when_issued)
+    columns['fundamentals/share_class_reference.exchange_id'] = constant(EXCHANGE_IDS[exchange_codes])
+    columns['fundamentals/share_class_reference.security_type'] = constant(
+        np.where(rng.random_sample(n_total) < 0.9, 'ST00000001', 'ST00000002'))
+    columns['fundamentals/share_class_reference.is_primary_share'] = constant(rng.random_sample(n_total) < 0.95)
+    columns['fundamentals/share_class_reference.is_depositary_receipt'] = constant(rng.random_sample(n_total) < 0.03)
+    columns['fundamentals/asset_classification.morningstar_sector_code'] = constant(
+        rng.choice(SECTOR_CODES, n_total).astype(np.float64))
+
+    #: ETFs have prices but no fundamentals
+    for key, values in columns.items():
+        if key.startswith('fundamentals/') and key not in point_in_time:
+            values = np.array(values)
+            if values.dtype.kind == 'f':
+                values[:, n_assets:] = np.nan
+            elif values.dtype.kind == 'M':
+                values[:, n_assets:] = np.datetime64('NaT')
+            elif values.dtype.kind == 'U':
+                values[:, n_assets:] = ''
+            columns[key] = values
+
+    assets = {
+        'sid': sids,
+        'symbol': symbols,
+        'exchange': EXCHANGES[exchange_codes],
+        'asset_name': names,
+    }
+    write_bundle(root, sessions, assets, columns, point_in_time)
+
+    if minutes:
+        etfs = slice(n_assets, n_total)
+        close, volume = _minute_bars(rng, columns['pricing/open'][:, etfs], columns['pricing/close'][:, etfs],
+                                     columns['pricing/volume'][:, etfs])
+        write_minute_bars(root, sids[etfs], sessions, close, volume)
+    return root
@@ -0,0 +1,249 @@
+"""
+    Quarter indexing for trailing twelve month factors
+
+    Fundamentals show up in pipeline windows as step functions: a value is carried forward every
+    session until the next filing lands. A trailing twelve month (TTM) value at a lag of k years
+    is the sum of four quarterly values, so a factor needs the window rows holding those quarters.
+
+    This module works out those rows as integer gather-index arrays so that every quarter of every
+    lag comes out of one fancy-index call per input:
+
+    - fiscal_rows follows each asset's own filing calendar, using the period ending date of its
+      statements, so quarters are never double counted or skipped when filings are unevenly spaced
+    - calendar_rows steps back in calendar quarters through the window's trading sessions, for
+      inputs we don't have period ending dates for
+    - RollingQuarters carries fiscal_rows' answer from one session to the next, for engines that
+      evaluate factors incrementally over consecutive sessions
+"""
+
+import numpy as np
+
+from asof_index import MISSING, AsOfIndex, shift_date
+from trading_calendar import trailing_sessions
+
+TRADING_DAYS_IN_YEAR = 252
+QUARTERS_IN_YEAR = 4
+#: Integer on purpose, TRADING_DAYS_IN_YEAR/4 is a float under Python 3
+TRADING_DAYS_IN_QUARTER = TRADING_DAYS_IN_YEAR // QUARTERS_IN_YEAR
+
+
+def window_length(max_lag):
+    """
+        Window length that reaches the oldest quarter of the TTM value max_lag years back, with a
+        quarter of slack for late filers
+    """
+    return TRADING_DAYS_IN_YEAR * (max_lag + 1) + TRADING_DAYS_IN_QUARTER
+
+
+class QuarterRows(object):
+    """
+        Gather indices for the quarters of several TTM lags.
+
+        rows and cols are (lags x 4 x assets) integer arrays into a (days x assets) window and
+        valid flags the entries that were found in the window. Use gather/ttm to apply them.
+    """
+
+    def __init__(self, rows, cols, valid):
+        self.rows = rows
+        self.cols = cols
+        self.valid = valid
+
+    def gather(self, values):
+        """
+            Pulls the quarterly values out of a (days x assets) window in one fancy-index call,
+            returning a (lags x 4 x assets) float array with NaN where a quarter wasn't found
+        """
+        quarterly = values[self.rows, self.cols].astype(np.float64, copy=False)
+        if not self.valid.all():
+            quarterly = np.where(self.valid, quarterly, np.nan)
+        return quarterly
+
+    def ttm(self, values):
+        """
+            Trailing twelve month sums as a (lags x assets) array
+        """
+        return self.gather(values).sum(axis=1)
+
+
+def _as_nanos(period_end):
+    period_end = np.asarray(period_end)
+    if period_end.dtype.kind == 'M':
+        return period_end.astype('datetime64[ns]').view(np.int64)
+    #: Float columns carry missing dates as NaN
+    nanos = np.full(period_end.shape, np.iinfo(np.int64).min, dtype=np.int64)
+    known = ~np.isnan(period_end)
+    nanos[known] = period_end[known].astype(np.int64)
+    return nanos
+
+
+def fiscal_rows(period_end, lags, today=None):
+    """
+        Rows of the last session of each fiscal quarter, counting back from each asset's most
+        recently reported quarter.
+
+        period_end is the (days x assets) window of the statements' period ending dates. A new
+        quarter starts on every row where it changes, so quarter 0 ends on the last row of the
+        window, quarter 1 ends the row before the most recent change, and so on. The TTM value at
+        lag k is quarters 4k to 4k+3.
+
+        If today is given, assets with no period ending dates at all fall back to calendar_rows.
+    """
+    nanos = _as_nanos(period_end)
+    n_days, n_assets = nanos.shape
+    lags = np.asarray(lags, dtype=np.intp)
+
+    #: Quarter ordinals we need, shaped (lags x 4)
+    quarters = (lags[:, None] * QUARTERS_IN_YEAR + np.arange(QUARTERS_IN_YEAR))
+
+    #: Rows where a new quarter starts, grouped by asset and ascending within each asset
+    changes = nanos[1:] != nanos[:-1]
+    change_assets, change_rows = np.nonzero(changes.T)
+    change_rows += 1
+    counts = np.bincount(change_assets, minlength=n_assets)
+    ends = np.cumsum(counts)
+
+    #: Quarter q (q >= 1) ends the row before the q-th most recent change of its asset
+    position = ends[None, None, :] - quarters[:, :, None]
+    valid = position >= ends[None, None, :] - counts[None, None, :]
+    rows = np.full(position.shape, n_days - 1, dtype=np.intp)
+    older = valid & (quarters[:, :, None] > 0)
+    rows[older] = change_rows[position[older]] - 1
+
+    if today is not None:
+        undated = (nanos == np.iinfo(np.int64).min).all(axis=0)
+        if undated.any():
+            fallback = calendar_rows(today, n_days, lags)
+            rows[:, :, undated] = (n_days + fallback)[:, :, None]
+            valid[:, :, undated] = True
+
+    cols = np.broadcast_to(np.arange(n_assets), rows.shape)
+    return QuarterRows(rows, cols, valid)
+
+
+_calendar_cache = {}
+
+
+def calendar_rows(today, n_days, lags):
+    """
+        Negative row offsets, shaped (lags x 4), of the sessions that close each calendar quarter
+        of the TTM value at every lag, in a window of n_days sessions computed on today. Results
+        are cached since every asset and every factor shares them.
+    """
+    key = (today, n_days, tuple(lags))
+    rows = _calendar_cache.get(key)
+    if rows is None:
+        sessions = AsOfIndex(trailing_sessions(today, n_days))
+        quarter_ends = [shift_date(today, years=-lag, months=-3*quarter)
+                        for lag in lags for quarter in range(QUARTERS_IN_YEAR)]
+        positions = sessions.locate_many(quarter_ends)
+        if (positions == MISSING).any():
+            raise ValueError("a window of %d sessions does not reach back %d years from %s"
+                             % (n_days, max(lags), today))
+        rows = (positions - n_days).reshape(len(lags), QUARTERS_IN_YEAR)
+        if len(_calendar_cache) > 1024:
+            _calendar_cache.clear()
+        _calendar_cache[key] = rows
+    return rows
+
+
+class RollingQuarters(object):
+    """
+        fiscal_rows kept up to date one session at a time.
+
+        Rather than finding every quarter boundary in the full window each day, this remembers
+        each asset's value at the end of its last few fiscal quarters and the row where each of
+        them ended, and only looks at the newest row when a session is pushed. ttm gives exactly
+        what fiscal_rows(...).ttm gives on the current window, for several inputs at once.
+
+        The last window_length rows are also kept in a ring buffer, for assets with no period
+        ending dates in the window that fall back to calendar_rows.
+    """
+
+    def __init__(self, lags, window_length):
+        self.lags = np.asarray(lags, dtype=np.intp)
+        self.window_length = window_length
+        self.quarters = self.lags[:, None] * QUARTERS_IN_YEAR + np.arange(QUARTERS_IN_YEAR)
+        #: Number of completed quarters to remember
+        self.depth = int(self.quarters.max())
+        self.row = -1
+
+    def start(self, period_end, values):
+        """
+            Rebuilds the state from a full (days x assets) period_end window and the matching
+            windows of every input in values, as pushing their rows one at a time would
+        """
+        nanos = _as_nanos(period_end)
+        stack = np.stack([np.asarray(value, dtype=np.float64) for value in values], axis=-1)
+        n_days, n_assets = nanos.shape
+        missing = np.iinfo(np.int64).min
+
+        #: The depth most recent quarter changes of every asset, newest first
+        change_assets, change_rows = np.nonzero((nanos[1:] != nanos[:-1]).T)
+        change_rows += 1
+        counts = np.bincount(change_assets, minlength=n_assets)
+        ends = np.cumsum(counts)
+        recent = np.arange(self.depth)[:, None]
+        found = recent < counts[None, :]
+        positions = (ends[None, :] - 1 - recent)[found]
+        assets = np.broadcast_to(np.arange(n_assets), found.shape)[found]
+
+        self.completed = np.full((self.depth, n_assets, stack.shape[-1]), np.nan)
+        self.completed[found] = stack[change_rows[positions] - 1, assets]
+        self.ended = np.full((self.depth, n_assets), missing, dtype=np.int64)
+        self.ended[found] = change_rows[positions]
+
+        dated = nanos != missing
+        self.dated = np.where(dated.any(axis=0), n_days - 1 - dated[::-1].argmax(axis=0), missing)
+        self.ring = np.empty((self.window_length, n_assets, stack.shape[-1]))
+        tail = np.arange(max(n_days - self.window_length, 0), n_days)
+        self.ring[tail % self.window_length] = stack[tail]
+        self.period_end = nanos[-1]
+        self.current = stack[-1]
+        self.row = n_days - 1
+
+    def push(self, period_end, values):
+        """
+            Appends one session: period_end and each input in values are single rows
+        """
+        nanos = _as_nanos(period_end)
+        current = np.column_stack(values).astype(np.float64, copy=False)
+        self.row += 1
+        if self.row == 0:
+            n_assets, n_fields = current.shape
+            self.completed = np.full((self.depth, n_assets, n_fields), np.nan)
+            #: Row where each completed quarter's successor started
+            self.ended = np.full((self.depth, n_assets), np.iinfo(np.int64).min, dtype=np.int64)
+            self.dated = np.full(n_assets, np.iinfo(np.int64).min, dtype=np.int64)
+            self.ring = np.empty((self.window_length, n_assets, n_fields))
+        else:
+            changed = np.flatnonzero(nanos != self.period_end)
+            if len(changed):
+                self.completed[1:, changed] = self.completed[:-1, changed]
+                self.completed[0, changed] = self.current[changed]
+                self.ended[1:, changed] = self.ended[:-1, changed]
+                self.ended[0, changed] = self.row
+        self.period_end = nanos
+        self.current = current
+        self.ring[self.row % self.window_length] = current
+        self.dated[nanos != np.iinfo(np.int64).min] = self.row
+
+    def ttm(self, today=None):
+        """
+            Trailing twelve month sums as a (lags x assets x inputs) array, for the window
+            ending on the last pushed row
+        """
+        first = self.row - self.window_length + 1
+        stack = np.concatenate([self.current[np.newaxis], self.completed])
+        ended = np.concatenate([np.full((1,) + self.dated.shape, np.iinfo(np.int64).max),
+                                self.ended])
+        #: Quarters that started before the window's first row can't be told apart from it
+        valid = ended[self.quarters] > first
+        quarterly = np.where(valid[..., np.newaxis], stack[self.quarters], np.nan)
+
+        if today is not None:
+            undated = np.flatnonzero(self.dated < first)
+            if len(undated):
+                offsets = calendar_rows(today, self.window_length, self.lags)
+                slots = (self.row + 1 + offsets) % self.window_length
+                quarterly[:, :, undated] = self.ring[slots[:, :, None], undated]
+        return quarterly.sum(axis=1)
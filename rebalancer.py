@@ -0,0 +1,74 @@
+"""
+    Batch rebalancing to a vector of target weights
+
+    Calling order_target_percent once per stock looks up a price, the portfolio value and the
+    current position for every order, and exiting everything we no longer want by testing each
+    held stock against the new list is a quadratic membership scan. Rebalancer takes the whole
+    target portfolio as a Series of weights, diffs it against current holdings in one array
+    operation and places the resulting batch of orders in one pass.
+
+    Orders come out exactly as order_target_percent would have sized them: the target value
+    over the last price, truncated to whole shares. Optionally, trades worth less than
+    min_trade_value are skipped (closing a position never is), and so is the whole batch when
+    it would turn over less than min_turnover of the portfolio.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class Rebalancer(object):
+    """
+        order is the algorithm's order function, which places an order for a number of shares.
+        min_trade_value is in dollars, min_turnover a fraction of the portfolio value.
+    """
+
+    def __init__(self, order, min_trade_value=0.0, min_turnover=0.0):
+        self.order = order
+        self.min_trade_value = min_trade_value
+        self.min_turnover = min_turnover
+
+    def orders(self, context, data, weights, leave=()):
+        """
+            Series of shares to buy (positive) or sell (negative) per asset to move the portfolio
+            to weights, a Series (or dict) of target weights by asset. Positions in assets
+            without a weight are closed if they can trade, except those in leave.
+        """
+        weights = pd.Series(weights, dtype=np.float64)
+        positions = context.portfolio.positions
+        held = pd.Index(list(positions), dtype=object)
+        exits = held[~held.isin(weights.index) & ~held.isin(list(leave))]
+        if len(exits):
+            exits = exits[np.asarray(data.can_trade(exits), dtype=bool)]
+
+        assets = pd.Index(list(weights.index) + list(exits), dtype=object)
+        if not len(assets):
+            return pd.Series(np.empty(0, dtype=np.int64), index=assets)
+        targets = np.concatenate([weights.values, np.zeros(len(exits))])
+        prices = np.asarray(data.current(assets, 'price'), dtype=np.float64)
+        current = np.array([positions[asset].amount for asset in assets], dtype=np.float64)
+
+        #: No price, no order, as with order_target_percent
+        priced = prices > 0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            shares = np.trunc(targets * context.portfolio.portfolio_value / prices)
+        amounts = np.where(priced, shares - current, 0.0)
+        values = np.abs(amounts) * np.where(priced, prices, 0.0)
+
+        if self.min_trade_value:
+            amounts[(values < self.min_trade_value) & (shares != 0)] = 0.0
+        if self.min_turnover and \
+                values[amounts != 0].sum() < self.min_turnover * context.portfolio.portfolio_value:
+            amounts[:] = 0.0
+
+        trading = amounts != 0
+        return pd.Series(amounts[trading].astype(np.int64), index=assets[trading])
+
+    def rebalance(self, context, data, weights, leave=()):
+        """
+            Places the orders that move the portfolio to weights (see orders) and returns them
+        """
+        batch = self.orders(context, data, weights, leave)
+        for asset, amount in zip(batch.index, batch.values.tolist()):
+            self.order(asset, amount)
+        return batch
@@ -5,6 +5,8 @@ from quantopian.algorithm import attach_pipeline, pipeline_output
 from quantopian.pipeline import Pipeline
 from quantopian.pipeline.data.builtin import USEquityPricing
 from quantopian.pipeline.factors import AverageDollarVolume
+
+import numpy
  
 def initialize(context):
     """
@@ -50,14 +52,8 @@ def before_trading_start(context, data):
     context.output = pipeline_output('my_pipeline')
   
     # These are the securities that we are interested in trading each day.
-    value = 0
-    for sec in context.portfolio.positions:  
-        shares = context.portfolio.positions[sec.sid].amount;
-        price = data.current(sec, 'price');
-        value += shares * price;
-    
     context.security_list = context.output.index
-    total_value = context.portfolio.cash + value
+    total_value = context.portfolio.cash + context.portfolio.positions_value
     log.info('current cash:' + str(context.portfolio.cash) + "total current value: " + str(total_value))
     log_position(context, data)
         
@@ -81,10 +77,12 @@ def my_record_vars(context, data):
     pass
  
 def handle_data(context,data):
-    UWTI_Position = context.portfolio.positions[symbol('UWTI')].amount *        data.current(symbol('UWTI'), 'price')
-    DWTI_Position = context.portfolio.positions[symbol('DWTI')].amount * data.current(symbol('DWTI'), 'price')
+    #: Both legs priced in one call
+    shares = numpy.array([context.portfolio.positions[sec].amount for sec in context.stocks])
+    positions = shares * data.current(context.stocks, 'price').values
     
-    if (abs(UWTI_Position) + abs(DWTI_Position)) < 1000000:
+    # Only one UWTI order pending at a time
+    if abs(positions).sum() < 1000000 and not get_open_orders(symbol('UWTI')):
         order(symbol('UWTI'),-1000)
         
     #    return
@@ -117,13 +115,17 @@ def has_orders(context):
                 message = message.format(amount=oo.amount, stock=stock)
                 log.info(message)
                 has_orders = True
-            return has_orders
+    return has_orders
        
 def log_position(context, data):
     
-    for sec in context.portfolio.positions:  
-        shares = context.portfolio.positions[sec.sid].amount;
-        price = data.current(sec, 'price');
+    held = list(context.portfolio.positions)
+    if not held:
+        return
+    prices = data.current(held, 'price')
+    for sec in held:  
+        shares = context.portfolio.positions[sec].amount;
+        price = prices[sec];
         value = shares * price;
         
         log.info(sec.symbol +  " price: " + str(price) + " shares:" + str(shares) + " value: " + str(value))
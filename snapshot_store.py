@@ -0,0 +1,190 @@
+"""
+    Append-only columnar store for periodic fundamentals snapshots
+
+    Replaces rebuilding a pd.Panel out of a date:DataFrame dictionary every time a snapshot is
+    added. Values live in preallocated NumPy blocks indexed by (date, asset, field) that grow by
+    doubling, so appending a snapshot is amortized O(1) and lookups hand back views instead of
+    copies. Snapshots older than the longest lookback we need are dropped as new ones arrive.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from asof_index import MISSING, AsOfIndex, shift_date
+
+#: A single snapshot; values is an (assets x fields) view and present flags the assets that
+#: were actually in the snapshot, both aligned with SnapshotStore.assets
+Snapshot = namedtuple('Snapshot', ['date', 'values', 'present'])
+
+
+def _to_timestamp(date):
+    """
+        Normalizes a date to a UTC Timestamp, treating naive dates as UTC
+    """
+    date = pd.Timestamp(date)
+    if date.tzinfo is None:
+        return date.tz_localize('UTC')
+    return date.tz_convert('UTC')
+
+
+class SnapshotStore(object):
+    """
+        Holds fundamentals snapshots in a (date, asset, field) block.
+
+        fields fixes the column order of every snapshot. lookback is the longest distance back in
+        time we ever ask for; anything older than the latest snapshot at or before
+        (newest date - lookback) is dropped.
+    """
+
+    def __init__(self, fields, lookback=pd.DateOffset(years=1), date_capacity=16, asset_capacity=256):
+        self.fields = tuple(fields)
+        self.lookback = lookback
+
+        self._values = np.full((date_capacity, asset_capacity, len(self.fields)), np.nan)
+        self._present = np.zeros((date_capacity, asset_capacity), dtype=bool)
+        self._dates = np.empty(date_capacity, dtype=np.int64)
+
+        #: Live snapshots are the rows in [_start, _stop)
+        self._start = 0
+        self._stop = 0
+
+        self._assets = np.empty(asset_capacity, dtype=object)
+        self._slots = {}
+
+    def __len__(self):
+        return self._stop - self._start
+
+    @property
+    def assets(self):
+        """
+            Assets in slot order; rows of every snapshot's values line up with this array
+        """
+        return self._assets[:len(self._slots)]
+
+    @property
+    def dates(self):
+        """
+            Dates of the live snapshots, oldest first
+        """
+        return pd.DatetimeIndex(self._dates[self._start:self._stop], tz='UTC')
+
+    def append(self, date, frame):
+        """
+            Adds a snapshot for date. frame is laid out like get_fundamentals output, with fields
+            as the index and securities as the columns. Dates must be strictly increasing.
+        """
+        key = _to_timestamp(date).value
+        if self._stop > self._start and key <= self._dates[self._stop - 1]:
+            raise ValueError("snapshots must be appended in date order, got %s after %s"
+                             % (date, self.dates[-1]))
+
+        slots = np.fromiter((self._slot(asset) for asset in frame.columns), dtype=np.intp,
+                            count=len(frame.columns))
+        self._reserve_date()
+
+        row = self._stop
+        self._values[row] = np.nan
+        self._present[row] = False
+        self._values[row, slots] = frame.reindex(index=list(self.fields)).values.T
+        self._present[row, slots] = True
+        self._dates[row] = key
+        self._stop += 1
+
+        self._trim()
+
+    def index(self):
+        """
+            AsOfIndex over the live snapshot dates; positions are relative to the oldest one
+        """
+        return AsOfIndex(self._dates[self._start:self._stop])
+
+    def locate(self, date, tolerance=None):
+        """
+            Returns the block row of the latest snapshot at or before date, or None. With a
+            tolerance, snapshots further back than that count as missing.
+        """
+        row = self.index().locate(date, tolerance)
+        if row == MISSING:
+            return None
+        return self._start + row
+
+    def as_of(self, date, tolerance=None):
+        """
+            Returns the latest Snapshot at or before date without copying, or None
+        """
+        row = self.locate(date, tolerance)
+        if row is None:
+            return None
+        n_assets = len(self._slots)
+        return Snapshot(pd.Timestamp(self._dates[row], tz='UTC'),
+                        self._values[row, :n_assets],
+                        self._present[row, :n_assets])
+
+    def years_earlier(self, date, years=1, tolerance=None):
+        """
+            Returns the latest Snapshot at or before the same calendar day `years` years before
+            date, or None if we don't have data going back that far
+        """
+        return self.as_of(shift_date(_to_timestamp(date), years=-years), tolerance)
+
+    def frame(self, snapshot):
+        """
+            Converts a Snapshot back into a DataFrame of the present assets x fields
+        """
+        return pd.DataFrame(snapshot.values[snapshot.present],
+                            index=self.assets[snapshot.present],
+                            columns=self.fields)
+
+    def _slot(self, asset):
+        slot = self._slots.get(asset)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self._assets):
+                self._grow_assets()
+            self._slots[asset] = slot
+            self._assets[slot] = asset
+        return slot
+
+    def _grow_assets(self):
+        capacity = 2 * len(self._assets)
+
+        values = np.full((self._values.shape[0], capacity, len(self.fields)), np.nan)
+        values[:, :len(self._assets)] = self._values
+        present = np.zeros((self._present.shape[0], capacity), dtype=bool)
+        present[:, :len(self._assets)] = self._present
+        assets = np.empty(capacity, dtype=object)
+        assets[:len(self._assets)] = self._assets
+
+        self._values, self._present, self._assets = values, present, assets
+
+    def _reserve_date(self):
+        capacity = len(self._dates)
+        if self._stop < capacity:
+            return
+
+        live = self._stop - self._start
+        if self._start >= capacity // 2:
+            #: Plenty of dropped rows at the front, slide the live ones down instead of growing
+            self._values[:live] = self._values[self._start:self._stop]
+            self._present[:live] = self._present[self._start:self._stop]
+            self._dates[:live] = self._dates[self._start:self._stop]
+        else:
+            capacity *= 2
+            values = np.full((capacity,) + self._values.shape[1:], np.nan)
+            values[:live] = self._values[self._start:self._stop]
+            present = np.zeros((capacity,) + self._present.shape[1:], dtype=bool)
+            present[:live] = self._present[self._start:self._stop]
+            dates = np.empty(capacity, dtype=np.int64)
+            dates[:live] = self._dates[self._start:self._stop]
+            self._values, self._present, self._dates = values, present, dates
+
+        self._start, self._stop = 0, live
+
+    def _trim(self):
+        newest = pd.Timestamp(self._dates[self._stop - 1], tz='UTC')
+        #: Keep the last snapshot at or before the cutoff so as_of still answers at the boundary
+        oldest_needed = self.index().locate(newest - self.lookback)
+        if oldest_needed > 0:
+            self._start += oldest_needed
@@ -0,0 +1,26 @@
+"""
+    Shared fixtures: a small synthetic bundle, long enough for five-year EPS windows
+"""
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from localq.bundle import Bundle  # noqa: E402
+from localq.synthetic import make_synthetic_bundle  # noqa: E402
+
+
+def algorithm_path(name):
+    return os.path.join(ROOT, name)
+
+
+@pytest.fixture(scope='session')
+def bundle(tmp_path_factory):
+    root = str(tmp_path_factory.mktemp('bundle'))
+    make_synthetic_bundle(root, 100, '2010-01-04', '2016-12-30', 0, False)
+    return Bundle(root)
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import algorithm_path
+from localq.algorithm import TradingAlgorithm
+from localq.blocks import BlockPipelineEngine
+from localq.factorstore import FactorPanel
+from localq.pipeline import SimplePipelineEngine
+
+START, END = '2015-06-01', '2016-12-30'
+ALGORITHMS = ['Graham_enterprising_investor.py', 'Piotroski-pipeline.py', 'shorting_leveraged_etfs.py']
+#: Memory budgets that split each algorithm's run into several chunks
+CHUNK_BUDGETS = {
+    'Graham_enterprising_investor.py': 8 << 20,
+    'Piotroski-pipeline.py': 8 << 20,
+    'shorting_leveraged_etfs.py': 512 << 10,
+}
+
+
+@pytest.fixture(scope='module')
+def pipelines(bundle):
+    return dict((path, TradingAlgorithm(algorithm_path(path), bundle, START, END)
+                 .attached_pipelines()['my_pipeline']) for path in ALGORITHMS)
+
+
+@pytest.fixture(scope='module')
+def expected(bundle, pipelines):
+    return dict((path, SimplePipelineEngine(bundle).run_pipeline(pipeline, START, END))
+                for path, pipeline in pipelines.items())
+
+
+def assert_same(got, want):
+    assert len(want)
+    assert got.index.equals(want.index)
+    assert sorted(got.columns) == sorted(want.columns)
+    for name in want.columns:
+        if want[name].dtype.kind == 'f':
+            assert np.allclose(got[name].values, want[name].values, equal_nan=True), name
+        else:
+            assert (got[name].values == want[name].values).all(), name
+
+
+@pytest.mark.parametrize('path', ALGORITHMS)
+def test_block_engine(bundle, pipelines, expected, path):
+    assert_same(BlockPipelineEngine(bundle).run_pipeline(pipelines[path], START, END), expected[path])
+
+
+@pytest.mark.parametrize('path', ALGORITHMS)
+def test_chunked(bundle, pipelines, expected, path):
+    chunks = list(SimplePipelineEngine(bundle).run_chunks(pipelines[path], START, END,
+                                                          memory_budget=CHUNK_BUDGETS[path]))
+    assert len(chunks) > 1
+    assert_same(pd.concat(chunks), expected[path])
+
+
+def test_panel(bundle, pipelines, expected, tmp_path):
+    panel = FactorPanel.write(str(tmp_path), bundle, list(pipelines.values()), START, END)
+    engine = BlockPipelineEngine(bundle, panel)
+    for path, pipeline in pipelines.items():
+        assert_same(engine.run_pipeline(pipeline, START, END), expected[path])
+        chunks = list(engine.run_chunks(pipeline, START, END, memory_budget=CHUNK_BUDGETS[path]))
+        assert len(chunks) > 1
+        assert_same(pd.concat(chunks), expected[path])
+
+
+def test_shared_terms(bundle, pipelines, expected):
+    for engine in (SimplePipelineEngine(bundle), BlockPipelineEngine(bundle)):
+        results = engine.run_pipelines(pipelines, START, END)
+        for path in ALGORITHMS:
+            assert_same(results[path], expected[path])
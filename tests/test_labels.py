@@ -0,0 +1,75 @@
+import re
+
+import numpy as np
+import pytest
+
+from localq.datasets import morningstar
+from localq.labels import MISSING_CODE, LabelArray, encode
+
+LABELS = ['NYSE', 'NASDAQ', 'OTCPK', 'OTC', 'AMEX', 'BRK.WI', 'XYZ.WI', 'Acme L.P.', 'Acme LP',
+          'Acme LLP', 'Acme Corp', '', None, 'nyse', 'WI']
+PLAIN = {
+    'eq': lambda label, argument: label == argument,
+    'startswith': lambda label, argument: label.startswith(argument),
+    'endswith': lambda label, argument: label.endswith(argument),
+    'has_substring': lambda label, argument: argument in label,
+    'matches': lambda label, argument: re.match(argument, label) is not None,
+    'element_of': lambda label, argument: label in argument,
+}
+PREDICATES = [
+    ('eq', 'NYSE'), ('eq', ''), ('startswith', 'OTC'), ('startswith', ''), ('endswith', '.WI'),
+    ('has_substring', 'L.P'), ('matches', '.* L[. ]?P.?$'), ('element_of', ['NYSE', 'AMEX', '']),
+]
+
+
+def labels(seed, size=500):
+    rng = np.random.RandomState(seed)
+    return np.array(LABELS, dtype=object)[rng.randint(0, len(LABELS), size)]
+
+
+def plain(kind, argument, values):
+    """
+        The predicate on each Python string, with missing labels never passing
+    """
+    if kind == 'element_of':
+        argument = frozenset(argument)
+    return np.array([value is not None and value != '' and PLAIN[kind](value, argument)
+                     for value in values], dtype=bool)
+
+
+def test_encode_round_trip():
+    values = labels(0)
+    codes, categories = encode(values)
+    array = LabelArray(codes, categories)
+    assert categories[MISSING_CODE] == ''
+    assert np.array_equal(array.is_missing(), np.array([value in (None, '') for value in values]))
+    assert list(array.as_labels()) == [None if value == '' else value for value in values]
+    #: Slices keep their categories
+    assert array[10:20].categories is categories
+
+
+@pytest.mark.parametrize('kind, argument', PREDICATES)
+def test_predicates(kind, argument):
+    column = morningstar.share_class_reference.exchange_id.latest
+    predicate = getattr(column, kind)(argument)
+    for seed in range(3):
+        values = labels(seed)
+        want = plain(kind, argument, values)
+        codes, categories = encode(values)
+        coded = predicate._compute([LabelArray(codes, categories)[np.newaxis]], None, None)
+        assert np.array_equal(coded, want)
+        assert np.array_equal(predicate._compute([values[np.newaxis]], None, None), want)
+        #: Every label missing
+        missing = LabelArray.missing(len(values), categories)
+        assert not predicate._compute([missing[np.newaxis]], None, None).any()
+
+
+@pytest.mark.parametrize('null', [True, False])
+def test_null_filters(null):
+    column = morningstar.share_class_reference.exchange_id.latest
+    term = column.isnull() if null else column.notnull()
+    values = labels(0)
+    want = np.array([value in (None, '') for value in values]) == null
+    codes, categories = encode(values)
+    assert np.array_equal(term._compute([LabelArray(codes, categories)[np.newaxis]], None, None), want)
+    assert np.array_equal(term._compute([values[np.newaxis]], None, None), want)
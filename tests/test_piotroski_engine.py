@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from piotroski_engine import CRITERIA_NAMES, FIELDS, score_fundamentals
+
+
+def original_score(current_data, old_data, sid):
+    """
+        profit_logic + leverage_logic + operating_logic as Piotroski_score.py first wrote them,
+        one frame lookup per field
+    """
+    positive_roa = current_data[sid]['roa'] > 0
+    positive_ocf = current_data[sid]['operating_cash_flow'] > 0
+    current_last_roa = current_data[sid]['roa'] > old_data[sid]['roa']
+    cash_flow_roa = current_data[sid]['cash_flow_from_continuing_operating_activities'] > current_data[sid]['roa']
+    profit = int(positive_roa) + int(positive_ocf) + int(current_last_roa) + int(cash_flow_roa)
+
+    long_term_debt = current_data[sid]['long_term_debt_equity_ratio'] > old_data[sid]['long_term_debt_equity_ratio']
+    current_ratio = current_data[sid]['current_ratio'] > old_data[sid]['current_ratio']
+    new_shares = current_data[sid]['shares_outstanding'] <= old_data[sid]['shares_outstanding']
+    leverage = int(long_term_debt) + 2*int(current_ratio) + 2*int(new_shares)
+
+    gross_margin = current_data[sid]['gross_margin'] > old_data[sid]['gross_margin']
+    asset_turnover = current_data[sid]['assets_turnover'] > old_data[sid]['assets_turnover']
+    operating = int(gross_margin) + 2*int(asset_turnover)
+    return profit + leverage + operating
+
+
+def fundamentals(seed, n_assets=300):
+    """
+        Current and prior (assets x fields) arrays with missing values, ties and signed values
+    """
+    rng = np.random.RandomState(seed)
+    current = rng.standard_normal((n_assets, len(FIELDS)))
+    prior = rng.standard_normal((n_assets, len(FIELDS)))
+    tied = rng.random_sample(prior.shape) < 0.1
+    prior[tied] = current[tied]
+    current[rng.random_sample(current.shape) < 0.05] = np.nan
+    prior[rng.random_sample(prior.shape) < 0.05] = np.nan
+    return current, prior
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_original_scoring(seed):
+    current, prior = fundamentals(seed)
+    sids = ['S%04d' % asset for asset in range(len(current))]
+    current_data = pd.DataFrame(current.T, index=FIELDS, columns=sids)
+    old_data = pd.DataFrame(prior.T, index=FIELDS, columns=sids)
+
+    scores, breakdown = score_fundamentals(current, prior)
+    assert breakdown.shape == (len(sids), len(CRITERIA_NAMES))
+    assert np.array_equal(breakdown.sum(axis=1), scores)
+    assert list(scores) == [original_score(current_data, old_data, sid) for sid in sids]
+
+
+def test_rejects_misaligned_arrays():
+    current, prior = fundamentals(0)
+    with pytest.raises(ValueError):
+        score_fundamentals(current, prior[:-1])
+    with pytest.raises(ValueError):
+        score_fundamentals(current[:, :-1], prior[:, :-1])
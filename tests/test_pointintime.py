@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from localq.pointintime import NANOS_PER_DAY, PointInTimeStore
+
+N_ASSETS = 12
+
+
+def records(seed, n_records=400):
+    """
+        Random restated and backfilled records, with knowledge times anywhere within a day and
+        no two records of an asset sharing both dates
+    """
+    rng = np.random.RandomState(seed)
+    first = pd.Timestamp('2015-01-01').value
+    assets = rng.randint(0, N_ASSETS, n_records)
+    as_of = first + rng.randint(0, 300, n_records) * NANOS_PER_DAY
+    knowledge = as_of + rng.randint(0, 120 * NANOS_PER_DAY, n_records)
+    values = rng.standard_normal(n_records)
+    return assets, as_of, knowledge, values
+
+
+def brute_force(assets, as_of, knowledge, values, date):
+    """
+        Per asset, the record with the latest as_of, then knowledge, among those known by the
+        close of date
+    """
+    close = (pd.Timestamp(date).value // NANOS_PER_DAY + 1) * NANOS_PER_DAY
+    latest = np.full(N_ASSETS, np.nan)
+    for asset in range(N_ASSETS):
+        known = [(as_of[i], knowledge[i], values[i]) for i in range(len(assets))
+                 if assets[i] == asset and knowledge[i] < close]
+        if known:
+            latest[asset] = max(known)[2]
+    return latest
+
+
+def test_latest_matches_brute_force():
+    for seed in range(5):
+        assets, as_of, knowledge, values = records(seed)
+        store = PointInTimeStore(assets, as_of, knowledge, values, N_ASSETS)
+        for date in pd.date_range('2014-12-30', '2016-01-10', freq='5D'):
+            assert np.array_equal(store.latest(date), brute_force(assets, as_of, knowledge, values, date),
+                                  equal_nan=True), (seed, date)
+
+
+def test_panel_matches_latest():
+    store = PointInTimeStore(*records(0), n_assets=N_ASSETS)
+    sessions = pd.date_range('2015-01-01', '2015-12-31', freq='B', tz='UTC')
+    panel = store.panel(sessions, block=16)
+    for row, session in enumerate(sessions):
+        assert np.array_equal(panel[row], store.latest(session), equal_nan=True)
+
+
+def test_empty_store():
+    store = PointInTimeStore([], [], [], np.empty(0), N_ASSETS)
+    assert np.isnan(store.latest('2015-06-01')).all()
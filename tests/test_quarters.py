@@ -0,0 +1,102 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from asof_index import shift_date
+from quarters import QUARTERS_IN_YEAR, RollingQuarters, calendar_rows, fiscal_rows, window_length
+from trading_calendar import trailing_sessions
+
+LAGS = [0, 1, 2]
+N_DAYS = window_length(max(LAGS))
+TODAY = pd.Timestamp('2016-06-15', tz='UTC')
+
+
+def filings(seed, n_days, n_assets=30):
+    """
+        (period_end, values) windows: assets file every 40 to 90 sessions, some too rarely
+        for the window to hold every lag, some skip a stretch of dates and some never report
+    """
+    rng = np.random.RandomState(seed)
+    period_end = np.full((n_days, n_assets), np.datetime64('NaT'), dtype='datetime64[ns]')
+    for asset in range(n_assets):
+        if asset % 10 == 9:
+            continue
+        row, quarter = -rng.randint(0, 90), np.datetime64('2005-03-31')
+        while row < n_days:
+            length = rng.randint(150, 250) if asset % 10 == 8 else rng.randint(40, 90)
+            period_end[max(row, 0):row + length, asset] = quarter
+            row, quarter = row + length, quarter + np.timedelta64(91, 'D')
+        if asset % 10 == 7:
+            period_end[300:360, asset] = np.datetime64('NaT')
+    return period_end, rng.standard_normal((n_days, n_assets))
+
+
+def brute_fiscal_ttm(period_end, values):
+    """
+        Per asset, quarter q is the last row of the q-th most recent run of equal period
+        ending dates
+    """
+    nanos = period_end.view(np.int64)
+    ttm = np.full((len(LAGS), nanos.shape[1]), np.nan)
+    for asset in range(nanos.shape[1]):
+        ends, row = [], 0
+        for _, run in itertools.groupby(nanos[:, asset]):
+            row += len(list(run))
+            ends.append(row - 1)
+        ends.reverse()
+        for i, lag in enumerate(LAGS):
+            quarters = range(lag * QUARTERS_IN_YEAR, (lag + 1) * QUARTERS_IN_YEAR)
+            if all(quarter < len(ends) for quarter in quarters):
+                ttm[i, asset] = sum(values[ends[quarter], asset] for quarter in quarters)
+    return ttm
+
+
+def brute_calendar_rows(today, n_days):
+    """
+        Per lag and quarter, the last session of the window on or before the quarter's end
+    """
+    sessions = list(trailing_sessions(today, n_days))
+    rows = np.empty((len(LAGS), QUARTERS_IN_YEAR), dtype=np.intp)
+    for i, lag in enumerate(LAGS):
+        for quarter in range(QUARTERS_IN_YEAR):
+            end = shift_date(today, years=-lag, months=-3 * quarter)
+            rows[i, quarter] = max(row for row, session in enumerate(sessions) if session <= end)
+    return rows - n_days
+
+
+def test_fiscal_rows():
+    for seed in range(4):
+        period_end, values = filings(seed, N_DAYS)
+        dated = ~np.isnat(period_end).all(axis=0)
+        got = fiscal_rows(period_end, LAGS).ttm(values)
+        want = brute_fiscal_ttm(period_end, values)
+        assert np.array_equal(got[:, dated], want[:, dated], equal_nan=True), seed
+
+
+def test_calendar_rows():
+    for today in pd.date_range('2015-01-02', '2016-12-30', freq='17D', tz='UTC'):
+        assert np.array_equal(calendar_rows(today, N_DAYS, LAGS), brute_calendar_rows(today, N_DAYS)), today
+
+
+def test_undated_assets_fall_back_to_calendar_rows():
+    period_end, values = filings(0, N_DAYS)
+    undated = np.isnat(period_end).all(axis=0)
+    assert undated.any()
+    rows = N_DAYS + brute_calendar_rows(TODAY, N_DAYS)
+    got = fiscal_rows(period_end, LAGS, today=TODAY).ttm(values)
+    assert np.allclose(got[:, undated], values[rows][:, :, undated].sum(axis=1))
+
+
+def test_rolling_quarters():
+    steps = 150
+    period_end, values = filings(1, N_DAYS + steps)
+    rolling = RollingQuarters(LAGS, N_DAYS)
+    rolling.start(period_end[:N_DAYS], [values[:N_DAYS]])
+    for step in range(steps + 1):
+        if step:
+            row = N_DAYS + step - 1
+            rolling.push(period_end[row], [values[row]])
+        window = slice(step, N_DAYS + step)
+        want = fiscal_rows(period_end[window], LAGS).ttm(values[window])
+        assert np.array_equal(rolling.ttm()[..., 0], want, equal_nan=True), step
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from localq.pipeline import Factor, PercentileFilter, Rank, RankFilter
+
+
+def full_sort_percentile(values, min_percentile, max_percentile):
+    known = ~np.isnan(values)
+    if not known.any():
+        return np.zeros(len(values), dtype=bool)
+    #: Infinities make np.percentile interpolate inf - inf
+    with np.errstate(invalid='ignore'):
+        lower, upper = np.percentile(values[known], [min_percentile, max_percentile])
+    return known & (values >= lower) & (values <= upper)
+
+
+def full_sort_rank_filter(values, n, ascending):
+    known = np.flatnonzero(~np.isnan(values))
+    order = np.argsort(values[known], kind='mergesort')
+    if not ascending:
+        order = order[::-1]
+    selected = np.zeros(len(values), dtype=bool)
+    selected[known[order[:n]]] = True
+    return selected
+
+
+def full_sort_rank(values, ascending):
+    known = np.flatnonzero(~np.isnan(values))
+    order = np.argsort(values[known] if ascending else -values[known], kind='mergesort')
+    ranks = np.full(len(values), np.nan)
+    ranks[known[order]] = np.arange(1, len(order) + 1)
+    return ranks
+
+
+def windows(seed, trials=100):
+    """
+        (sessions x assets) blocks with NaNs, infinities, ties, empty rows and zero assets
+    """
+    rng = np.random.RandomState(seed)
+    for trial in range(trials):
+        rows, n = rng.randint(1, 8), rng.randint(0, 40)
+        if trial % 2:
+            values = rng.randint(-5, 5, size=(rows, n)).astype(float)
+        else:
+            values = rng.standard_normal((rows, n))
+        values[rng.random_sample((rows, n)) < 0.3] = np.nan
+        if trial % 7 == 0 and n:
+            values[:, 0] = np.inf
+        if trial % 5 == 0:
+            values[0] = np.nan
+        yield rng, values
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_percentile_filter(seed):
+    factor = Factor()
+    for rng, values in windows(seed):
+        for bounds in [sorted(rng.uniform(0, 100, 2)), (0, 25), (0, 100), (99, 100), (50, 50)]:
+            term = PercentileFilter(factor, *bounds)
+            block = term._compute([values[np.newaxis]], None, None)
+            for row, got in zip(values, block):
+                assert np.array_equal(got, full_sort_percentile(row, *bounds)), (bounds, row)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_rank_filters(seed):
+    factor = Factor()
+    terms = [(RankFilter(factor, n, ascending), n, ascending) for n in (1, 3, 50) for ascending in (True, False)]
+    for _, values in windows(seed):
+        for term, n, ascending in terms:
+            block = term._compute([values[np.newaxis]], None, None)
+            for row, got in zip(values, block):
+                assert np.array_equal(got, full_sort_rank_filter(row, n, ascending)), (n, ascending, row)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_rank(seed):
+    factor = Factor()
+    for _, values in windows(seed):
+        for ascending in (True, False):
+            block = Rank(factor, ascending)._compute([values[np.newaxis]], None, None)
+            for row, got in zip(values, block):
+                assert np.array_equal(got, full_sort_rank(row, ascending), equal_nan=True), (ascending, row)
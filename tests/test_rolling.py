@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from conftest import algorithm_path
+from localq.algorithm import TradingAlgorithm
+from localq.factors import AverageDollarVolume
+from localq.pipeline import Pipeline, SimplePipelineEngine
+
+START, END = '2015-06-01', '2016-12-30'
+
+
+def algorithm_factor(bundle, path, name):
+    algorithm = TradingAlgorithm(algorithm_path(path), bundle, START, END)
+    return algorithm.namespace[name]()
+
+
+def outputs(factor):
+    return Pipeline(columns=dict((name, getattr(factor, name)) for name in type(factor).outputs))
+
+
+def run(bundle, pipeline, rolling):
+    engine = SimplePipelineEngine(bundle, rolling=rolling)
+    return engine, engine.run_pipeline(pipeline, START, END)
+
+
+def assert_identical(rolled, full):
+    assert rolled.index.equals(full.index)
+    assert list(rolled.columns) == list(full.columns)
+    for name in full.columns:
+        assert np.array_equal(rolled[name].values, full[name].values, equal_nan=True), name
+
+
+def test_average_dollar_volume(bundle):
+    pipeline = Pipeline(columns={'adv': AverageDollarVolume(window_length=30),
+                                 'adv_1': AverageDollarVolume(window_length=1)})
+    assert_identical(run(bundle, pipeline, True)[1], run(bundle, pipeline, False)[1])
+
+
+@pytest.mark.parametrize('path, name', [
+    ('Piotroski-pipeline.py', 'TTM_fundamentals'),
+    ('Graham_enterprising_investor.py', 'eps_history'),
+])
+def test_fiscal_ttm_factors(bundle, path, name):
+    pipeline = outputs(algorithm_factor(bundle, path, name))
+    engine, rolled = run(bundle, pipeline, True)
+    #: The factor really was rolled, not recomputed every session
+    assert any(state is not None for session, state in engine._states.values())
+    assert_identical(rolled, run(bundle, pipeline, False)[1])
@@ -0,0 +1,70 @@
+"""
+    NYSE trading sessions
+
+    Pipeline windows are indexed by trading session, not calendar day, so finding "the row for one
+    year ago" inside a window needs the session dates the window covers. The sessions are built
+    once from the exchange holiday rules and sliced on demand.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, GoodFriday, Holiday, USLaborDay,
+                                    USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday)
+from pandas.tseries.offsets import CustomBusinessDay
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    """
+        Regular NYSE full-day holidays. One-off closures (e.g. 9/11, Hurricane Sandy, national days
+        of mourning) are not included.
+    """
+    rules = [
+        Holiday('New Years Day', month=1, day=1, observance=nearest_workday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, start_date='2022-01-01', observance=nearest_workday),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas', month=12, day=25, observance=nearest_workday),
+    ]
+
+
+FIRST_SESSION = '1990-01-02'
+LAST_SESSION = '2030-12-31'
+
+#: Every session between FIRST_SESSION and LAST_SESSION, as UTC midnight labels
+SESSIONS = pd.date_range(FIRST_SESSION, LAST_SESSION,
+                         freq=CustomBusinessDay(calendar=NYSEHolidayCalendar()), tz='UTC')
+
+_SESSION_NANOS = SESSIONS.tz_localize(None).values.astype('datetime64[ns]').view(np.int64)
+
+
+def _normalize(date):
+    date = pd.Timestamp(date)
+    if date.tzinfo is not None:
+        date = date.tz_convert('UTC').tz_localize(None)
+    return date.normalize()
+
+
+def sessions_in_range(start, end):
+    """
+        Sessions from start to end inclusive
+    """
+    first = np.searchsorted(_SESSION_NANOS, _normalize(start).value, side='left')
+    last = np.searchsorted(_SESSION_NANOS, _normalize(end).value, side='right')
+    return SESSIONS[first:last]
+
+
+def trailing_sessions(today, count):
+    """
+        The `count` sessions strictly before today, oldest first. These are the dates of the rows
+        in a pipeline window of length `count` computed on today.
+    """
+    stop = np.searchsorted(_SESSION_NANOS, _normalize(today).value, side='left')
+    if stop < count:
+        raise ValueError("not enough sessions before %s for a window of %d" % (today, count))
+    return SESSIONS[stop - count:stop]